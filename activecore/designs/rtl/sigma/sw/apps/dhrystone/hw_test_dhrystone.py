@@ -13,9 +13,8 @@ sys.path.append('..')
 import sigma
 from sigma import *
 
-def hw_test_dhrystone(sigma, dhrystone_filename):
-    print("#### DHRYSTONE TEST STARTED ####")
-          
+def hw_run_dhrystone(sigma, dhrystone_filename):
+    
     print("Clearing buffer")
     sigma.reset_buf()
     
@@ -24,10 +23,41 @@ def hw_test_dhrystone(sigma, dhrystone_filename):
     print("Test program written!")
     time.sleep(0.1)
     
-    rdarr = sigma.tile.udm.rdarr32(0x6000, 2)
+    rdarr = sigma.read_buf(2)
     Microseconds = rdarr[0]
     Dhrystones_Per_Second = rdarr[1]
     DMIPS = Dhrystones_Per_Second / 1757
+    return Microseconds, Dhrystones_Per_Second, DMIPS
+
+def hw_bench_dhrystone(sigma, dhrystone_filename, runs):
+    print("#### DHRYSTONE BENCHMARK STARTED ####")
+    
+    Microseconds_samples = []
+    Dhrystones_Per_Second_samples = []
+    DMIPS_samples = []
+    for run in range(runs):
+        Microseconds, Dhrystones_Per_Second, DMIPS = hw_run_dhrystone(sigma, dhrystone_filename)
+        print("Run ", run, ": Microseconds: ", Microseconds, ", Dhrystones_Per_Second: ", Dhrystones_Per_Second, ", DMIPS: ", DMIPS)
+        if ((Microseconds == 0) | (Dhrystones_Per_Second == 0)):
+            print("#### DHRYSTONE BENCHMARK FAILED! ####")
+            print("")
+            return None
+        Microseconds_samples.append(Microseconds)
+        Dhrystones_Per_Second_samples.append(Dhrystones_Per_Second)
+        DMIPS_samples.append(DMIPS)
+    
+    print("#### DHRYSTONE BENCHMARK DONE ####")
+    print("")
+    
+    # metric name -> (higher_is_better, samples)
+    return {"Microseconds"          : (False, Microseconds_samples),
+            "Dhrystones_Per_Second" : (True, Dhrystones_Per_Second_samples),
+            "DMIPS"                 : (True, DMIPS_samples)}
+
+def hw_test_dhrystone(sigma, dhrystone_filename):
+    print("#### DHRYSTONE TEST STARTED ####")
+    
+    Microseconds, Dhrystones_Per_Second, DMIPS = hw_run_dhrystone(sigma, dhrystone_filename)
     print("Microseconds: ", Microseconds)
     print("Dhrystones_Per_Second: ", Dhrystones_Per_Second)
     print("DMIPS: ", DMIPS)
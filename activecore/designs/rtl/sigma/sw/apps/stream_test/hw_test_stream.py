@@ -0,0 +1,63 @@
+# -*- coding:utf-8 -*-
+from __future__ import division
+
+import sys
+sys.path.append('../../../../../rtl/udm/sw')
+
+import time
+
+import udm
+from udm import *
+
+sys.path.append('..')
+import sigma
+from sigma import *
+
+STREAM_RECORDS = 1024
+STREAM_RECORD_LEN = 16
+
+def hw_test_stream(sigma, firmware_filename):
+    print("#### STREAM TEST STARTED ####")
+    
+    RECORDS = []
+    
+    print("Loading test program...")
+    sigma.load_test(firmware_filename)
+    print("Test program written!")
+    
+    reader = sigma.open_stream(callback=lambda tag, payload: RECORDS.append((tag, payload)))
+    start = time.time()
+    eos = reader.wait(10.0)
+    reader.stop()
+    elapsed = time.time() - start
+    print("Received ", reader.records, " records, ", reader.words, " words in ", "{:.3f}".format(elapsed), " s")
+    
+    test_succ_flag = 1
+    if not eos:
+        test_succ_flag = 0
+        print("End of stream not received!")
+    if (len(RECORDS) != STREAM_RECORDS):
+        test_succ_flag = 0
+        print("Expected ", STREAM_RECORDS, " records, received: ", len(RECORDS))
+    
+    x = 1
+    for i in range(min(len(RECORDS), STREAM_RECORDS)):
+        tag, payload = RECORDS[i]
+        expected = []
+        for j in range(STREAM_RECORD_LEN):
+            x ^= (x << 13) & 0xffffffff
+            x ^= x >> 17
+            x ^= (x << 5) & 0xffffffff
+            expected.append(x)
+        if (tag != (i & 0xff)) or (payload != expected):
+            test_succ_flag = 0
+            print("Test failed on record ", i, "!")
+            break
+    
+    if (test_succ_flag):
+        print("#### STREAM TEST PASSED! ####")
+    else:
+        print("#### STREAM TEST FAILED! ####")
+    
+    print("")
+    return test_succ_flag
@@ -0,0 +1,38 @@
+// See LICENSE for license details.
+
+//**************************************************************************
+// Test program for tile-to-host ring buffer streaming
+//--------------------------------------------------------------------------
+
+#include "io.h"
+#include "ringbuf.h"
+
+#define STREAM_RECORDS     1024
+#define STREAM_RECORD_LEN  16
+
+unsigned int record[STREAM_RECORD_LEN];
+
+//--------------------------------------------------------------------------
+// Main
+
+int main( int argc, char* argv[] )
+{
+  unsigned int i, j, x;
+
+  IO_LED = 0;
+  x = 1;
+  for (i = 0; i < STREAM_RECORDS; i++) {
+    for (j = 0; j < STREAM_RECORD_LEN; j++) {
+      // xorshift32 sequence, continued across records
+      x ^= x << 13;
+      x ^= x >> 17;
+      x ^= x << 5;
+      record[j] = x;
+    }
+    ringbuf_put(i & 0xff, record, STREAM_RECORD_LEN);
+  }
+  ringbuf_eos();
+  IO_LED = STREAM_RECORDS;
+
+  while (1) {}
+}
@@ -0,0 +1,318 @@
+# -*- coding:utf-8 -*-
+
+#
+# bench_history.py
+#
+#     License: See LICENSE file for details
+#
+
+from __future__ import division
+
+import hashlib
+import math
+import os
+import sqlite3
+import time
+
+
+def file_digest(filename):
+    """Description:
+        SHA-1 of file contents, used to identify firmware and bitstream images
+
+    Parameters:
+        filename (str): File name
+
+    Returns:
+        str: Hex digest, or file name itself if file is not present
+
+    """
+    if not os.path.isfile(filename):
+        return filename
+    h = hashlib.sha1()
+    f = open(filename, "rb")
+    try:
+        h.update(f.read())
+    finally:
+        f.close()
+    return h.hexdigest()
+
+
+def _betacf(a, b, x):
+    # continued fraction for incomplete beta function (Numerical Recipes, 6.4)
+    qab = a + b
+    qap = a + 1.0
+    qam = a - 1.0
+    c = 1.0
+    d = 1.0 - qab * x / qap
+    if (abs(d) < 1e-30):
+        d = 1e-30
+    d = 1.0 / d
+    h = d
+    for m in range(1, 201):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        if (abs(d) < 1e-30):
+            d = 1e-30
+        c = 1.0 + aa / c
+        if (abs(c) < 1e-30):
+            c = 1e-30
+        d = 1.0 / d
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        if (abs(d) < 1e-30):
+            d = 1e-30
+        c = 1.0 + aa / c
+        if (abs(c) < 1e-30):
+            c = 1e-30
+        d = 1.0 / d
+        delta = d * c
+        h *= delta
+        if (abs(delta - 1.0) < 3e-12):
+            break
+    return h
+
+
+def _betai(a, b, x):
+    # regularized incomplete beta function I_x(a, b)
+    if (x <= 0.0):
+        return 0.0
+    if (x >= 1.0):
+        return 1.0
+    bt = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x))
+    if (x < (a + 1.0) / (a + b + 2.0)):
+        return bt * _betacf(a, b, x) / a
+    return 1.0 - bt * _betacf(b, a, 1.0 - x) / b
+
+
+def student_t_sf(t, dof):
+    """Description:
+        Survival function P(T > t) of Student's t distribution
+
+    Parameters:
+        t (float): t statistic
+        dof (float): Degrees of freedom
+
+    Returns:
+        float: Upper tail probability
+
+    """
+    tail = 0.5 * _betai(dof / 2.0, 0.5, dof / (dof + t * t))
+    if (t >= 0):
+        return tail
+    return 1.0 - tail
+
+
+def sample_stats(samples):
+    """Description:
+        Mean and sample standard deviation
+
+    Parameters:
+        samples (float[]): Measured values
+
+    Returns:
+        (float, float): Mean and standard deviation
+
+    """
+    n = len(samples)
+    mean = sum(samples) / n
+    if (n < 2):
+        return mean, 0.0
+    var = sum([(x - mean) * (x - mean) for x in samples]) / (n - 1)
+    return mean, math.sqrt(var)
+
+
+def welch_worse_pvalue(base_samples, samples, higher_is_better):
+    """Description:
+        One-sided Welch's t-test that samples are worse than base_samples
+
+    Parameters:
+        base_samples (float[]): Baseline measurements
+        samples (float[]): New measurements
+        higher_is_better (bool): Metric direction
+
+    Returns:
+        float: p-value, small values mean a significant regression
+
+    """
+    base_mean, base_std = sample_stats(base_samples)
+    mean, std = sample_stats(samples)
+    diff = (base_mean - mean) if higher_is_better else (mean - base_mean)
+    base_se2 = base_std * base_std / len(base_samples)
+    se2 = std * std / len(samples)
+    if ((base_se2 + se2) == 0.0):
+        # noiseless measurements (e.g. cycle-exact dhrystone): any move is significant
+        if (diff > 0):
+            return 0.0
+        return 1.0
+    t = diff / math.sqrt(base_se2 + se2)
+    dof_den = 0.0
+    if (len(base_samples) > 1):
+        dof_den += base_se2 * base_se2 / (len(base_samples) - 1)
+    if (len(samples) > 1):
+        dof_den += se2 * se2 / (len(samples) - 1)
+    if (dof_den == 0.0):
+        return 1.0
+    dof = (base_se2 + se2) * (base_se2 + se2) / dof_den
+    return student_t_sf(t, dof)
+
+
+class bench_history:
+
+    __schema = [
+        "CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp REAL, core TEXT, bitstream TEXT, firmware TEXT, app TEXT, baseline INTEGER DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS samples (run_id INTEGER, metric TEXT, higher_is_better INTEGER, value REAL)",
+        "CREATE INDEX IF NOT EXISTS runs_by_app ON runs (core, app, timestamp)",
+        "CREATE INDEX IF NOT EXISTS samples_by_run ON samples (run_id, metric)"
+    ]
+
+    def __init__(self, db_filename):
+        """Description:
+            Open (create if missing) benchmark history database
+
+        Parameters:
+            db_filename (str): SQLite database file name
+
+        """
+        self.db = sqlite3.connect(db_filename)
+        for statement in self.__schema:
+            self.db.execute(statement)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def add_run(self, core, bitstream, firmware, app, metrics):
+        """Description:
+            Store measurements of one benchmark session
+
+        Parameters:
+            core (str): CPU variant, e.g. agenda, aquaris, ariele, citadel
+            bitstream (str): Bitstream identity
+            firmware (str): Firmware identity
+            app (str): Benchmark name
+            metrics (dict): metric name -> (higher_is_better, float[] samples)
+
+        Returns:
+            int: Run id
+
+        """
+        cur = self.db.execute("INSERT INTO runs (timestamp, core, bitstream, firmware, app) VALUES (?, ?, ?, ?, ?)",
+                              (time.time(), core, bitstream, firmware, app))
+        run_id = cur.lastrowid
+        for metric in metrics:
+            higher_is_better, samples = metrics[metric]
+            self.db.executemany("INSERT INTO samples (run_id, metric, higher_is_better, value) VALUES (?, ?, ?, ?)",
+                                [(run_id, metric, int(higher_is_better), float(value)) for value in samples])
+        self.db.commit()
+        return run_id
+
+    def set_baseline(self, run_id):
+        """Description:
+            Mark run as baseline for its core and benchmark
+
+        Parameters:
+            run_id (int): Run id
+
+        """
+        self.db.execute("UPDATE runs SET baseline = 1 WHERE id = ?", (run_id,))
+        self.db.commit()
+
+    def baseline(self, core, app, before_run_id=None):
+        """Description:
+            Find run to compare against: latest marked baseline, or latest
+            previous run if no baseline is marked
+
+        Parameters:
+            core (str): CPU variant
+            app (str): Benchmark name
+            before_run_id (int): Only consider runs older than this one
+
+        Returns:
+            int: Run id or None
+
+        """
+        if before_run_id is None:
+            before_run_id = -1
+        for query in ["SELECT id FROM runs WHERE core = ? AND app = ? AND baseline = 1 AND (? < 0 OR id < ?) ORDER BY id DESC LIMIT 1",
+                      "SELECT id FROM runs WHERE core = ? AND app = ? AND (? < 0 OR id < ?) ORDER BY id DESC LIMIT 1"]:
+            row = self.db.execute(query, (core, app, before_run_id, before_run_id)).fetchone()
+            if row is not None:
+                return row[0]
+        return None
+
+    def samples(self, run_id):
+        """Description:
+            Load measurements of run
+
+        Parameters:
+            run_id (int): Run id
+
+        Returns:
+            dict: metric name -> (higher_is_better, float[] samples)
+
+        """
+        metrics = {}
+        for metric, higher_is_better, value in self.db.execute("SELECT metric, higher_is_better, value FROM samples WHERE run_id = ? ORDER BY rowid", (run_id,)):
+            if metric not in metrics:
+                metrics[metric] = (bool(higher_is_better), [])
+            metrics[metric][1].append(value)
+        return metrics
+
+    def compare(self, run_id, base_run_id, alpha=0.05, rel_threshold=0.005):
+        """Description:
+            Check run for regressions against baseline run
+
+        Parameters:
+            run_id (int): Checked run id
+            base_run_id (int): Baseline run id
+            alpha (float): Significance level
+            rel_threshold (float): Minimal relative degradation to be reported
+
+        Returns:
+            list: (metric, base_mean, mean, p-value, regression flag) per metric
+
+        """
+        base_metrics = self.samples(base_run_id)
+        metrics = self.samples(run_id)
+        report = []
+        for metric in sorted(metrics):
+            if metric not in base_metrics:
+                continue
+            higher_is_better, samples = metrics[metric]
+            base_samples = base_metrics[metric][1]
+            base_mean = sample_stats(base_samples)[0]
+            mean = sample_stats(samples)[0]
+            pvalue = welch_worse_pvalue(base_samples, samples, higher_is_better)
+            if (base_mean != 0):
+                rel_change = (mean - base_mean) / abs(base_mean)
+            else:
+                rel_change = 0.0
+            if higher_is_better:
+                rel_change = -rel_change
+            regression = (pvalue < alpha) and (rel_change > rel_threshold)
+            report.append((metric, base_mean, mean, pvalue, regression))
+        return report
+
+    def trend(self, core, app, metric):
+        """Description:
+            Per-run statistics of metric over time
+
+        Parameters:
+            core (str): CPU variant
+            app (str): Benchmark name
+            metric (str): Metric name
+
+        Returns:
+            list: (run_id, timestamp, bitstream, firmware, mean, stdev, n) per run
+
+        """
+        rows = []
+        for run_id, timestamp, bitstream, firmware in self.db.execute("SELECT id, timestamp, bitstream, firmware FROM runs WHERE core = ? AND app = ? ORDER BY id", (core, app)).fetchall():
+            metrics = self.samples(run_id)
+            if metric in metrics:
+                samples = metrics[metric][1]
+                mean, std = sample_stats(samples)
+                rows.append((run_id, timestamp, bitstream, firmware, mean, std, len(samples)))
+        return rows
@@ -0,0 +1,59 @@
+#ifndef SIGMA_RINGBUF_H
+#define SIGMA_RINGBUF_H
+
+#include "io.h"
+
+//--------------------------------------------------------------------------
+// Tile-to-host ring buffer over I/O buffer
+//
+// io_buf_uint[0] - head: next data word to be written (written by tile)
+// io_buf_uint[1] - tail: next data word to be read (written by host)
+// io_buf_uint[2..] - data area, RINGBUF_DATA_WORDS words
+//
+// Record: header word (tag << 16 | payload length in words), then payload.
+// Records may wrap around the end of data area. Host clears the buffer
+// before the program is started, so head = tail = 0 on entry.
+//--------------------------------------------------------------------------
+
+#define RINGBUF_SIZE_WORDS  2048
+#define RINGBUF_DATA_WORDS  (RINGBUF_SIZE_WORDS - 2)
+#define RINGBUF_HEAD        io_buf_uint[0]
+#define RINGBUF_TAIL        io_buf_uint[1]
+#define RINGBUF_DATA        (&io_buf_uint[2])
+
+#define RINGBUF_TAG_EOS     0xffff
+
+static inline unsigned int ringbuf_free(void)
+{
+  unsigned int used = RINGBUF_HEAD + RINGBUF_DATA_WORDS - RINGBUF_TAIL;
+  if (used >= RINGBUF_DATA_WORDS) used -= RINGBUF_DATA_WORDS;
+  // one word is kept empty to tell full buffer from empty one
+  return RINGBUF_DATA_WORDS - 1 - used;
+}
+
+// Blocks until host has drained enough space
+static inline void ringbuf_put(unsigned int tag, const unsigned int * data, unsigned int length)
+{
+  unsigned int head, i;
+
+  while (ringbuf_free() < (length + 1)) {}
+
+  head = RINGBUF_HEAD;
+  RINGBUF_DATA[head] = (tag << 16) | length;
+  for (i = 0; i < length; i++) {
+    head++;
+    if (head == RINGBUF_DATA_WORDS) head = 0;
+    RINGBUF_DATA[head] = data[i];
+  }
+  head++;
+  if (head == RINGBUF_DATA_WORDS) head = 0;
+  // publish record only after its data words are written
+  RINGBUF_HEAD = head;
+}
+
+static inline void ringbuf_eos(void)
+{
+  ringbuf_put(RINGBUF_TAG_EOS, 0, 0);
+}
+
+#endif // SIGMA_RINGBUF_H
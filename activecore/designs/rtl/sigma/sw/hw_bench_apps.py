@@ -0,0 +1,28 @@
+# -*- coding:utf-8 -*-
+from __future__ import division
+
+import sys
+
+sys.path.append('../../udm/sw')
+import udm
+from udm import *
+
+import sigma
+from sigma import *
+
+
+CORE        = "agenda"
+BITSTREAM   = "sigma.bit"
+HISTORY_DB  = "bench_history.db"
+RUNS        = 5
+
+udm = udm('COM1', 921600)
+print("")
+
+history = bench_history(HISTORY_DB)
+
+sigma = sigma(udm)
+sigma.run_app_benchmarks(history, CORE, BITSTREAM, RUNS)
+
+history.close()
+udm.disconnect()
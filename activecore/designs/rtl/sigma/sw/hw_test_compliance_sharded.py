@@ -0,0 +1,34 @@
+# -*- coding:utf-8 -*-
+from __future__ import division
+
+import sys
+
+sys.path.append('../../udm/sw')
+import udm
+from udm import *
+
+import sigma
+from sigma import *
+
+
+# single-tile sigma boards
+udm0 = udm('COM1', 921600)
+udm1 = udm('COM2', 921600)
+print("")
+
+# magma board: four sigma tiles behind one link
+udm2 = udm('COM3', 921600)
+print("")
+
+MAGMA_TILES = [0x00000000, 0x10000000, 0x20000000, 0x30000000]
+
+sigma0 = sigma(udm0)
+targets = [sigma(udm1)]
+for tile_addr in MAGMA_TILES:
+    targets.append(sigma(udm2, tile_addr))
+
+sigma0.run_compliance_tests_sharded(["RV32I", "RV32M"], targets)
+
+udm0.disconnect()
+udm1.disconnect()
+udm2.disconnect()
@@ -0,0 +1,112 @@
+# -*- coding:utf-8 -*-
+
+#
+# prefetcher.py
+#
+#     License: See LICENSE file for details
+#
+
+from __future__ import division
+
+import threading
+
+
+class prefetcher:
+    """Prepares upcoming work items on a worker thread, in submission order,
+    at most depth items ahead of the consumer.
+
+    Items are looked up by key with take(). Items submitted before the taken
+    one are considered skipped and dropped, so a test that never asks for its
+    image does not stall the pipeline.
+    """
+
+    def __init__(self, prepare, depth=2):
+        """Description:
+            Start worker thread
+
+        Parameters:
+            prepare (function): Called as prepare(key) on worker thread
+            depth (int): Maximum number of prepared items waiting to be taken
+
+        """
+        self.prepare = prepare
+        self.depth = max(1, depth)
+        self.__cond = threading.Condition()
+        self.__todo = []
+        self.__entries = []
+        self.__closed = False
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def submit(self, keys):
+        """Description:
+            Queue items for preparation
+
+        Parameters:
+            keys (list): Item keys, in order of expected use
+
+        """
+        with self.__cond:
+            self.__todo.extend(keys)
+            self.__cond.notify_all()
+
+    def __run(self):
+        while True:
+            with self.__cond:
+                while not self.__closed and ((len(self.__todo) == 0) or (len(self.__entries) >= self.depth)):
+                    self.__cond.wait()
+                if self.__closed:
+                    return
+                # entry: [key, done, result, error]
+                entry = [self.__todo.pop(0), False, None, None]
+                self.__entries.append(entry)
+            try:
+                entry[2] = self.prepare(entry[0])
+            except Exception as e:
+                entry[3] = e
+            with self.__cond:
+                entry[1] = True
+                self.__cond.notify_all()
+
+    def take(self, key):
+        """Description:
+            Get prepared item, waiting for it if it is in progress
+
+        Parameters:
+            key: Item key
+
+        Returns:
+            Prepared item, or None if key was not submitted or is not
+            started yet: caller then prepares it itself
+
+        """
+        with self.__cond:
+            for idx in range(len(self.__entries)):
+                if (self.__entries[idx][0] == key):
+                    entry = self.__entries[idx]
+                    del self.__entries[:(idx + 1)]
+                    self.__cond.notify_all()
+                    while not entry[1]:
+                        self.__cond.wait()
+                    if entry[3] is not None:
+                        raise entry[3]
+                    return entry[2]
+            if key in self.__todo:
+                del self.__todo[:(self.__todo.index(key) + 1)]
+                # all prepared entries precede key: they were skipped
+                del self.__entries[:]
+                self.__cond.notify_all()
+            return None
+
+    def close(self):
+        """Description:
+            Stop worker thread and drop unused items
+
+        """
+        with self.__cond:
+            self.__closed = True
+            self.__todo = []
+            self.__entries = []
+            self.__cond.notify_all()
+        self.__thread.join()
@@ -0,0 +1,155 @@
+# -*- coding:utf-8 -*-
+
+#
+# ring_reader.py
+#
+#     License: See LICENSE file for details
+#
+
+from __future__ import division
+
+import struct
+import threading
+
+
+RINGBUF_TAG_EOS = 0xffff
+
+
+class ring_reader:
+    """Host side consumer of tile-to-host ring buffer (see common/ringbuf.h).
+
+    Buffer layout: word 0 - head (written by tile), word 1 - tail (written
+    by host), then data area. Records are a header word (tag << 16 | length)
+    followed by length payload words.
+    """
+
+    def __init__(self, udm, buf_addr, buf_size, callback=None, outfile=None, poll_secs=0.01, lock=None):
+        """Description:
+            Create ring buffer reader
+
+        Parameters:
+            udm (udm): Link to the board
+            buf_addr (int): Ring buffer address (head word)
+            buf_size (int): Ring buffer size in bytes
+            callback (function): Called as callback(tag, payload_words) for each record
+            outfile (file): Binary file receiving payload of each record as little-endian words
+            poll_secs (float): Sleep between polls of empty buffer
+            lock (threading.Lock): Lock held around link accesses, shared with other users of udm
+
+        """
+        self.udm = udm
+        self.head_addr = buf_addr
+        self.tail_addr = buf_addr + 4
+        self.data_addr = buf_addr + 8
+        self.data_words = (buf_size // 4) - 2
+        self.callback = callback
+        self.outfile = outfile
+        self.poll_secs = poll_secs
+        if lock is None:
+            lock = threading.Lock()
+        self.lock = lock
+        self.tail = 0
+        self.pending = []
+        self.records = 0
+        self.words = 0
+        self.eos = False
+        self.error = None
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+    def __deliver(self, datawords):
+        self.pending.extend(datawords)
+        pos = 0
+        while ((len(self.pending) - pos) > 0):
+            header = self.pending[pos]
+            length = header & 0xffff
+            if ((len(self.pending) - pos - 1) < length):
+                break
+            tag = header >> 16
+            payload = self.pending[(pos + 1):(pos + 1 + length)]
+            pos += 1 + length
+            if (tag == RINGBUF_TAG_EOS):
+                self.eos = True
+                break
+            self.records += 1
+            if self.outfile is not None:
+                self.outfile.write(struct.pack("<{}I".format(length), *payload))
+            if self.callback is not None:
+                self.callback(tag, payload)
+        del self.pending[:pos]
+
+    def drain(self):
+        """Description:
+            Read everything currently available and advance tail
+
+        Returns:
+            int: Number of data words read
+
+        """
+        with self.lock:
+            head = self.udm.rd32(self.head_addr)
+            if (head >= self.data_words):
+                raise Exception("Ring buffer head out of range: " + hex(head))
+            if (head == self.tail):
+                return 0
+            if (head > self.tail):
+                datawords = self.udm.rdarr32((self.data_addr + self.tail * 4), (head - self.tail))
+            else:
+                datawords = self.udm.rdarr32((self.data_addr + self.tail * 4), (self.data_words - self.tail))
+                if (head > 0):
+                    datawords += self.udm.rdarr32(self.data_addr, head)
+            # release space to the tile before records are processed
+            self.tail = head
+            self.udm.wr32(self.tail_addr, self.tail)
+        self.words += len(datawords)
+        self.__deliver(datawords)
+        return len(datawords)
+
+    def __run(self):
+        try:
+            while not (self.eos or self.__stop_event.is_set()):
+                if (self.drain() == 0):
+                    self.__stop_event.wait(self.poll_secs)
+        except Exception as e:
+            self.error = e
+
+    def start(self):
+        """Description:
+            Start reader thread
+
+        """
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """Description:
+            Stop reader thread and drain remaining data
+
+        """
+        self.__stop_event.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        if (self.error is None) and not self.eos:
+            self.drain()
+
+    def wait(self, timeout_secs=None):
+        """Description:
+            Wait for end of stream record
+
+        Parameters:
+            timeout_secs (float): Timeout, wait forever if None
+
+        Returns:
+            bool: True if end of stream was received
+
+        """
+        if self.__thread is not None:
+            self.__thread.join(timeout_secs)
+            if not self.__thread.is_alive():
+                self.__thread = None
+        if self.error is not None:
+            raise self.error
+        return self.eos
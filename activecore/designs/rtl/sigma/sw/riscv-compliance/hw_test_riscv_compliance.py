@@ -5,6 +5,12 @@ import sys
 sys.path.append('../../../../../rtl/udm/sw')
 
 import time
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 import udm
 from udm import *
@@ -13,7 +19,71 @@ sys.path.append('..')
 import sigma
 from sigma import *
 
-def hw_test_riscv_compliance_template(sigma, instr_name, ref_directory):
+import prefetcher
+from prefetcher import *
+
+TESTS_RV32I = [  "I-ADD",
+                 "I-ADDI",
+                 "I-AND",
+                 "I-ANDI",
+                 "I-AUIPC",
+                 "I-BEQ",
+                 "I-BGE",
+                 "I-BGEU",
+                 "I-BLT",
+                 "I-BLTU",
+                 "I-BNE",
+                 "I-JAL",
+                 "I-JALR",
+                 "I-LB",
+                 "I-LBU",
+                 "I-LH",
+                 "I-LHU",
+                 "I-LUI",
+                 "I-LW",
+                 "I-OR",
+                 "I-ORI",
+                 "I-SB",
+                 "I-SH",
+                 "I-SLL",
+                 "I-SLLI",
+                 "I-SLT",
+                 "I-SLTI",
+                 "I-SLTIU",
+                 "I-SLTU",
+                 "I-SRA",
+                 "I-SRAI",
+                 "I-SRL",
+                 "I-SRLI",
+                 "I-SUB",
+                 "I-SW",
+                 "I-XOR",
+                 "I-XORI",
+                 "I-DELAY_SLOTS",
+                 #"I-EBREAK",
+                 #"I-ECALL",
+                 "I-ENDIANESS",
+                 "I-IO",
+                 #"I-MISALIGN_JMP",
+                 #"I-MISALIGN_LDST",
+                 "I-NOP",
+                 "I-RF_size",
+                 "I-RF_width",
+                 "I-RF_x0"]
+
+TESTS_RV32M = [  "mul",
+                 "mulh",
+                 "mulhsu",
+                 "mulhu",
+                 "div",
+                 "divu",
+                 "rem",
+                 "remu"]
+
+TESTSUITES = {  "RV32I" : (TESTS_RV32I, "riscv-compliance/riscv-test-suite/rv32i/references/"),
+                "RV32M" : (TESTS_RV32M, "riscv-compliance/riscv-test-suite/rv32m/references/")}
+
+def hw_test_riscv_compliance_readref(instr_name, ref_directory):
     
     f = open(ref_directory + instr_name + "-01.reference_output", "r")
 
@@ -26,110 +96,174 @@ def hw_test_riscv_compliance_template(sigma, instr_name, ref_directory):
     	else:
     		break
     
-    return sigma.hw_test_generic(sigma, instr_name, "riscv-compliance/" + instr_name + "-01.riscv", 0.1, verify_data)
+    f.close()
+    return verify_data
+
+def hw_test_riscv_compliance_testlist(testsuites_todo):
+    
+    tests = []
+    for testsuite_todo in testsuites_todo:
+        if (testsuite_todo not in TESTSUITES):
+            raise Exception("Test not recognized!")
+        testsuite, ref_directory = TESTSUITES[testsuite_todo]
+        for TEST in testsuite:
+            tests.append((TEST, ref_directory))
+    return tests
+
+def hw_test_riscv_compliance_firmware(instr_name):
+    
+    return "riscv-compliance/" + instr_name + "-01.riscv"
+
+def hw_test_riscv_compliance_template(sigma, instr_name, ref_directory, verify_data=None):
+    
+    if verify_data is None:
+        verify_data = hw_test_riscv_compliance_readref(instr_name, ref_directory)
+    
+    return sigma.hw_test_generic(sigma, instr_name, hw_test_riscv_compliance_firmware(instr_name), 0.1, verify_data)
 
-def hw_test_riscv_compliance(sigma, testsuites_todo):
+def hw_test_riscv_compliance_header():
     
     print("#################################################################################")
     print("############################ RISC-V Compliance Test #############################")
     print("#### Imperas Software Ltd., 2019 <https://github.com/riscv/riscv-compliance> ####")
     print("#################################################################################")
     print("")
+
+def hw_test_riscv_compliance_summary(TESTS_SUCC, TESTS_FAIL):
+    
+    print("Total tests PASSED: ", len(TESTS_SUCC), ", FAILED: ", len(TESTS_FAIL))
+    
+    TESTS_FAIL_STR = ""
+    for TEST in TESTS_FAIL:
+        TESTS_FAIL_STR = TESTS_FAIL_STR + " " + TEST
+    if (len(TESTS_FAIL) > 0):
+        print("Failed tests:" + TESTS_FAIL_STR)
+    
+    print("")
+    print("#################################################################################")
+    print("")
+
+def hw_test_riscv_compliance(sigma, testsuites_todo, prefetch_depth=2):
     
-    test_succ_counter = 0
-    test_fail_counter = 0
-    
-    TESTS_RV32I = [  "I-ADD",
-                     "I-ADDI",
-                     "I-AND",
-                     "I-ANDI",
-                     "I-AUIPC",
-                     "I-BEQ",
-                     "I-BGE",
-                     "I-BGEU",
-                     "I-BLT",
-                     "I-BLTU",
-                     "I-BNE",
-                     "I-JAL",
-                     "I-JALR",
-                     "I-LB",
-                     "I-LBU",
-                     "I-LH",
-                     "I-LHU",
-                     "I-LUI",
-                     "I-LW",
-                     "I-OR",
-                     "I-ORI",
-                     "I-SB",
-                     "I-SH",
-                     "I-SLL",
-                     "I-SLLI",
-                     "I-SLT",
-                     "I-SLTI",
-                     "I-SLTIU",
-                     "I-SLTU",
-                     "I-SRA",
-                     "I-SRAI",
-                     "I-SRL",
-                     "I-SRLI",
-                     "I-SUB",
-                     "I-SW",
-                     "I-XOR",
-                     "I-XORI",
-                     "I-DELAY_SLOTS",
-                     #"I-EBREAK",
-                     #"I-ECALL",
-                     "I-ENDIANESS",
-                     "I-IO",
-                     #"I-MISALIGN_JMP",
-                     #"I-MISALIGN_LDST",
-                     "I-NOP",
-                     "I-RF_size",
-                     "I-RF_width",
-                     "I-RF_x0"]
-    
-    TESTS_RV32M = [  "mul",
-                     "mulh",
-                     "mulhsu",
-                     "mulhu",
-                     "div",
-                     "divu",
-                     "rem",
-                     "remu"]
+    hw_test_riscv_compliance_header()
     
     TESTS_SUCC = []
     TESTS_FAIL = []
     
-    for testsuite_todo in testsuites_todo:
-        if (testsuite_todo == "RV32I"):
-            for TEST in TESTS_RV32I:
-                if (hw_test_riscv_compliance_template(sigma, TEST, "riscv-compliance/riscv-test-suite/rv32i/references/") == 1):
-                    TESTS_SUCC.append(TEST)
-                    test_succ_counter = test_succ_counter + 1
-                else:
-                    TESTS_FAIL.append(TEST)
-                    test_fail_counter = test_fail_counter + 1
-        elif (testsuite_todo == "RV32M"):
-            for TEST in TESTS_RV32M:    
-                if (hw_test_riscv_compliance_template(sigma, TEST, "riscv-compliance/riscv-test-suite/rv32m/references/") == 1):
-                    TESTS_SUCC.append(TEST)
-                    test_succ_counter = test_succ_counter + 1
-                else:
-                    TESTS_FAIL.append(TEST)
-                    test_fail_counter = test_fail_counter + 1
-        else:
-            raise Exception("Test not recognized!")
+    tests = hw_test_riscv_compliance_testlist(testsuites_todo)
     
+    # next tests' images and references are prepared while current one runs
+    sigma.prefetch_begin([hw_test_riscv_compliance_firmware(TEST) for TEST, ref_directory in tests], prefetch_depth)
+    refs = prefetcher(lambda test: hw_test_riscv_compliance_readref(*test), prefetch_depth)
+    refs.submit(tests)
+    try:
+        for TEST, ref_directory in tests:
+            verify_data = refs.take((TEST, ref_directory))
+            if (hw_test_riscv_compliance_template(sigma, TEST, ref_directory, verify_data) == 1):
+                TESTS_SUCC.append(TEST)
+            else:
+                TESTS_FAIL.append(TEST)
+    finally:
+        refs.close()
+        sigma.prefetch_end()
     
+    hw_test_riscv_compliance_summary(TESTS_SUCC, TESTS_FAIL)
+
+def hw_test_riscv_compliance_shard_worker(link_name, link_targets, tests, pending, results, sleep_secs):
     
-    print("Total tests PASSED: ", test_succ_counter, ", FAILED: ", test_fail_counter)
+    # Tiles behind one link share the UART, so transfers are issued one
+    # after another, but the programs on all tiles of the link run together
+    while True:
+        batch = []
+        try:
+            for target in link_targets:
+                try:
+                    test_idx = pending.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append((target, test_idx))
+                target.load_test(hw_test_riscv_compliance_firmware(tests[test_idx][0]))
+            
+            if (len(batch) == 0):
+                return
+            
+            time.sleep(sleep_secs)
+            
+            for target, test_idx in batch:
+                verify_data = tests[test_idx][2]
+                rdarr = target.read_buf(len(verify_data))
+                results[test_idx] = (link_name + ":" + target.name, list(rdarr) == list(verify_data))
+        
+        except Exception as e:
+            # link is lost: tests in flight are failed, the rest is left to other links
+            for target, test_idx in batch:
+                if (results[test_idx] is None):
+                    results[test_idx] = (link_name + ":" + target.name + " (" + repr(e) + ")", False)
+            return
+
+def hw_test_riscv_compliance_sharded(targets, testsuites_todo, sleep_secs=0.1):
+    """Description:
+        Run compliance tests distributed over several sigma tiles
+
+    Parameters:
+        targets (sigma[]): Execution targets, tiles sharing one udm link are grouped together
+        testsuites_todo (str[]): Test suites to run
+        sleep_secs (float): Test program execution time
+
+    Returns:
+        int: 1 if all tests passed, 0 otherwise
+
+    """
+    hw_test_riscv_compliance_header()
     
-    TESTS_FAIL_STR = ""
-    for TEST in TESTS_FAIL:
-        TESTS_FAIL_STR = TESTS_FAIL_STR + " " + TEST
-    if (len(TESTS_FAIL) > 0):
-        print("Failed tests:" + TESTS_FAIL_STR)
+    tests = []
+    for TEST, ref_directory in hw_test_riscv_compliance_testlist(testsuites_todo):
+        tests.append((TEST, ref_directory, hw_test_riscv_compliance_readref(TEST, ref_directory)))
+    
+    links = []
+    for target in targets:
+        for link_targets in links:
+            if (link_targets[0].udm is target.udm):
+                link_targets.append(target)
+                break
+        else:
+            links.append([target])
     
+    print("Running", len(tests), "tests on", len(targets), "tiles over", len(links), "links")
     print("")
-    print("#################################################################################")
+    
+    pending = queue.Queue()
+    for test_idx in range(len(tests)):
+        pending.put(test_idx)
+    results = [None] * len(tests)
+    
+    workers = []
+    for link_idx in range(len(links)):
+        link_name = "link" + str(link_idx)
+        worker = threading.Thread(target=hw_test_riscv_compliance_shard_worker, args=(link_name, links[link_idx], tests, pending, results, sleep_secs))
+        worker.start()
+        workers.append(worker)
+    for worker in workers:
+        worker.join()
+    
+    # report follows test list order regardless of the completion order
+    TESTS_SUCC = []
+    TESTS_FAIL = []
+    for test_idx in range(len(tests)):
+        TEST = tests[test_idx][0]
+        if (results[test_idx] is None):
+            print("#### " + TEST + " TEST NOT RUN! ####")
+            TESTS_FAIL.append(TEST)
+        elif (results[test_idx][1]):
+            print("#### " + TEST + " TEST PASSED! #### (" + results[test_idx][0] + ")")
+            TESTS_SUCC.append(TEST)
+        else:
+            print("#### " + TEST + " TEST FAILED! #### (" + results[test_idx][0] + ")")
+            TESTS_FAIL.append(TEST)
     print("")
+    
+    hw_test_riscv_compliance_summary(TESTS_SUCC, TESTS_FAIL)
+    
+    if (len(TESTS_FAIL) == 0):
+        return 1
+    return 0
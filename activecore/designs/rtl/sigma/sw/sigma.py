@@ -62,6 +62,19 @@ sys.path.append('apps/dhrystone')
 import hw_test_dhrystone
 from hw_test_dhrystone import *
 
+sys.path.append('apps/stream_test')
+import hw_test_stream
+from hw_test_stream import *
+
+import bench_history
+from bench_history import *
+
+import ring_reader
+from ring_reader import *
+
+import prefetcher
+from prefetcher import *
+
 
 class sigma:
 
@@ -69,8 +82,10 @@ class sigma:
     __buf_addr = 0x6000
     __buf_size = 8192
     
-    def __init__(self, udm):
+    def __init__(self, udm, sigma_addr=0x0):
         self.udm = udm
+        self.__sigma_addr = sigma_addr
+        self.name = "sigma@0x{:08x}".format(self.__sigma_addr)
         self.tile = sigma_tile(self.udm, self.__sigma_addr)
     
     def __del__(self):
@@ -81,7 +96,49 @@ class sigma:
             Reset memory region allocated for I/O
 
         """
-        self.udm.clr(self.__buf_addr, self.__buf_size)
+        self.udm.clr((self.__sigma_addr + self.__buf_addr), self.__buf_size)
+    
+    def read_buf(self, length):
+        """Description:
+            Read data words from memory region allocated for I/O
+
+        Parameters:
+            length (int): Number of data words
+
+        Returns:
+            int[]: Read data
+
+        """
+        return self.udm.rdarr32((self.__sigma_addr + self.__buf_addr), length)
+    
+    def load_test(self, firmware_filename, verify=None):
+        """Description:
+            Clear I/O buffer and start test program
+
+        Parameters:
+            firmware_filename (str): Elf file name
+            verify (bool): Check upload with on-target CRC, default is tile.verify
+
+        """
+        self.reset_buf()
+        self.tile.loadelf(firmware_filename, verify)
+    
+    def open_stream(self, callback=None, outfile=None, poll_secs=0.01):
+        """Description:
+            Start host thread draining ring buffer placed in memory region allocated for I/O
+
+        Parameters:
+            callback (function): Called as callback(tag, payload_words) for each record
+            outfile (file): Binary file receiving payload of records
+            poll_secs (float): Sleep between polls of empty buffer
+
+        Returns:
+            ring_reader: Running reader, stop() it before other accesses to the link
+
+        """
+        reader = ring_reader(self.udm, (self.__sigma_addr + self.__buf_addr), self.__buf_size, callback, outfile, poll_secs)
+        reader.start()
+        return reader
     
     def hw_test_generic(self, sigma, test_name, firmware_filename, sleep_secs, verify_data):
         print("#### " + test_name + " TEST STARTED ####");
@@ -96,7 +153,7 @@ class sigma:
         time.sleep(sleep_secs)
         
         print("Reading data buffer...")
-        rdarr = sigma.tile.udm.rdarr32(0x6000, len(verify_data))
+        rdarr = sigma.read_buf(len(verify_data))
         print("Data buffer read!")
     
         test_succ_flag = 1
@@ -113,73 +170,134 @@ class sigma:
         print("")
         return test_succ_flag
     
-    def run_compliance_tests(self, tests):
-        hw_test_riscv_compliance(self, tests)
+    def run_compliance_tests(self, tests, prefetch_depth=2):
+        hw_test_riscv_compliance(self, tests, prefetch_depth)
     
-    def run_app_tests(self):
+    def run_compliance_tests_sharded(self, tests, targets):
         """Description:
-            Run automated hardware tests
+            Run compliance tests on this tile and additional targets in parallel
+
+        Parameters:
+            tests (str[]): Test suites to run
+            targets (sigma[]): Additional sigma tiles, on this or other boards
 
         """
-        test_succ_counter = 0
-        test_fail_counter = 0
+        return hw_test_riscv_compliance_sharded([self] + targets, tests)
+    
+    def run_app_benchmarks(self, history, core, bitstream, runs=5):
+        """Description:
+            Run performance apps several times, store results in benchmark history
+            and check them for regressions against baseline
+
+        Parameters:
+            history (bench_history): Benchmark history database
+            core (str): CPU variant, e.g. agenda, aquaris, ariele, citadel
+            bitstream (str): Bitstream file name or identity string
+            runs (int): Number of runs per app
+
+        Returns:
+            int[]: Ids of stored runs
+
+        """
+        BENCHMARKS = [("Dhrystone", hw_bench_dhrystone, 'apps/dhrystone.riscv')]
         
-        TESTS_FAIL = []
+        bitstream_id = file_digest(bitstream)
+        run_ids = []
+        REGRESSIONS = []
         
-        if (hw_test_dhrystone(self, 'apps/dhrystone.riscv') == 1):
-            test_succ_counter = test_succ_counter + 1
-        else:
-            test_fail_counter = test_fail_counter + 1
-            TESTS_FAIL.append("Dhrystone")
+        for app, hw_bench, firmware_filename in BENCHMARKS:
+            metrics = hw_bench(self, firmware_filename, runs)
+            if metrics is None:
+                REGRESSIONS.append(app)
+                continue
             
+            run_id = history.add_run(core, bitstream_id, file_digest(firmware_filename), app, metrics)
+            run_ids.append(run_id)
+            
+            print(app + " (" + core + "):")
+            for metric in sorted(metrics):
+                mean, std = sample_stats(metrics[metric][1])
+                print("  {:<24} mean: {:<14.4f} stdev: {:<12.4f} n: {}".format(metric, mean, std, len(metrics[metric][1])))
+            
+            base_run_id = history.baseline(core, app, run_id)
+            if base_run_id is None:
+                print("  No baseline found, run ", run_id, " set as baseline")
+                history.set_baseline(run_id)
+            else:
+                for metric, base_mean, mean, pvalue, regression in history.compare(run_id, base_run_id):
+                    if regression:
+                        print("  REGRESSION: {} {:.4f} -> {:.4f} (p = {:.4f}, baseline run {})".format(metric, base_mean, mean, pvalue, base_run_id))
+                        if app not in REGRESSIONS:
+                            REGRESSIONS.append(app)
+            print("")
         
-        if (hw_test_mul_sw(self, 'apps/mul_sw.riscv') == 1):
-            test_succ_counter = test_succ_counter + 1
-        else:
-            test_fail_counter = test_fail_counter + 1
-            TESTS_FAIL.append("MUL_SW")
-        
-        if (hw_test_median(self, 'apps/median.riscv') == 1):
-            test_succ_counter = test_succ_counter + 1
-        else:
-            test_fail_counter = test_fail_counter + 1
-            TESTS_FAIL.append("Median")
-        
-        if (hw_test_qsort(self, 'apps/qsort.riscv') == 1):
-            test_succ_counter = test_succ_counter + 1
-        else:
-            test_fail_counter = test_fail_counter + 1
-            TESTS_FAIL.append("QSort")
-        
-        if (hw_test_rsort(self, 'apps/rsort.riscv') == 1):
-            test_succ_counter = test_succ_counter + 1
-        else:
-            test_fail_counter = test_fail_counter + 1
-            TESTS_FAIL.append("RSort")
-        
-        if (hw_test_crc32(self, 'apps/crc32.riscv') == 1):
-            test_succ_counter = test_succ_counter + 1
+        if (len(REGRESSIONS) > 0):
+            print("Failed or regressed benchmarks: " + "  ".join(REGRESSIONS))
         else:
-            test_fail_counter = test_fail_counter + 1
-            TESTS_FAIL.append("CRC32")
+            print("No regressions found")
+        print("")
+        return run_ids
+    
+    def prefetch_begin(self, filenames, depth=2):
+        """Description:
+            Start preparing elf files on worker thread, so that tile.loadelf
+            finds them parsed and encoded
+
+        Parameters:
+            filenames (str[]): Elf files, in order of loading
+            depth (int): Number of files prepared ahead
+
+        """
+        self.prefetch_end()
+        self.tile.prefetcher = prefetcher(self.tile.prepelf, depth)
+        self.tile.prefetcher.submit(filenames)
+    
+    def prefetch_end(self):
+        """Description:
+            Stop preparing elf files
+
+        """
+        if self.tile.prefetcher is not None:
+            self.tile.prefetcher.close()
+            self.tile.prefetcher = None
+    
+    def run_app_tests(self, prefetch_depth=2):
+        """Description:
+            Run automated hardware tests
+
+        Parameters:
+            prefetch_depth (int): Number of test programs prepared ahead while tests run
+
+        """
+        test_succ_counter = 0
+        test_fail_counter = 0
         
-        if (hw_test_md5(self, 'apps/md5.riscv') == 1):
-            test_succ_counter = test_succ_counter + 1
-        else:
-            test_fail_counter = test_fail_counter + 1
-            TESTS_FAIL.append("MD5")
+        TESTS_FAIL = []
         
-        if (hw_test_bootloader(self, 'apps/bootloader.riscv', 'apps/bootloader_testapp.riscv') == 1):
-            test_succ_counter = test_succ_counter + 1
-        else:
-            test_fail_counter = test_fail_counter + 1
-            TESTS_FAIL.append("Bootloader")
+        APP_TESTS = [
+            ("Dhrystone",   hw_test_dhrystone,      ['apps/dhrystone.riscv']),
+            ("MUL_SW",      hw_test_mul_sw,         ['apps/mul_sw.riscv']),
+            ("Median",      hw_test_median,         ['apps/median.riscv']),
+            ("QSort",       hw_test_qsort,          ['apps/qsort.riscv']),
+            ("RSort",       hw_test_rsort,          ['apps/rsort.riscv']),
+            ("CRC32",       hw_test_crc32,          ['apps/crc32.riscv']),
+            ("MD5",         hw_test_md5,            ['apps/md5.riscv']),
+            ("Bootloader",  hw_test_bootloader,     ['apps/bootloader.riscv', 'apps/bootloader_testapp.riscv']),
+            ("IRQ_counter", hw_test_irq_counter,    ['apps/irq_counter.riscv']),
+            ("Stream",      hw_test_stream,         ['apps/stream_test.riscv'])
+        ]
         
-        if (hw_test_irq_counter(self, 'apps/irq_counter.riscv') == 1):
-            test_succ_counter = test_succ_counter + 1
-        else:
-            test_fail_counter = test_fail_counter + 1
-            TESTS_FAIL.append("IRQ_counter")
+        # bootloader test writes its images through udm directly
+        self.prefetch_begin([firmware_filenames[0] for name, hw_test, firmware_filenames in APP_TESTS if (hw_test != hw_test_bootloader)], prefetch_depth)
+        try:
+            for name, hw_test, firmware_filenames in APP_TESTS:
+                if (hw_test(self, *firmware_filenames) == 1):
+                    test_succ_counter = test_succ_counter + 1
+                else:
+                    test_fail_counter = test_fail_counter + 1
+                    TESTS_FAIL.append(name)
+        finally:
+            self.prefetch_end()
         
         print("Total tests PASSED: ", test_succ_counter, ", FAILED: ", test_fail_counter)
         
@@ -0,0 +1,25 @@
+# -*- coding:utf-8 -*-
+from __future__ import division
+
+import sys
+
+sys.path.append('../../udm/sw')
+import udm
+from udm import *
+
+sys.path.append('../../sigma_tile/sw')
+import sigma_tile_sim
+from sigma_tile_sim import *
+
+import sigma
+from sigma import *
+
+
+udm = udm_sim()
+print("")
+
+sigma = sigma(udm)
+sigma.run_app_tests()
+sigma.run_compliance_tests(["RV32I", "RV32M"])
+
+udm.disconnect()
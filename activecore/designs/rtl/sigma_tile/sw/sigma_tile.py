@@ -11,6 +11,9 @@
 from __future__ import division
 
 import sys
+import struct
+import time
+import zlib
 
 sys.path.append('../../udm/sw')
 import udm
@@ -20,10 +23,24 @@ from udm import *
 class sigma_tile:
 
     __sigma_addr = 0x0
+    __reset_pc = 0x200
     
-    def __init__(self, udm, sigma_addr):
+    # verify_crc32.S, parameter block follows the code
+    __verify_code = [
+        0x00000517, 0x09050513, 0x00052583, 0x00450613, 0x00359693, 0x00d606b3, 0xedb88fb7, 0x320f8f93,
+        0x06058063, 0x00062283, 0x00462303, 0x00628333, 0xfff00393, 0x02628a63, 0x0002ce03, 0x01c3c3b3,
+        0x00800e93, 0x0013ff13, 0x41e00f33, 0x01ff7f33, 0x0013d393, 0x01e3c3b3, 0xfffe8e93, 0xfe0e94e3,
+        0x00128293, 0xfd1ff06f, 0xfff3c393, 0x0076a023, 0x00468693, 0x00860613, 0xfff58593, 0xfa5ff06f,
+        0x600d62b7, 0x00d28293, 0x0056a023, 0x0000006f
+    ]
+    __verify_done = 0x600d600d
+    
+    def __init__(self, udm, sigma_addr, ram_size=0x8000):
         self.udm = udm
         self.__sigma_addr = sigma_addr
+        self.ram_size = ram_size
+        self.prefetcher = None
+        self.verify = False
         IDCODE = self.udm.rd32((self.__sigma_addr + 0x00100000))
         print("sigma_tile@0x{:08x}".format(self.__sigma_addr) , ": IDCODE: ", hex(IDCODE))
         print()
@@ -55,30 +72,152 @@ class sigma_tile:
         """
         self.udm.wr32((self.__sigma_addr + 0x00100004), 0x03)
     
-    def loadbin(self, filename):
+    def loadbin(self, filename, verify=None):
         """Description:
             Write data from binary file to local CPU RAM
 
         Parameters:
             filename (str): Binary file name
+            verify (bool): Check upload with on-target CRC, default is self.verify
 
         """
         self.sw_rst()
         self.udm.wrbin32_le(self.__sigma_addr, filename)
+        if (self.verify if verify is None else verify):
+            f = open(filename, "rb")
+            try:
+                dbs = f.read()
+            finally:
+                f.close()
+            dbs = dbs + bytes(bytearray((4 - (len(dbs) & 3)) & 3))
+            if not self.verify_ranges([(0x0, struct.unpack("<{}I".format(len(dbs) >> 2), dbs))]):
+                raise Exception("Error: upload verification failed: " + filename)
         self.sw_nrst()
     
-    def loadelf(self, filename):
+    def prepelf(self, filename):
         """Description:
-            Write elf file to local CPU RAM
+            Parse elf file and encode its writes to local CPU RAM
 
         Parameters:
             filename (str): Elf file name
 
+        Returns:
+            tuple: Prepared image for loadprep
+
+        """
+        return self.udm.prepelf32(self.__sigma_addr, filename)
+    
+    def loadprep(self, prepared, verify=None):
+        """Description:
+            Write elf file prepared by prepelf to local CPU RAM
+
+        Parameters:
+            prepared (tuple): Prepared image
+            verify (bool): Check upload with on-target CRC, default is self.verify
+
         """
         self.sw_rst()
-        self.udm.wrelf32(self.__sigma_addr, filename)
+        self.udm.wrprepelf32(prepared)
+        if (self.verify if verify is None else verify):
+            filename, e_machine, prog_headers, frames = prepared
+            if not self.verify_ranges([(vaddr, dbs) for offset, vaddr, size, address, dbs, frame in frames]):
+                raise Exception("Error: upload verification failed: " + filename)
         self.sw_nrst()
     
+    def loadelf(self, filename, verify=None):
+        """Description:
+            Write elf file to local CPU RAM, using image prepared
+            in advance by prefetcher if there is one
+
+        Parameters:
+            filename (str): Elf file name
+            verify (bool): Check upload with on-target CRC, default is self.verify
+
+        """
+        prepared = None
+        if self.prefetcher is not None:
+            prepared = self.prefetcher.take(filename)
+        if prepared is None:
+            prepared = self.prepelf(filename)
+        self.loadprep(prepared, verify)
+    
+    def __verify_area(self, ranges, size):
+        # highest word-aligned free area, not touching uploaded data and reset vector
+        busy = [(addr, (addr + (len(dbs) << 2))) for addr, dbs in ranges]
+        busy.append((self.__reset_pc, (self.__reset_pc + 4)))
+        busy.sort()
+        end = self.ram_size
+        for start, stop in reversed(busy):
+            if (stop <= end) and ((end - stop) >= size):
+                return end - size
+            end = min(end, (start & ~3))
+        if (end >= size):
+            return end - size
+        raise Exception("Error: no free memory for upload verification routine!")
+    
+    def verify_ranges(self, ranges, timeout_secs=1.0):
+        """Description:
+            Check uploaded memory by running CRC32 routine on the tile: only
+            the routine, one CRC word per range and a few control words are
+            transferred. Tile should be in software reset and is left in it.
+
+        Parameters:
+            ranges (tuple[]): Uploaded data as (local address, datawords)
+            timeout_secs (float): Time given to the routine
+
+        Returns:
+            bool: True if all ranges match
+
+        """
+        ranges = [(addr, dbs) for addr, dbs in ranges if (len(dbs) > 0)]
+        params = [len(ranges)]
+        for addr, dbs in ranges:
+            params += [addr, (len(dbs) << 2)]
+        area_words = len(self.__verify_code) + len(params) + len(ranges) + 1
+        base = self.__verify_area(ranges, (area_words << 2))
+        results_addr = self.__sigma_addr + base + ((area_words - len(ranges) - 1) << 2)
+        
+        # reset vector is patched with jump to the routine
+        offset = base - self.__reset_pc
+        jump = ((((offset >> 20) & 0x1) << 31) | (((offset >> 1) & 0x3ff) << 21) | (((offset >> 11) & 0x1) << 20) | (((offset >> 12) & 0xff) << 12) | 0x6f)
+        reset_word = None
+        for addr, dbs in ranges:
+            if (addr <= self.__reset_pc) and (self.__reset_pc < (addr + (len(dbs) << 2))):
+                reset_word = dbs[(self.__reset_pc - addr) >> 2]
+        if reset_word is None:
+            reset_word = self.udm.rd32(self.__sigma_addr + self.__reset_pc)
+        area_saved = self.udm.rdarr32((self.__sigma_addr + base), area_words)
+        
+        self.udm.wrarr32((self.__sigma_addr + base), (self.__verify_code + params + ([0] * (len(ranges) + 1))))
+        self.udm.wr32((self.__sigma_addr + self.__reset_pc), jump)
+        self.sw_nrst()
+        deadline = time.time() + timeout_secs
+        while True:
+            results = self.udm.rdarr32(results_addr, (len(ranges) + 1))
+            if (results[-1] == self.__verify_done) or (time.time() > deadline):
+                break
+            time.sleep(0.001)
+        self.sw_rst()
+        self.udm.wr32((self.__sigma_addr + self.__reset_pc), reset_word)
+        self.udm.wrarr32((self.__sigma_addr + base), area_saved)
+        
+        if (results[-1] != self.__verify_done):
+            print("VERIFY FAILED: checksum routine did not finish")
+            return False
+        verify_succ_flag = (self.udm.rd32(self.__sigma_addr + self.__reset_pc) == reset_word)
+        if not verify_succ_flag:
+            print("VERIFY FAILED: reset vector word mismatch")
+        for i in range(len(ranges)):
+            addr, dbs = ranges[i]
+            if (addr <= self.__reset_pc) and (self.__reset_pc < (addr + (len(dbs) << 2))):
+                dbs = list(dbs)
+                dbs[(self.__reset_pc - addr) >> 2] = jump
+            crc = zlib.crc32(struct.pack("<{}I".format(len(dbs)), *dbs)) & 0xffffffff
+            if (crc != results[i]):
+                verify_succ_flag = False
+                print("VERIFY FAILED: range 0x%08x" % addr, "size: 0x%08x" % (len(dbs) << 2), "expected CRC: 0x%08x" % crc, ", received: 0x%08x" % results[i])
+        return verify_succ_flag
+    
     def sgi(self, irq_num):
         """Description:
             Fire software generated interrupt
@@ -0,0 +1,581 @@
+# -*- coding:utf-8 -*-
+
+#
+# sigma_tile_sim.py
+#
+#     License: See LICENSE file for details
+#
+
+from __future__ import division
+
+import sys
+
+sys.path.append('../../udm/sw')
+import udm
+from udm import *
+
+
+def _sx(v):
+    return (v ^ 0x80000000) - 0x80000000
+
+def _div(a, b):
+    if (b == 0):
+        return 0xffffffff
+    a = _sx(a)
+    b = _sx(b)
+    q = abs(a) // abs(b)
+    if ((a < 0) != (b < 0)):
+        q = -q
+    return q & 0xffffffff
+
+def _rem(a, b):
+    if (b == 0):
+        return a
+    a = _sx(a)
+    b = _sx(b)
+    r = abs(a) % abs(b)
+    if (a < 0):
+        r = -r
+    return r & 0xffffffff
+
+def _divu(a, b):
+    if (b == 0):
+        return 0xffffffff
+    return a // b
+
+def _remu(a, b):
+    if (b == 0):
+        return a
+    return a % b
+
+
+class rv32im_tile:
+    """RV32IM instruction-set model of one sigma tile: CPU, local RAM and SFRs.
+
+    Code is translated into Python functions one basic block at a time and
+    cached by start address; stores into RAM pages holding translated code
+    drop the affected blocks. Interrupts, timer and idle detection are
+    handled at block boundaries.
+    """
+
+    RAM_SIZE        = 0x00100000
+    SFR_ADDR        = 0x00100000
+    RESET_PC        = 0x00000200
+    ISR_PC          = 0x00000080
+    IDLE_INSTR      = 0x0000006f    # j .
+    MAX_BLOCK_LEN   = 64
+    PAGE_SHIFT      = 8
+
+    def __init__(self, xif, corenum=0):
+        self.xif = xif
+        self.corenum = corenum
+        self.mem = [0] * (self.RAM_SIZE >> 2)
+        self.code_pages = bytearray(self.RAM_SIZE >> self.PAGE_SHIFT)
+        self.blocks = {}
+        self.page_blocks = {}
+        self.x = [0] * 32
+        self.sw_reset = 1
+        self.free_running = False
+        self.reset()
+
+    def reset(self):
+        # translated blocks hold a reference to the register file: clear in place
+        for i in range(32):
+            self.x[i] = 0
+        self.pc = self.RESET_PC
+        self.cycles = 0
+        self.mirqen = 1
+        self.mcause = 0
+        self.mretaddr = 0
+        self.irq_en = 0
+        self.irq_flags = 0
+        self.timer_run = 0
+        self.timer_reload = 0
+        self.timer_period = 0
+        self.timer_start = 0
+        self.timer_deadline = None
+        self.event_cycle = None
+        self.trap = None
+
+    # ---- memory and SFR access ----
+
+    def invalidate(self, addr):
+        page = addr >> self.PAGE_SHIFT
+        if self.code_pages[page]:
+            self.code_pages[page] = 0
+            for pc in self.page_blocks.pop(page, []):
+                self.blocks.pop(pc, None)
+
+    def flush(self):
+        self.blocks = {}
+        self.page_blocks = {}
+        self.code_pages = bytearray(self.RAM_SIZE >> self.PAGE_SHIFT)
+
+    def __timer_value(self):
+        if self.timer_run:
+            return (self.cycles - self.timer_start) & 0xffffffff
+        return 0
+
+    def __update_events(self):
+        if self.irq_flags & 0xfffe:
+            self.event_cycle = 0
+        else:
+            self.event_cycle = self.timer_deadline
+
+    def raise_irq(self, irq_num):
+        self.irq_flags |= (1 << irq_num)
+        self.__update_events()
+
+    def sfr_rd(self, offset):
+        if (offset == 0x00):
+            return 0xdeadbeef
+        if (offset == 0x04):
+            return self.sw_reset
+        if (offset == 0x08):
+            return self.corenum
+        if (offset == 0x10):
+            return self.irq_en
+        if (offset == 0x20):
+            return (self.timer_reload << 1) | self.timer_run
+        if (offset == 0x24):
+            return self.timer_period
+        if (offset == 0x28):
+            return self.__timer_value()
+        return 0
+
+    def sfr_wr(self, offset, data):
+        if (offset == 0x04):
+            if (data & 0x2):
+                # auto-clearable reset: single pulse
+                self.reset()
+                self.sw_reset = 0
+            else:
+                if (self.sw_reset and not (data & 0x1)):
+                    self.reset()
+                self.sw_reset = data & 0x1
+        elif (offset == 0x10):
+            self.irq_en = data
+        elif (offset == 0x14):
+            self.raise_irq(data & 0xf)
+        elif (offset == 0x20):
+            self.timer_run = data & 0x1
+            self.timer_reload = (data >> 1) & 0x1
+            self.timer_start = self.cycles
+            self.timer_deadline = None
+            if (self.timer_run and self.timer_period != 0):
+                self.timer_deadline = self.cycles + self.timer_period
+            self.__update_events()
+        elif (offset == 0x24):
+            self.timer_period = data
+
+    def ld(self, addr, size):
+        if (addr < self.RAM_SIZE):
+            word = self.mem[addr >> 2]
+        elif ((addr & 0xfffff000) == self.SFR_ADDR):
+            word = self.sfr_rd(addr & 0xfc)
+        elif (addr >= 0x80000000):
+            word = self.xif.xif_rd(addr & 0xfffffffc)
+        else:
+            word = 0
+        shift = (addr & 3) << 3
+        if (size == 1):
+            return (word >> shift) & 0xff
+        if (size == 2):
+            return (word >> shift) & 0xffff
+        return word
+
+    def st(self, addr, data, size):
+        if (addr < self.RAM_SIZE):
+            idx = addr >> 2
+            shift = (addr & 3) << 3
+            if (size == 1):
+                self.mem[idx] = (self.mem[idx] & ~(0xff << shift)) | ((data & 0xff) << shift)
+            elif (size == 2):
+                self.mem[idx] = (self.mem[idx] & ~(0xffff << shift)) | ((data & 0xffff) << shift)
+            else:
+                self.mem[idx] = data
+            if self.code_pages[addr >> self.PAGE_SHIFT]:
+                self.invalidate(addr)
+        elif ((addr & 0xfffff000) == self.SFR_ADDR):
+            self.sfr_wr(addr & 0xfc, data)
+        elif (addr >= 0x80000000):
+            self.xif.xif_wr(addr & 0xfffffffc, data)
+
+    # ---- CSRs and traps ----
+
+    def csr_rd(self, csrnum):
+        if (csrnum == 0x000) or (csrnum == 0x342):
+            return self.mcause
+        if (csrnum == 0x341):
+            return self.mretaddr
+        if (csrnum in (0xb00, 0xc00, 0xc01, 0xb02, 0xc02)):
+            return self.cycles & 0xffffffff
+        if (csrnum in (0xb80, 0xc80, 0xc81, 0xb82, 0xc82)):
+            return (self.cycles >> 32) & 0xffffffff
+        return 0
+
+    def csr_wr(self, csrnum, data):
+        if (csrnum == 0x341):
+            self.mretaddr = data
+
+    def mret(self):
+        self.mirqen = 1
+        self.__update_events()
+        return self.mretaddr
+
+    def halt(self, pc, reason):
+        self.trap = "{} at 0x{:08x}".format(reason, pc)
+        return pc
+
+    # ---- translation ----
+
+    def __gen_instr(self, pc, instr):
+        # returns (source lines, terminator flag)
+        opcode = instr & 0x7f
+        rd = (instr >> 7) & 0x1f
+        funct3 = (instr >> 12) & 0x7
+        rs1 = (instr >> 15) & 0x1f
+        rs2 = (instr >> 20) & 0x1f
+        funct7 = instr >> 25
+        imm_i = _sx(instr) >> 20
+        imm_s = ((_sx(instr) >> 20) & ~0x1f) | rd
+        imm_b = (_sx(instr & 0x80000000) >> 19) | ((instr & 0x80) << 4) | ((instr >> 20) & 0x7e0) | ((instr >> 7) & 0x1e)
+        imm_u = instr & 0xfffff000
+        imm_j = (_sx(instr & 0x80000000) >> 11) | (instr & 0xff000) | ((instr >> 9) & 0x800) | ((instr >> 20) & 0x7fe)
+        r1 = "x[%d]" % rs1 if rs1 else "0"
+        r2 = "x[%d]" % rs2 if rs2 else "0"
+        s1 = "((x[%d] ^ 0x80000000) - 0x80000000)" % rs1 if rs1 else "0"
+        s2 = "((x[%d] ^ 0x80000000) - 0x80000000)" % rs2 if rs2 else "0"
+        dst = "x[%d] = " % rd
+        nxt = (pc + 4) & 0xffffffff
+
+        if (opcode == 0x37):
+            return ([dst + str(imm_u)] if rd else []), False
+        if (opcode == 0x17):
+            return ([dst + str((pc + imm_u) & 0xffffffff)] if rd else []), False
+        if (opcode == 0x6f):
+            lines = [dst + str(nxt)] if rd else []
+            return lines + ["return %d" % ((pc + imm_j) & 0xffffffff)], True
+        if (opcode == 0x67) and (funct3 == 0):
+            lines = ["t = (%s + %d) & 0xfffffffe" % (r1, imm_i)]
+            if rd:
+                lines.append(dst + str(nxt))
+            return lines + ["return t"], True
+        if (opcode == 0x63):
+            cond = {0: "%s == %s" % (r1, r2),
+                    1: "%s != %s" % (r1, r2),
+                    4: "%s < %s" % (s1, s2),
+                    5: "%s >= %s" % (s1, s2),
+                    6: "%s < %s" % (r1, r2),
+                    7: "%s >= %s" % (r1, r2)}.get(funct3)
+            if cond is None:
+                return ["return halt(%d, 'illegal instruction')" % pc], True
+            return ["return %d if %s else %d" % ((pc + imm_b) & 0xffffffff, cond, nxt)], True
+        if (opcode == 0x03):
+            lines = ["a = (%s + %d) & 0xffffffff" % (r1, imm_i)]
+            if (funct3 == 2):
+                val = "(m[a >> 2] if a < %d else ld(a, 4))" % self.RAM_SIZE
+            elif (funct3 in (0, 4)):
+                val = "(((m[a >> 2] >> ((a & 3) << 3)) & 0xff) if a < %d else ld(a, 1))" % self.RAM_SIZE
+            elif (funct3 in (1, 5)):
+                val = "(((m[a >> 2] >> ((a & 3) << 3)) & 0xffff) if a < %d else ld(a, 2))" % self.RAM_SIZE
+            else:
+                return ["return halt(%d, 'illegal instruction')" % pc], True
+            if (funct3 == 0):
+                val = "((%s ^ 0x80) - 0x80) & 0xffffffff" % val
+            elif (funct3 == 1):
+                val = "((%s ^ 0x8000) - 0x8000) & 0xffffffff" % val
+            if rd:
+                lines.append(dst + val)
+            else:
+                lines.append("t = " + val)
+            return lines, False
+        if (opcode == 0x23):
+            if (funct3 > 2):
+                return ["return halt(%d, 'illegal instruction')" % pc], True
+            size = 1 << funct3
+            lines = ["a = (%s + %d) & 0xffffffff" % (r1, imm_s),
+                     "if a < %d:" % self.RAM_SIZE]
+            if (size == 4):
+                lines.append("    m[a >> 2] = %s" % r2)
+            else:
+                mask = (1 << (size * 8)) - 1
+                lines.append("    i = a >> 2")
+                lines.append("    s = (a & 3) << 3")
+                lines.append("    m[i] = (m[i] & ~(%d << s)) | ((%s & %d) << s)" % (mask, r2, mask))
+            lines.append("    if cp[a >> %d]: inv(a)" % self.PAGE_SHIFT)
+            lines.append("else:")
+            lines.append("    st(a, %s, %d)" % (r2, size))
+            return lines, False
+        if (opcode == 0x13):
+            shamt = rs2
+            expr = {0: "(%s + %d) & 0xffffffff" % (r1, imm_i),
+                    2: "1 if %s < %d else 0" % (s1, imm_i),
+                    3: "1 if %s < %d else 0" % (r1, imm_i & 0xffffffff),
+                    4: "%s ^ %d" % (r1, imm_i & 0xffffffff),
+                    6: "%s | %d" % (r1, imm_i & 0xffffffff),
+                    7: "%s & %d" % (r1, imm_i & 0xffffffff),
+                    1: "(%s << %d) & 0xffffffff" % (r1, shamt)}.get(funct3)
+            if (funct3 == 5):
+                if (funct7 == 0x20):
+                    expr = "(%s >> %d) & 0xffffffff" % (s1, shamt)
+                else:
+                    expr = "%s >> %d" % (r1, shamt)
+            return ([dst + expr] if rd else []), False
+        if (opcode == 0x33):
+            if (funct7 == 0x01):
+                expr = {0: "(%s * %s) & 0xffffffff" % (r1, r2),
+                        1: "((%s * %s) >> 32) & 0xffffffff" % (s1, s2),
+                        2: "((%s * %s) >> 32) & 0xffffffff" % (s1, r2),
+                        3: "(%s * %s) >> 32" % (r1, r2),
+                        4: "div(%s, %s)" % (r1, r2),
+                        5: "divu(%s, %s)" % (r1, r2),
+                        6: "rem(%s, %s)" % (r1, r2),
+                        7: "remu(%s, %s)" % (r1, r2)}[funct3]
+            elif (funct7 == 0x00):
+                expr = {0: "(%s + %s) & 0xffffffff" % (r1, r2),
+                        1: "(%s << (%s & 0x1f)) & 0xffffffff" % (r1, r2),
+                        2: "1 if %s < %s else 0" % (s1, s2),
+                        3: "1 if %s < %s else 0" % (r1, r2),
+                        4: "%s ^ %s" % (r1, r2),
+                        5: "%s >> (%s & 0x1f)" % (r1, r2),
+                        6: "%s | %s" % (r1, r2),
+                        7: "%s & %s" % (r1, r2)}[funct3]
+            elif (funct7 == 0x20) and (funct3 == 0):
+                expr = "(%s - %s) & 0xffffffff" % (r1, r2)
+            elif (funct7 == 0x20) and (funct3 == 5):
+                expr = "(%s >> (%s & 0x1f)) & 0xffffffff" % (s1, r2)
+            else:
+                return ["return halt(%d, 'illegal instruction')" % pc], True
+            return ([dst + expr] if rd else []), False
+        if (opcode == 0x0f):
+            if (funct3 == 1):
+                # fence.i: drop translations, continue at next instruction
+                return ["flush()", "return %d" % nxt], True
+            return [], False
+        if (opcode == 0x73):
+            csrnum = instr >> 20
+            if (funct3 == 0):
+                if (instr == 0x30200073):
+                    return ["return mret()"], True
+                if (instr == 0x10500073):
+                    return [], False
+                if (instr == 0x00000073):
+                    return ["return halt(%d, 'ecall')" % pc], True
+                if (instr == 0x00100073):
+                    return ["return halt(%d, 'ebreak')" % pc], True
+                return ["return halt(%d, 'illegal instruction')" % pc], True
+            src = r1 if (funct3 < 4) else str(rs1)
+            lines = ["t = csr_rd(%d)" % csrnum]
+            if (funct3 & 3) == 1:
+                lines.append("csr_wr(%d, %s)" % (csrnum, src))
+            elif (funct3 & 3) == 2:
+                if (rs1 != 0):
+                    lines.append("csr_wr(%d, t | %s)" % (csrnum, src))
+            elif (funct3 & 3) == 3:
+                if (rs1 != 0):
+                    lines.append("csr_wr(%d, t & ~%s & 0xffffffff)" % (csrnum, src))
+            else:
+                return ["return halt(%d, 'illegal instruction')" % pc], True
+            if rd:
+                lines.append(dst + "t")
+            return lines + ["return %d" % nxt], True
+        return ["return halt(%d, 'illegal instruction')" % pc], True
+
+    def __translate(self, pc):
+        if (pc >= self.RAM_SIZE) or (pc & 3):
+            return (lambda: self.halt(pc, "fetch fault"), 1, False)
+        idle = (self.mem[pc >> 2] == self.IDLE_INSTR)
+        src = ["def blk():"]
+        addr = pc
+        length = 0
+        while True:
+            lines, term = self.__gen_instr(addr, self.mem[addr >> 2])
+            src += ["    " + line for line in lines]
+            addr += 4
+            length += 1
+            if term:
+                break
+            if (length == self.MAX_BLOCK_LEN) or (addr >= self.RAM_SIZE):
+                src.append("    return %d" % addr)
+                break
+        env = {"x": self.x, "m": self.mem, "cp": self.code_pages, "inv": self.invalidate,
+               "ld": self.ld, "st": self.st, "csr_rd": self.csr_rd, "csr_wr": self.csr_wr,
+               "mret": self.mret, "halt": self.halt, "flush": self.flush,
+               "div": _div, "divu": _divu, "rem": _rem, "remu": _remu}
+        exec(compile("\n".join(src), "<rv32im@0x%08x>" % pc, "exec"), env)
+        block = (env["blk"], length, idle)
+        for page in range(pc >> self.PAGE_SHIFT, ((addr - 1) >> self.PAGE_SHIFT) + 1):
+            self.code_pages[page] = 1
+            self.page_blocks.setdefault(page, []).append(pc)
+        self.blocks[pc] = block
+        return block
+
+    # ---- execution ----
+
+    def __events(self):
+        if (self.timer_deadline is not None) and (self.cycles >= self.timer_deadline):
+            if self.irq_en & 0x2:
+                self.irq_flags |= 0x2
+            if self.timer_reload:
+                self.timer_start = self.timer_deadline
+                self.timer_deadline += self.timer_period
+            else:
+                self.timer_run = 0
+                self.timer_deadline = None
+        pending = self.irq_flags & 0xfffe
+        if pending and self.mirqen:
+            irq_num = 1
+            while not (pending & (1 << irq_num)):
+                irq_num += 1
+            self.irq_flags &= ~(1 << irq_num)
+            self.mcause = irq_num
+            self.mretaddr = self.pc
+            self.mirqen = 0
+            self.pc = self.ISR_PC
+        self.__update_events()
+
+    def run(self, max_instrs):
+        """Run until idle loop is reached with nothing left to do
+
+        Returns number of executed instructions.
+        """
+        if self.sw_reset or (self.trap is not None):
+            return 0
+        blocks = self.blocks
+        x = self.x
+        start = self.cycles
+        limit = start + max_instrs
+        while self.cycles < limit:
+            if (self.event_cycle is not None) and (self.cycles >= self.event_cycle):
+                self.__events()
+            block = blocks.get(self.pc)
+            if block is None:
+                block = self.__translate(self.pc)
+            if block[2]:
+                pending = self.irq_flags & 0xfffe
+                if pending and self.mirqen:
+                    continue
+                if (self.timer_deadline is not None) and (self.irq_en & 0x2):
+                    # fast-forward idle loop to timer expiry
+                    self.cycles = max(self.cycles, self.timer_deadline)
+                    continue
+                break
+            self.cycles += block[1]
+            self.pc = block[0]()
+            x[0] = 0
+            if self.trap is not None:
+                print("rv32im tile", self.corenum, "halted:", self.trap)
+                break
+        return self.cycles - start
+
+
+class udm_sim(udm):
+    """Drop-in replacement for udm that talks to simulated sigma tiles.
+
+    Tiles execute lazily: before each host access the tiles are run until
+    their program parks in an idle loop (j .), so host-side sleeps are not
+    needed to make results visible. A tile that spends max_instrs without
+    reaching idle (e.g. polling the IO buffer forever) is treated as free
+    running and only advanced by quantum instructions per host access.
+    """
+
+    __tile_span = 0x00200000
+
+    def __init__(self, tile_addrs=[0x00000000], xif_addr=0x80000000, max_instrs=5000000, quantum=200000):
+        self.tile_addrs = list(tile_addrs)
+        self.tiles = []
+        for tile_idx in range(len(self.tile_addrs)):
+            self.tiles.append(rv32im_tile(self, tile_idx))
+        self.xif_addr = xif_addr
+        self.xif_regs = {}
+        self.max_instrs = max_instrs
+        self.quantum = quantum
+        print("Connected to simulated sigma tiles:", ", ".join(["0x{:08x}".format(addr) for addr in self.tile_addrs]))
+
+    def connect(self, com_num, baudrate):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def check(self):
+        pass
+
+    def rst(self):
+        for tile in self.tiles:
+            tile.sw_reset = 1
+
+    def nrst(self):
+        for tile in self.tiles:
+            tile.reset()
+            tile.sw_reset = 0
+            tile.free_running = False
+
+    def xif_rd(self, address):
+        return self.xif_regs.get(address, 0)
+
+    def xif_wr(self, address, dataword):
+        self.xif_regs[address] = dataword & 0xffffffff
+
+    def run(self):
+        """Description:
+            Run all tiles until idle
+
+        Returns:
+            int: Number of executed instructions
+
+        """
+        instrs = 0
+        for tile in self.tiles:
+            if tile.free_running:
+                instrs += tile.run(self.quantum)
+            else:
+                tile_instrs = tile.run(self.max_instrs)
+                tile.free_running = (tile_instrs >= self.max_instrs)
+                instrs += tile_instrs
+        return instrs
+
+    def __decode(self, address):
+        for tile_idx in range(len(self.tile_addrs)):
+            offset = address - self.tile_addrs[tile_idx]
+            if (offset >= 0) and (offset < self.__tile_span):
+                return self.tiles[tile_idx], offset
+        return None, address
+
+    def wr32(self, address, dataword):
+        self.wrarr32(address, [dataword])
+
+    def rd32(self, address):
+        return self.rdarr32(address, 1)[0]
+
+    def wrarr32(self, address, datawords):
+        self.run()
+        for dataword in datawords:
+            tile, offset = self.__decode(address)
+            if tile is not None:
+                if (offset < tile.RAM_SIZE):
+                    tile.mem[offset >> 2] = dataword & 0xffffffff
+                    tile.invalidate(offset)
+                else:
+                    tile.st(offset, dataword & 0xffffffff, 4)
+            elif (address >= self.xif_addr):
+                self.xif_wr((0x80000000 + address - self.xif_addr), dataword)
+            address += 4
+
+    def wrframe32(self, address, datawords, frame):
+        self.wrarr32(address, datawords)
+
+    def rdarr32(self, address, length):
+        self.run()
+        rdatawords = []
+        for i in range(length):
+            tile, offset = self.__decode(address)
+            if tile is not None:
+                rdatawords.append(tile.ld(offset, 4))
+            elif (address >= self.xif_addr):
+                rdatawords.append(self.xif_rd(0x80000000 + address - self.xif_addr))
+            else:
+                rdatawords.append(0)
+            address += 4
+        return rdatawords
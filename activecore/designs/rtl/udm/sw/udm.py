@@ -209,17 +209,40 @@ class udm:
             address (int): Starting address
             datawords (int[]): Data words
 
+        """
+        self.wrframe32(address, datawords, self.encode_wrarr32(address, datawords))
+    
+    def encode_wrarr32(self, address, datawords):
+        """Description:
+            Encode burst write of array into escaped byte stream
+
+        Parameters:
+            address (int): Starting address
+            datawords (int[]): Data words
+
+        Returns:
+            bytes: Request bytes, ready for wrframe32
+
+        """
+        escape = struct.pack('B', self.__escape_byte)
+        sync = struct.pack('B', self.__sync_byte)
+        payload = struct.pack("<II{}I".format(len(datawords)), address, (len(datawords) << 2), *datawords)
+        payload = payload.replace(escape, escape + escape).replace(sync, escape + sync)
+        return struct.pack('BB', self.__sync_byte, self.__wr_cmd) + payload
+    
+    def wrframe32(self, address, datawords, frame):
+        """Description:
+            Burst write of array encoded by encode_wrarr32
+
+        Parameters:
+            address (int): Starting address
+            datawords (int[]): Data words
+            frame (bytes): Encoded request
+
         """
         try:
             self.ser.flush()
-            self.__sendbyte(self.__sync_byte)
-            self.__sendbyte(self.__wr_cmd)
-            self.__sendword32(address)     
-            count = len(datawords) 
-            self.__sendword32(count << 2)
-            # write data
-            for i in range(count):
-                self.__sendword32(datawords[i])
+            self.ser.write(frame)
             self.__wr_finalize()
         except:
             self.discon()
@@ -324,109 +347,111 @@ class udm:
             self.wrarr32(address, wrdataarr)
             f.close()
     
-    def wrelf32(self, base_offset, filename):
+    def readelf32(self, filename):
         """Description:
-            Write elf file to memory
+            Parse elf file
 
         Parameters:
-            base_offset (int): Write offset
             filename (str): Elf file name
 
+        Returns:
+            (int, tuple[], tuple[]): e_machine, program headers,
+            loadable segments as (p_offset, p_vaddr, p_filesz, datawords)
+
         """
-        print("----------------")
         f = open(filename, "rb")
         try:
             e_ident = f.read(16)
             e_ident = struct.unpack("BBBBBBBBBBBBBBBB", e_ident)
             if ((e_ident[0] != 0x7f) | (e_ident[1] != 0x45) | (e_ident[2] != 0x4c) | (e_ident[3] != 0x46)):
                 raise Exception("Error: elf signature incorrect!")
-            print("Loading elf file: ", filename)
             
-            e_type = f.read(2)
-            e_type = struct.unpack("H", e_type)
-            if (e_type[0] != 0x02):
+            e_type, e_machine, e_version, e_entry, e_phoff, e_shoff, e_flags, e_ehsize, e_phentsize, e_phnum, e_shentsize, e_shnum, e_shstrndx = struct.unpack("<HHIIIIIHHHHHH", f.read(36))
+            if (e_type != 0x02):
                 raise Exception("Error: e_type is not executable!")
-            print("-- e_type: ET_EXEC")
             
-            e_machine = f.read(2)
-            e_machine = struct.unpack("H", e_machine)
-            if (e_machine[0] == 243):
-                print("-- e_machine: RISC-V")
-            else:
-                print("-- e_machine: ", hex(e_machine[0]))
-            
-            e_version = f.read(4)
-            e_version = struct.unpack("L", e_version)
-            
-            e_entry = f.read(4)
-            e_entry = struct.unpack("L", e_entry)
-            #print("-- e_entry: ", hex(e_entry[0]))
-    
-            e_phoff = f.read(4)
-            e_phoff = struct.unpack("L", e_phoff)
-            #print("-- e_phoff: ", hex(e_phoff[0]))
-    
-            e_shoff = f.read(4)
-            e_shoff = struct.unpack("L", e_shoff)
-            #print("-- e_shoff: ", hex(e_shoff[0]))
-    
-            e_flags = f.read(4)
-            e_flags = struct.unpack("L", e_flags)
-            #print("-- e_flags: ", hex(e_flags[0]))
-    
-            e_ehsize = f.read(2)
-            e_ehsize = struct.unpack("H", e_ehsize)
-            #print("-- e_ehsize: ", hex(e_ehsize[0]))
-    
-            e_phentsize = f.read(2)
-            e_phentsize = struct.unpack("H", e_phentsize)
-            #print("-- e_phentsize: ", hex(e_phentsize[0]))
-    
-            e_phnum = f.read(2)
-            e_phnum = struct.unpack("H", e_phnum)
-            #print("-- e_phnum: ", hex(e_phnum[0]))
-    
-            e_shentsize = f.read(2)
-            e_shentsize = struct.unpack("H", e_shentsize)
-            #print("-- e_shentsize: ", hex(e_shentsize[0]))
-    
-            e_shnum = f.read(2)
-            e_shnum = struct.unpack("H", e_shnum)
-            #print("-- e_shnum: ", hex(e_shnum[0]))
-    
-            e_shstrndx = f.read(2)
-            e_shstrndx = struct.unpack("H", e_shstrndx)
-            #print("-- e_shstrndx: ", hex(e_shstrndx[0]))
-    
             prog_headers = []
-            print("Program Headers:")
-            print("-----------------------------------------------------------------------------------------------------------")
-            print(" № | p_type     | p_offset   | p_vaddr    | p_paddr    | p_filesz   | p_memsz    | p_flags    | p_align")
-            phnum = 0
-            for h in range(e_phnum[0]):
+            for h in range(e_phnum):
                 prog_header = f.read(32)
-                prog_header = struct.unpack("LLLLLLLL", prog_header)
+                prog_header = struct.unpack("<IIIIIIII", prog_header)
                 PT_LOAD = 1
                 if prog_header[0] != PT_LOAD:
                     raise Exception("Error: p_type incorrect: 0x%08x" % prog_header[0])
-                print("%2d" % phnum, "| 0x%08x" % prog_header[0], "| 0x%08x" % prog_header[1], "| 0x%08x" % prog_header[2], "| 0x%08x" % prog_header[3], "| 0x%08x" % prog_header[4], "| 0x%08x" % prog_header[5], "| 0x%08x" % prog_header[6], "| 0x%08x" % prog_header[7])
-                prog_headers.append((prog_header[1], prog_header[2], prog_header[4]))
-                phnum+=1
-            print("-----------------------------------------------------------------------------------------------------------")
-    
+                prog_headers.append(prog_header)
+            
+            segments = []
             for prog_header in prog_headers:
-                offset = prog_header[0]
-                vaddr = prog_header[1]
-                size = prog_header[2]
-                print("LOADING: file offset: 0x%08x" % offset, ", hw addr: 0x%08x" % vaddr, "size: 0x%08x" % size)
+                offset = prog_header[1]
+                vaddr = prog_header[2]
+                size = prog_header[4]
                 f.seek(offset)
                 dbs = f.read(size)
-                dbs = struct.unpack('{}L'.format(len(dbs)>>2), dbs)
-                self.wrarr32((base_offset + vaddr), dbs)
-    
+                dbs = struct.unpack("<{}I".format(len(dbs)>>2), dbs)
+                segments.append((offset, vaddr, size, dbs))
         finally:
             f.close()
+        return e_machine, prog_headers, segments
+    
+    def prepelf32(self, base_offset, filename):
+        """Description:
+            Parse elf file and encode its burst writes in advance,
+            can be called from another thread while the link is busy
+
+        Parameters:
+            base_offset (int): Write offset
+            filename (str): Elf file name
+
+        Returns:
+            tuple: Prepared image for wrprepelf32
+
+        """
+        e_machine, prog_headers, segments = self.readelf32(filename)
+        frames = []
+        for offset, vaddr, size, dbs in segments:
+            frames.append((offset, vaddr, size, (base_offset + vaddr), dbs, self.encode_wrarr32((base_offset + vaddr), dbs)))
+        return (filename, e_machine, prog_headers, frames)
+    
+    def wrprepelf32(self, prepared):
+        """Description:
+            Write elf file prepared by prepelf32 to memory
+
+        Parameters:
+            prepared (tuple): Prepared image
+
+        """
+        filename, e_machine, prog_headers, frames = prepared
         print("----------------")
+        print("Loading elf file: ", filename)
+        print("-- e_type: ET_EXEC")
+        if (e_machine == 243):
+            print("-- e_machine: RISC-V")
+        else:
+            print("-- e_machine: ", hex(e_machine))
+        
+        print("Program Headers:")
+        print("-----------------------------------------------------------------------------------------------------------")
+        print(" № | p_type     | p_offset   | p_vaddr    | p_paddr    | p_filesz   | p_memsz    | p_flags    | p_align")
+        phnum = 0
+        for prog_header in prog_headers:
+            print("%2d" % phnum, "| 0x%08x" % prog_header[0], "| 0x%08x" % prog_header[1], "| 0x%08x" % prog_header[2], "| 0x%08x" % prog_header[3], "| 0x%08x" % prog_header[4], "| 0x%08x" % prog_header[5], "| 0x%08x" % prog_header[6], "| 0x%08x" % prog_header[7])
+            phnum+=1
+        print("-----------------------------------------------------------------------------------------------------------")
+        
+        for offset, vaddr, size, address, dbs, frame in frames:
+            print("LOADING: file offset: 0x%08x" % offset, ", hw addr: 0x%08x" % vaddr, "size: 0x%08x" % size)
+            self.wrframe32(address, dbs, frame)
+        print("----------------")
+    
+    def wrelf32(self, base_offset, filename):
+        """Description:
+            Write elf file to memory
+
+        Parameters:
+            base_offset (int): Write offset
+            filename (str): Elf file name
+
+        """
+        self.wrprepelf32(self.prepelf32(base_offset, filename))
     
     def memtest32(self, baseaddr, wsize):
         """Description:
@@ -0,0 +1,266 @@
+import argparse
+import dataclasses
+import math
+import torch
+
+from inference import InferenceEngine
+from spike_dataset import SpikeDataset
+from spike_encoder import count_spikes
+
+
+@dataclasses.dataclass
+class CoreConfig:
+    """
+    Ports of the neuromorphic core (nm_core_top) that set its workload.
+
+    The synaptic phase reads weight memory words at
+    baseAddr + presyn * postsynCount + postsyn for every input spike, the
+    neuronal phase updates postsynCount neurons every tick. Spikes enter
+    and leave as one presynaptic / postsynaptic index per FIFO word.
+    """
+    postsyn_count: int = None  # cfg_lif0_postsynCount_i, None: the layer's neuron count
+    postsyn_count_bits: int = 7  # cfg_lif0_postsynCount_i width
+    weight_word_bits: int = 24  # dat_wmem_pack width
+    weight_bits: int = 16  # weight field of a word (dat_wmem_pack[23:8])
+    fifo_in_bits: int = 10  # wr_data_spike_in width
+    fifo_out_bits: int = 7  # rd_data_spike_out width
+    addr_bits: int = 17  # adr_wmem_pack width
+    layer_bases: int = 5  # cfg_layerBase_i entries of neuromorphic_core
+
+    @property
+    def memory_words(self):
+        return 2 ** self.addr_bits
+
+    @property
+    def weights_per_word(self):
+        return max(1, self.weight_word_bits // self.weight_bits)
+
+    def layer_postsyn_count(self, neurons):
+        return neurons if self.postsyn_count is None else self.postsyn_count
+
+    def check_layer(self, fan_in, neurons):
+        """
+        :return: List of reasons the layer does not fit the core's ports, empty if it does.
+        """
+        problems = []
+        postsyn_count = self.layer_postsyn_count(neurons)
+        if postsyn_count < neurons:
+            problems.append(f"postsynCount {postsyn_count} is below the {neurons} neurons of the layer")
+        if postsyn_count >= 2 ** self.postsyn_count_bits:
+            problems.append(f"postsynCount {postsyn_count} does not fit {self.postsyn_count_bits} bits")
+        if fan_in > 2 ** self.fifo_in_bits:
+            problems.append(f"{fan_in} inputs do not fit {self.fifo_in_bits} bit input FIFO words")
+        if neurons > 2 ** self.fifo_out_bits:
+            problems.append(f"{neurons} neurons do not fit {self.fifo_out_bits} bit output FIFO words")
+        return problems
+
+
+class LayerActivity:
+    """
+    Activity of one layer accumulated over a dataset: spikes per neuron and
+    active inputs per tick, from which firing rates, synaptic events and
+    the core's workload follow.
+    """
+
+    def __init__(self, name, fan_in, neurons, num_steps):
+        self.name = name
+        self.fan_in = fan_in
+        self.neurons = neurons
+        self.num_steps = num_steps
+        self.samples = 0
+        self.neuron_spikes = torch.zeros(neurons, dtype=torch.int64)
+        self.tick_inputs = torch.zeros(num_steps, dtype=torch.int64)
+        self.tick_peak_inputs = torch.zeros(num_steps, dtype=torch.int64)
+
+    def record(self, active_inputs, spikes):
+        """
+        :param active_inputs: Active inputs of every tick and sample [num_steps, batch_size].
+        :param spikes: Output spikes of the layer [num_steps, batch_size, neurons].
+        """
+        active_inputs = active_inputs.to(torch.int64)
+        self.samples += spikes.shape[1]
+        self.neuron_spikes += spikes.sum((0, 1)).to(torch.int64)
+        self.tick_inputs += active_inputs.sum(1)
+        torch.maximum(self.tick_peak_inputs, active_inputs.max(1)[0], out=self.tick_peak_inputs)
+
+    def firing_rates(self):
+        """
+        :return: Spikes per tick of every neuron [neurons].
+        """
+        return self.neuron_spikes.double() / max(1, self.samples * self.num_steps)
+
+    def input_events(self):
+        """
+        :return: Mean input spikes per inference.
+        """
+        return self.tick_inputs.sum().item() / max(1, self.samples)
+
+    def synaptic_events(self):
+        """
+        :return: Mean synaptic events (input spike x postsynaptic neuron) per inference.
+        """
+        return self.input_events() * self.neurons
+
+    def dead_neurons(self):
+        return torch.nonzero(self.neuron_spikes == 0).flatten().tolist()
+
+    def saturated_neurons(self, saturation=0.95):
+        """
+        :param saturation: Firing rate (spikes per tick) from which a neuron counts as saturated.
+        """
+        return torch.nonzero(self.firing_rates() >= saturation).flatten().tolist()
+
+    def workload(self, core):
+        """
+        Per inference work of the core running this layer.
+
+        :param core: CoreConfig.
+        :return: Dict of weight memory reads, FIFO words in and out, neuron updates and synaptic events.
+        """
+        postsyn_count = core.layer_postsyn_count(self.neurons)
+        input_events = self.input_events()
+        return {"weight_reads": input_events * math.ceil(postsyn_count / core.weights_per_word),
+                "fifo_in_words": input_events,
+                "fifo_out_words": self.neuron_spikes.sum().item() / max(1, self.samples),
+                "neuron_updates": self.num_steps * postsyn_count,
+                "synaptic_events": input_events * postsyn_count,
+                "peak_tick_inputs": self.tick_peak_inputs.max().item()}
+
+
+class ActivityProfiler:
+    """
+    Records the spike activity of the two layers of the SNN over a dataset
+    and estimates the core's workload.
+
+    Activity comes from InferenceEngine.spike_trains (profile) or from
+    forward hooks on a training SNN (attach). The evaluation in main.py runs
+    on an InferenceEngine of its own, profile its exported spike dataset
+    instead.
+    """
+
+    def __init__(self, num_inputs, num_hidden, num_outputs, num_steps):
+        self.num_inputs = num_inputs
+        self.layers = [LayerActivity("fc1", num_inputs, num_hidden, num_steps),
+                       LayerActivity("fc2", num_hidden, num_outputs, num_steps)]
+        self.handles = []
+
+    @classmethod
+    def for_engine(cls, engine):
+        return cls(engine.num_inputs, engine.w1.shape[0], engine.w2.shape[0], engine.num_steps)
+
+    def record(self, inputs, hidden_spikes, output_spikes):
+        """
+        :param inputs: Input spikes [num_steps, batch_size, ...], bit-packed uint8 or 0/1.
+        :param hidden_spikes: Hidden spikes [num_steps, batch_size, hidden].
+        :param output_spikes: Output spikes [num_steps, batch_size, outputs].
+        """
+        num_steps = hidden_spikes.shape[0]
+        inputs = inputs[:num_steps]
+        if inputs.dtype == torch.uint8:
+            active_inputs = count_spikes(inputs, -1)
+        else:
+            active_inputs = inputs.reshape(num_steps, inputs.shape[1], -1).sum(-1)
+        self.layers[0].record(active_inputs, hidden_spikes)
+        self.layers[1].record(hidden_spikes.sum(-1), output_spikes)
+
+    def attach(self, net):
+        """
+        Records every forward pass of net (main.SNN).
+
+        Inputs that are not a tensor, such as the frame generators of the
+        training loss, are stacked once with net.stack_inputs before the
+        forward, which then runs on the same frames (bit-packed frames stay
+        packed).
+        """
+        if not hasattr(net, "stack_inputs"):
+            raise TypeError(f"{type(net).__name__} has no stack_inputs, attach expects main.SNN")
+        inputs = []
+
+        def pre_hook(module, args):
+            x = args[0]
+            if not torch.is_tensor(x):
+                x = module.stack_inputs(x)
+            inputs.append(x)
+            return (x,) + tuple(args[1:])
+
+        def hook(module, args, output):
+            output_spikes, hidden_spikes = output
+            self.record(inputs.pop().detach(), hidden_spikes.detach(), output_spikes.detach())
+
+        self.handles.append(net.register_forward_pre_hook(pre_hook))
+        self.handles.append(net.register_forward_hook(hook))
+
+    def detach(self):
+        for handle in self.handles:
+            handle.remove()
+        self.handles = []
+
+    def profile(self, engine, dataset, batch_size=4096):
+        """
+        Records the activity of an engine over a whole spike dataset.
+
+        :param engine: InferenceEngine.
+        :param dataset: SpikeDataset.
+        """
+        for start in range(0, len(dataset), batch_size):
+            records = dataset.records[start:start + batch_size]
+            packed = torch.from_numpy(records["spikes"].transpose(1, 0, 2).copy())
+            output_spikes, hidden_spikes = engine.spike_trains(packed)
+            self.record(packed, hidden_spikes, output_spikes)
+
+    def report(self, core=None, saturation=0.95):
+        """
+        :param core: CoreConfig, the default ports if None.
+        :param saturation: Firing rate from which a neuron counts as saturated.
+        :return: Text report of activity, flagged neurons and the per inference workload.
+        """
+        if core is None:
+            core = CoreConfig()
+        lines = []
+        totals = {}
+        for layer in self.layers:
+            rates = layer.firing_rates()
+            tick_inputs = (layer.tick_inputs.double() / max(1, layer.samples)).tolist()
+            lines.append(f"{layer.name} ({layer.fan_in} -> {layer.neurons}), {layer.samples} samples:")
+            lines.append(f"  firing rate per tick: mean {rates.mean().item():.3f}, min {rates.min().item():.3f}, "
+                         f"max {rates.max().item():.3f}")
+            lines.append("  active inputs per tick: " + ", ".join(f"{value:.1f}" for value in tick_inputs))
+            dead = layer.dead_neurons()
+            saturated = layer.saturated_neurons(saturation)
+            if dead:
+                lines.append(f"  dead neurons (never fire): {dead}")
+            if saturated:
+                lines.append(f"  saturated neurons (rate >= {saturation}): {saturated}")
+            for problem in core.check_layer(layer.fan_in, layer.neurons):
+                lines.append(f"  does not fit the core: {problem}")
+            work = layer.workload(core)
+            lines.append(f"  per inference: {work['synaptic_events']:.1f} synaptic events, "
+                         f"{work['weight_reads']:.1f} weight memory reads, {work['fifo_in_words']:.1f} FIFO words in, "
+                         f"{work['fifo_out_words']:.1f} FIFO words out, {work['neuron_updates']} neuron updates, "
+                         f"peak {work['peak_tick_inputs']} input spikes in one tick")
+            for key, value in work.items():
+                if key != "peak_tick_inputs":
+                    totals[key] = totals.get(key, 0) + value
+        lines.append("Network per inference: " + ", ".join(f"{value:.1f} {key.replace('_', ' ')}"
+                                                            for key, value in totals.items()))
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spike activity and core workload of an exported SNN.")
+    parser.add_argument("--model", default="./exported_model.pth")
+    parser.add_argument("--spikes", default="./exported_spiking_input.spk")
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--postsyn-count", type=int, default=None,
+                        help="cfg_lif0_postsynCount_i, default the neurons of each layer")
+    parser.add_argument("--weight-word-bits", type=int, default=24)
+    parser.add_argument("--weight-bits", type=int, default=16)
+    parser.add_argument("--saturation", type=float, default=0.95)
+    args = parser.parse_args()
+
+    engine = InferenceEngine.from_file(args.model, "eager")
+    profiler = ActivityProfiler.for_engine(engine)
+    profiler.profile(engine, SpikeDataset(args.spikes), args.batch_size)
+    core = CoreConfig(postsyn_count=args.postsyn_count, weight_word_bits=args.weight_word_bits,
+                      weight_bits=args.weight_bits)
+    print(profiler.report(core, args.saturation))
@@ -0,0 +1,55 @@
+import dataclasses
+
+
+@dataclasses.dataclass
+class ActivityRegularizer:
+    """
+    Spike activity penalties added to the training loss.
+
+    The core's latency and energy grow with every spike it receives and
+    emits, so two kinds of terms push the layers to fire less:
+
+    - spike count: weight * spikes of the layer per inference (mean over
+      the batch), an L1 penalty on the events the layer emits;
+    - firing rate: weight * mean over neurons of (rate - target)^2, the
+      rate being spikes per tick of a neuron over the batch, which keeps
+      neurons near a target instead of silencing them.
+
+    Gradients reach the spikes through the surrogate of the LIF layers.
+    All weights default to 0 (no regularization).
+    """
+    hidden_count: float = 0.0  # spike count weight on lif1
+    output_count: float = 0.0  # spike count weight on lif2
+    hidden_rate: float = 0.0  # firing rate weight on lif1
+    hidden_target: float = 0.05  # lif1 target spikes per tick
+    output_rate: float = 0.0  # firing rate weight on lif2
+    output_target: float = 0.2  # lif2 target spikes per tick
+
+    def __post_init__(self):
+        for name in ("hidden_target", "output_target"):
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f"{name} must be a rate in [0, 1], got {getattr(self, name)}")
+
+    @property
+    def enabled(self):
+        return any(weight > 0 for weight in (self.hidden_count, self.output_count, self.hidden_rate,
+                                             self.output_rate))
+
+    @staticmethod
+    def _layer_penalty(spikes, count_weight, rate_weight, target):
+        penalty = 0
+        if count_weight > 0:
+            penalty = penalty + count_weight * spikes.sum((0, 2)).mean()
+        if rate_weight > 0:
+            rates = spikes.mean((0, 1))
+            penalty = penalty + rate_weight * (rates - target).pow(2).mean()
+        return penalty
+
+    def __call__(self, hidden_spikes, output_spikes):
+        """
+        :param hidden_spikes: lif1 spikes [num_steps, batch_size, hidden].
+        :param output_spikes: lif2 spikes [num_steps, batch_size, outputs].
+        :return: Penalty to add to the loss.
+        """
+        return (self._layer_penalty(hidden_spikes, self.hidden_count, self.hidden_rate, self.hidden_target)
+                + self._layer_penalty(output_spikes, self.output_count, self.output_rate, self.output_target))
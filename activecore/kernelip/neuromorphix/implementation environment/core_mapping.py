@@ -0,0 +1,243 @@
+import argparse
+import dataclasses
+import json
+import math
+import torch
+
+from activity_profiler import ActivityProfiler, CoreConfig
+from inference import InferenceEngine
+from spike_dataset import SpikeDataset
+
+
+@dataclasses.dataclass
+class LayerSpec:
+    name: str
+    neurons: int
+    rate: float = 0.1  # expected spikes per neuron per tick
+
+
+@dataclasses.dataclass
+class NetworkSpec:
+    """
+    Fully connected feed-forward SNN: input_size inputs, then the layers in order.
+    """
+    input_size: int
+    layers: list
+    num_steps: int = 5
+    input_rate: float = 0.1  # expected spikes per input per tick
+
+    def fan_ins(self):
+        return [self.input_size] + [layer.neurons for layer in self.layers[:-1]]
+
+    def input_rates(self):
+        return [self.input_rate] + [layer.rate for layer in self.layers[:-1]]
+
+
+@dataclasses.dataclass
+class Tile:
+    """
+    Neurons [neuron_start, neuron_start + neurons) of a layer placed on one core for one pass.
+    """
+    layer: str
+    neuron_start: int
+    neurons: int
+    fan_in: int
+    words: int
+    core: int = 0
+    pass_index: int = 0
+    base_slot: int = 0  # cfg_layerBase_i entry
+    base_addr: int = 0  # first weight memory word, cfg_layerBase_i[base_slot] and cfg_lif0_baseAddr_i
+
+
+def max_tile_neurons(fan_in, core):
+    """
+    Most neurons of a layer with fan_in inputs one core can hold: postsynCount,
+    the output FIFO index and the weight memory bound it.
+
+    :raise ValueError: If not even one neuron fits.
+    """
+    if fan_in > 2 ** core.fifo_in_bits:
+        raise ValueError(f"{fan_in} inputs do not fit {core.fifo_in_bits} bit input FIFO words, "
+                         f"splitting a layer's inputs across cores is not supported")
+    by_memory = core.memory_words // fan_in * core.weights_per_word
+    if by_memory == 0:
+        raise ValueError(f"One neuron with {fan_in} inputs does not fit {core.memory_words} weight memory words")
+    return min(2 ** core.postsyn_count_bits - 1, 2 ** core.fifo_out_bits, by_memory)
+
+
+def split_layer(layer, fan_in, core):
+    """
+    :return: Tiles of evenly sized neuron ranges covering the layer, not yet placed.
+    """
+    num_tiles = math.ceil(layer.neurons / max_tile_neurons(fan_in, core))
+    size, extra = divmod(layer.neurons, num_tiles)
+    tiles = []
+    start = 0
+    for index in range(num_tiles):
+        neurons = size + (index < extra)
+        tiles.append(Tile(layer.name, start, neurons, fan_in, fan_in * math.ceil(neurons / core.weights_per_word)))
+        start += neurons
+    return tiles
+
+
+class MappingPlan:
+    """
+    Placement of a network on num_cores cores.
+
+    Tiles are placed in layer order, filling the weight memory and the
+    layer bases of core 0, then core 1, and so on. When all cores are full
+    the next tiles go to another pass: the cores are reloaded with the
+    weights of the pass and run all ticks of a batch of samples, the spikes
+    between passes are buffered by the host. A layer thus only depends on
+    tiles of the same or earlier passes.
+    """
+
+    def __init__(self, network, core=None, num_cores=1):
+        """
+        :param network: NetworkSpec.
+        :param core: CoreConfig, the default ports if None.
+        :param num_cores: Cores working in parallel.
+        """
+        self.network = network
+        self.core = core if core is not None else CoreConfig()
+        self.num_cores = num_cores
+        self.tiles = []
+        core_index, pass_index, used_words, used_bases = 0, 0, 0, 0
+        for layer, fan_in in zip(network.layers, network.fan_ins()):
+            for tile in split_layer(layer, fan_in, self.core):
+                if used_bases == self.core.layer_bases or used_words + tile.words > self.core.memory_words:
+                    core_index += 1
+                    if core_index == num_cores:
+                        core_index, pass_index = 0, pass_index + 1
+                    used_words, used_bases = 0, 0
+                tile.core, tile.pass_index = core_index, pass_index
+                tile.base_slot, tile.base_addr = used_bases, used_words
+                used_words += tile.words
+                used_bases += 1
+                self.tiles.append(tile)
+
+    @property
+    def num_passes(self):
+        return self.tiles[-1].pass_index + 1 if self.tiles else 0
+
+    def config_words(self):
+        """
+        :return: List per (pass, core) of its cfg_layerBase_i values and per tile configuration.
+        """
+        slots = {}
+        for tile in self.tiles:
+            slot = slots.setdefault((tile.pass_index, tile.core),
+                                    {"pass": tile.pass_index, "core": tile.core,
+                                     "layerBase": [0] * self.core.layer_bases, "words": 0, "tiles": []})
+            slot["layerBase"][tile.base_slot] = tile.base_addr
+            slot["words"] += tile.words
+            slot["tiles"].append({"layer": tile.layer, "neurons": [tile.neuron_start, tile.neuron_start + tile.neurons],
+                                  "layerBase": tile.base_slot, "baseAddr": tile.base_addr,
+                                  "postsynCount": tile.neurons})
+        return [slots[key] for key in sorted(slots)]
+
+    def cost(self, batch_size=1):
+        """
+        Predicted per inference work, with one weight memory read, neuron
+        update or reloaded word per clock and core.
+
+        :param batch_size: Samples run per weight load of a pass, sharing its reload.
+        :return: Dict of weight reads, FIFO words, neuron updates, reloaded words and cycles.
+        """
+        network = self.network
+        input_rates = dict(zip((layer.name for layer in network.layers), network.input_rates()))
+        rates = {layer.name: layer.rate for layer in network.layers}
+        totals = {"weight_reads": 0.0, "fifo_in_words": 0.0, "fifo_out_words": 0.0, "neuron_updates": 0,
+                  "reload_words": 0.0, "cycles": 0.0}
+        compute = {}
+        reload = {}
+        for tile in self.tiles:
+            input_events = input_rates[tile.layer] * tile.fan_in * network.num_steps
+            reads = input_events * math.ceil(tile.neurons / self.core.weights_per_word)
+            updates = network.num_steps * tile.neurons
+            totals["weight_reads"] += reads
+            # every tile of a layer receives all of the layer's input spikes
+            totals["fifo_in_words"] += input_events
+            totals["fifo_out_words"] += rates[tile.layer] * tile.neurons * network.num_steps
+            totals["neuron_updates"] += updates
+            key = (tile.pass_index, tile.core)
+            compute[key] = compute.get(key, 0) + reads + updates
+            if self.num_passes > 1:
+                reload[key] = reload.get(key, 0) + tile.words / batch_size
+        totals["reload_words"] = sum(reload.values())
+        for pass_index in range(self.num_passes):
+            cores = range(self.num_cores)
+            totals["cycles"] += max(compute.get((pass_index, core), 0) for core in cores)
+            totals["cycles"] += max(reload.get((pass_index, core), 0) for core in cores)
+        return totals
+
+    def report(self, batch_size=1):
+        """
+        :return: Text table of the tiles and the predicted per inference cost.
+        """
+        lines = [f"{len(self.tiles)} tiles on {self.num_cores} cores in {self.num_passes} passes "
+                 f"({self.core.memory_words} words, {self.core.layer_bases} layer bases per core)",
+                 " pass  core  base  baseAddr  words  layer neurons"]
+        for tile in self.tiles:
+            lines.append(f"{tile.pass_index:5d}  {tile.core:4d}  {tile.base_slot:4d}  {tile.base_addr:8d}  "
+                         f"{tile.words:5d}  {tile.layer} [{tile.neuron_start}, {tile.neuron_start + tile.neurons})")
+        cost = self.cost(batch_size)
+        lines.append("Per inference: " + ", ".join(f"{value:.1f} {key.replace('_', ' ')}"
+                                                   for key, value in cost.items()))
+        return "\n".join(lines)
+
+
+def load_network(file_path):
+    """
+    Reads a network description:
+
+        {"input_size": 784, "num_steps": 5, "input_rate": 0.1,
+         "layers": [{"name": "fc1", "neurons": 500, "rate": 0.05}, ...]}
+
+    :return: NetworkSpec.
+    """
+    with open(file_path, 'r') as network_file:
+        spec = json.load(network_file)
+    layers = [LayerSpec(**layer) for layer in spec.pop("layers")]
+    return NetworkSpec(layers=layers, **spec)
+
+
+def network_from_model(pth_file, spikes_file=None, batch_size=4096):
+    """
+    NetworkSpec of an exported model, with the firing rates measured on a
+    spike dataset if given (ActivityProfiler), the default rates otherwise.
+    """
+    model_state = torch.load(pth_file, map_location="cpu", weights_only=False)
+    topology = model_state["model_topology"]
+    network = NetworkSpec(topology["input_size"], [LayerSpec("fc1", topology["hidden_size"]),
+                                                   LayerSpec("fc2", topology["output_size"])], topology["num_steps"])
+    if spikes_file:
+        engine = InferenceEngine(model_state, "eager")
+        profiler = ActivityProfiler.for_engine(engine)
+        profiler.profile(engine, SpikeDataset(spikes_file), batch_size)
+        network.input_rate = profiler.layers[0].input_events() / (network.num_steps * network.input_size)
+        for layer, activity in zip(network.layers, profiler.layers):
+            layer.rate = activity.firing_rates().mean().item()
+    return network
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Map an SNN onto neuromorphic cores and predict its cost.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--network", help="Network description JSON (see load_network)")
+    source.add_argument("--model", help="Exported model (.pth)")
+    parser.add_argument("--spikes", default=None, help="Spike dataset to measure the firing rates of --model")
+    parser.add_argument("--cores", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1, help="Samples per weight load of a pass")
+    parser.add_argument("--addr-bits", type=int, default=17)
+    parser.add_argument("--layer-bases", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Write the config words as JSON")
+    args = parser.parse_args()
+
+    network = load_network(args.network) if args.network else network_from_model(args.model, args.spikes)
+    plan = MappingPlan(network, CoreConfig(addr_bits=args.addr_bits, layer_bases=args.layer_bases), args.cores)
+    print(plan.report(args.batch_size))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({"cost": plan.cost(args.batch_size), "cores": plan.config_words()}, output_file, indent=2)
+        print(f"Config words written to {args.output}")
@@ -0,0 +1,63 @@
+import os
+import signal
+import socket
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+def find_free_port():
+    """
+    :return: A TCP port on localhost that is free right now.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _worker(rank, world_size, port, threads, fn, args):
+    if threads > 0:
+        torch.set_num_threads(threads)
+    dist.init_process_group("gloo", init_method=f"tcp://127.0.0.1:{port}", rank=rank, world_size=world_size)
+    try:
+        fn(rank, world_size, *args)
+    finally:
+        dist.destroy_process_group()
+
+
+def launch(fn, world_size, args=(), threads=0, port=None):
+    """
+    Runs fn(rank, world_size, *args) in world_size processes joined in a gloo process group on localhost.
+
+    SIGTERM and SIGINT received by the launching process are forwarded to
+    the workers, which are expected to checkpoint and return (see Trainer).
+
+    :param fn: Module level function, called in each worker.
+    :param world_size: Number of worker processes.
+    :param args: Extra arguments of fn, must be picklable.
+    :param threads: Intra-op threads per worker, 0 splits the CPU cores evenly.
+    :param port: Rendezvous port, a free one if None.
+    :return: Signal number that interrupted the run, None if it completed.
+    """
+    if threads <= 0:
+        threads = max(1, (os.cpu_count() or 1) // world_size)
+    if port is None:
+        port = find_free_port()
+    context = mp.start_processes(_worker, args=(world_size, port, threads, fn, args), nprocs=world_size,
+                                 join=False, start_method="spawn")
+    received = []
+
+    def forward_signal(signum, frame):
+        received.append(signum)
+        for process in context.processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    handlers = {signum: signal.signal(signum, forward_signal) for signum in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        while not context.join():
+            pass
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+    return received[0] if received else None
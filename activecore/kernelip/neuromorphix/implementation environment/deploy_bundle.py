@@ -0,0 +1,180 @@
+import argparse
+import hashlib
+import json
+import mmap
+import struct
+import numpy as np
+
+from wmem_pack import image_bytes, unpack_layer
+
+# Bundle file layout, all integers little-endian:
+#   magic (8 bytes), format version (u32), header length (u32), JSON header,
+#   then the sections, each starting at a multiple of section_alignment.
+# The header lists every section's offset, dtype, shape and sha256, so the
+# sections can be mapped as NumPy arrays without copying.
+magic = b"NMBUNDLE"
+bundle_version = 1
+section_alignment = 64
+_prefix = struct.Struct("<8sII")
+
+# Columns of the per-layer config section, the nm_core_top ports they are written to
+config_registers = ("Vthr", "Vrst", "leakage", "postsynCount", "baseAddr")
+register_bits = {"Vthr": 16,  # cfg_lif0_Vthr_i
+                 "Vrst": 16,  # cfg_lif0_Vrst_i
+                 "leakage": 16,  # cfg_lif0_leakage_i, right shift of Vmemb per tick
+                 "postsynCount": 7,  # cfg_lif0_postsynCount_i
+                 "baseAddr": 17}  # cfg_lif0_baseAddr_i
+
+
+def _aligned(offset):
+    return -(-offset // section_alignment) * section_alignment
+
+
+def write_bundle(file_path, header, sections):
+    """
+    :param header: JSON serializable metadata.
+    :param sections: Dict of name -> NumPy array, stored little-endian.
+    :return: The header as written, with the "sections" table.
+    """
+    arrays = {name: np.ascontiguousarray(array, dtype=np.dtype(array.dtype).newbyteorder("<"))
+              for name, array in sections.items()}
+    table = {name: {"dtype": array.dtype.str, "shape": list(array.shape),
+                    "sha256": hashlib.sha256(array.tobytes()).hexdigest()} for name, array in arrays.items()}
+    # offsets depend on the header length, which depends on the offsets' digits: lay out until stable
+    offsets = {name: 0 for name in arrays}
+    while True:
+        for name in arrays:
+            table[name]["offset"] = offsets[name]
+        text = json.dumps({**header, "sections": table}, sort_keys=True).encode()
+        offset = _aligned(_prefix.size + len(text))
+        new_offsets = {}
+        for name, array in arrays.items():
+            new_offsets[name] = offset
+            offset = _aligned(offset + array.nbytes)
+        if new_offsets == offsets:
+            break
+        offsets = new_offsets
+
+    with open(file_path, 'wb') as bundle_file:
+        bundle_file.write(_prefix.pack(magic, bundle_version, len(text)))
+        bundle_file.write(text)
+        for name, array in arrays.items():
+            bundle_file.write(b"\0" * (offsets[name] - bundle_file.tell()))
+            bundle_file.write(array.tobytes())
+    return {**header, "sections": table}
+
+
+class DeploymentBundle:
+    """
+    Read-only, memory-mapped deployment bundle (export_bundle.py).
+
+    Needs NumPy only. Sections are zero-copy views of the file:
+
+        wmem     packed weight memory words (u32 per word)
+        config   per layer register values [layers, len(config_registers)] (u32)
+    """
+
+    def __init__(self, file_path, verify=True):
+        """
+        :param verify: Check the sha256 of every section on opening.
+        :raise ValueError: If the file is not a bundle of a supported version or a checksum does not match.
+        """
+        self.file_path = file_path
+        with open(file_path, 'rb') as bundle_file:
+            self._map = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, version, header_length = _prefix.unpack_from(self._map, 0)
+        if file_magic != magic:
+            raise ValueError(f"{file_path} is not a deployment bundle")
+        if version != bundle_version:
+            raise ValueError(f"{file_path} is a version {version} bundle, expected version {bundle_version}")
+        self.header = json.loads(self._map[_prefix.size:_prefix.size + header_length])
+        self.sections = {}
+        for name, entry in self.header["sections"].items():
+            dtype = np.dtype(entry["dtype"])
+            count = int(np.prod(entry["shape"], dtype=np.int64))
+            self.sections[name] = np.frombuffer(self._map, dtype, count, entry["offset"]).reshape(entry["shape"])
+        if verify:
+            self.verify()
+
+    def verify(self):
+        for name, entry in self.header["sections"].items():
+            if hashlib.sha256(self.sections[name].tobytes()).hexdigest() != entry["sha256"]:
+                raise ValueError(f"Checksum of section '{name}' in {self.file_path} does not match")
+
+    def close(self):
+        self.sections = {}
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # arrays taken from the bundle are still alive, the mapping goes with them
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def words(self):
+        return self.sections["wmem"]
+
+    @property
+    def layers(self):
+        return self.header["layers"]
+
+    def layer(self, name):
+        for entry in self.layers:
+            if entry["name"] == name:
+                return entry
+        raise ValueError(f"Layer '{name}' not found in {self.file_path}")
+
+    def layer_config(self, name):
+        """
+        :return: Dict of register name -> value of a layer.
+        """
+        row = self.sections["config"][self.layers.index(self.layer(name))]
+        return dict(zip(config_registers, (int(value) for value in row)))
+
+    def layer_weights(self, name):
+        """
+        :return: Integer weights [postsyn, presyn] of a layer, decoded from the packed words.
+        """
+        entry = self.layer(name)
+        wmem = self.header["wmem"]
+        fields = {field: tuple(bits) for field, bits in wmem["fields"].items()}
+        return unpack_layer(self.words[entry["base_addr"]:], fields, wmem["weights_per_word"], entry["shape"])
+
+    def write_image(self, output_prefix):
+        """
+        Writes the weight memory as <output_prefix>.mem ($readmemh) and <output_prefix>.bin (raw little-endian).
+        """
+        word_bits = self.header["wmem"]["word_bits"]
+        digits = (word_bits + 3) // 4
+        with open(f"{output_prefix}.mem", 'w') as mem_file:
+            mem_file.write("".join(f"{word:0{digits}X}\n" for word in self.words.tolist()))
+        with open(f"{output_prefix}.bin", 'wb') as bin_file:
+            bin_file.write(image_bytes(self.words, word_bits))
+
+    def describe(self):
+        lines = [f"{self.file_path}: bundle version {bundle_version}, model sha256 {self.header['model_sha256'][:16]}",
+                 f"topology: {self.header['topology']}",
+                 f"weights: {self.header['wmem']['format']} in {len(self.words)} words of "
+                 f"{self.header['wmem']['word_bits']} bits"]
+        for entry in self.layers:
+            config = ", ".join(f"{key} {value}" for key, value in self.layer_config(entry["name"]).items())
+            lines.append(f"  {entry['name']} {tuple(entry['shape'])}: {config}")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect a deployment bundle, no torch needed.")
+    parser.add_argument("bundle")
+    parser.add_argument("--write-image", default=None, metavar="PREFIX",
+                        help="Write the weight memory as PREFIX.mem and PREFIX.bin")
+    args = parser.parse_args()
+
+    with DeploymentBundle(args.bundle) as bundle:
+        print(bundle.describe())
+        if args.write_image:
+            bundle.write_image(args.write_image)
+            print(f"Weight memory written to {args.write_image}.mem, {args.write_image}.bin")
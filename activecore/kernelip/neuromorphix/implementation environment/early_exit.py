@@ -0,0 +1,158 @@
+import argparse
+import torch
+
+from inference import InferenceEngine
+from spike_dataset import SpikeDataset
+
+
+def cumulative_counts(output_spikes):
+    """
+    :param output_spikes: Output spikes [num_steps, batch_size, outputs].
+    :return: Output spike counts after each tick [num_steps, batch_size, outputs].
+    """
+    return torch.cumsum(output_spikes, 0)
+
+
+def tick_predictions(counts):
+    """
+    Class read out after every tick, the same arg max (first index on ties) as InferenceEngine.predict.
+
+    :param counts: cumulative_counts [num_steps, batch_size, outputs].
+    :return: Predictions [num_steps, batch_size].
+    """
+    return torch.max(counts, 2)[1]
+
+
+def exit_ticks(counts, margin, min_ticks=1):
+    """
+    Confidence-based early exit: a sample stops at the first tick where its
+    leading output has margin more spikes than the runner-up, which the
+    core can check with its output spike counters. Samples never reaching
+    the margin run all ticks.
+
+    :param counts: cumulative_counts [num_steps, batch_size, outputs].
+    :param margin: Spike count lead needed to exit.
+    :param min_ticks: Ticks always simulated, at least 1.
+    :return: (ticks run [batch_size], predictions at exit [batch_size]).
+    """
+    if min_ticks < 1:
+        raise ValueError(f"min_ticks must be at least 1, got {min_ticks}")
+    top2 = torch.topk(counts, 2, dim=2)[0]
+    confident = top2[..., 0] - top2[..., 1] >= margin
+    confident[:min_ticks - 1] = False
+    confident[-1] = True
+    exit_step = torch.argmax(confident.to(torch.uint8), 0)
+    predictions = tick_predictions(counts).gather(0, exit_step.unsqueeze(0)).squeeze(0)
+    return exit_step + 1, predictions
+
+
+class EarlyExitAnalysis:
+    """
+    Accumulates, over batches of a test set, the accuracy after every tick
+    count and the accuracy and mean ticks of early exit at several margins.
+    """
+
+    def __init__(self, num_steps, margins=(1, 2, 3, 4), min_ticks=1):
+        """
+        :param num_steps: Ticks simulated per sample.
+        :param margins: Spike count margins of the early exit rule.
+        :param min_ticks: Ticks always simulated before an exit, at least 1.
+        """
+        if min_ticks < 1:
+            raise ValueError(f"min_ticks must be at least 1, got {min_ticks}")
+        self.num_steps = num_steps
+        self.margins = list(margins)
+        self.min_ticks = min_ticks
+        self.samples = 0
+        self.tick_correct = torch.zeros(num_steps, dtype=torch.int64)
+        self.exit_correct = [0] * len(self.margins)
+        self.exit_ticks = [0] * len(self.margins)
+
+    def update(self, output_spikes, labels):
+        """
+        :param output_spikes: Output spikes [num_steps, batch_size, outputs].
+        :param labels: Labels [batch_size].
+        """
+        counts = cumulative_counts(output_spikes)
+        self.samples += labels.shape[0]
+        self.tick_correct += (tick_predictions(counts) == labels).sum(1)
+        for index, margin in enumerate(self.margins):
+            ticks, predictions = exit_ticks(counts, margin, self.min_ticks)
+            self.exit_correct[index] += (predictions == labels).sum().item()
+            self.exit_ticks[index] += ticks.sum().item()
+
+    def tick_accuracy(self):
+        """
+        :return: Accuracy in percent after 1..num_steps ticks.
+        """
+        return (100 * self.tick_correct.double() / max(1, self.samples)).tolist()
+
+    def exit_results(self):
+        """
+        :return: List of (margin, accuracy in percent, mean ticks).
+        """
+        samples = max(1, self.samples)
+        return [(margin, 100 * correct / samples, ticks / samples)
+                for margin, correct, ticks in zip(self.margins, self.exit_correct, self.exit_ticks)]
+
+    def ticks_for_accuracy(self, target):
+        """
+        Cheapest way to reach a target accuracy.
+
+        :param target: Accuracy in percent.
+        :return: (smallest fixed tick count, smallest mean ticks of an early exit margin), None where not reached.
+        """
+        fixed = next((tick + 1 for tick, accuracy in enumerate(self.tick_accuracy()) if accuracy >= target), None)
+        early = [ticks for _, accuracy, ticks in self.exit_results() if accuracy >= target]
+        return fixed, min(early) if early else None
+
+    def report(self, target=None):
+        """
+        :param target: Accuracy in percent, the full window accuracy if None.
+        :return: Text tables of accuracy per tick count and per exit margin.
+        """
+        tick_accuracy = self.tick_accuracy()
+        if target is None:
+            target = tick_accuracy[-1]
+        lines = ["ticks  accuracy"]
+        lines += [f"{tick + 1:5d}  {accuracy:7.2f}%" for tick, accuracy in enumerate(tick_accuracy)]
+        lines.append("margin  accuracy  mean ticks")
+        lines += [f"{margin:6d}  {accuracy:7.2f}%  {ticks:10.2f}" for margin, accuracy, ticks in self.exit_results()]
+        fixed, early = self.ticks_for_accuracy(target)
+        lines.append(f"Target {target:.2f}%: fixed window {fixed if fixed is not None else 'not reached'} ticks, "
+                     f"early exit {f'{early:.2f}' if early is not None else 'not reached'} ticks on average")
+        return "\n".join(lines)
+
+
+def analyze(engine, dataset, margins=(1, 2, 3, 4), min_ticks=1, batch_size=4096):
+    """
+    :param engine: InferenceEngine.
+    :param dataset: SpikeDataset.
+    :return: EarlyExitAnalysis over the whole dataset.
+    """
+    analysis = EarlyExitAnalysis(engine.num_steps, margins, min_ticks)
+    for start in range(0, len(dataset), batch_size):
+        records = dataset.records[start:start + batch_size]
+        packed = torch.from_numpy(records["spikes"].transpose(1, 0, 2).copy())
+        labels = torch.from_numpy(records["label"].astype("int64"))
+        output_spikes, _ = engine.spike_trains(packed)
+        analysis.update(output_spikes, labels)
+    return analysis
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy per tick count and early exit of an exported SNN.")
+    parser.add_argument("--model", default="./exported_model.pth")
+    parser.add_argument("--spikes", default="./exported_spiking_input.spk")
+    parser.add_argument("--margins", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--min-ticks", type=int, default=1, help="Ticks always simulated before an exit, at least 1")
+    parser.add_argument("--target", type=float, default=None,
+                        help="Target accuracy in percent, default the accuracy of the full window")
+    parser.add_argument("--batch-size", type=int, default=4096)
+    args = parser.parse_args()
+    if args.min_ticks < 1:
+        parser.error(f"--min-ticks must be at least 1, got {args.min_ticks}")
+
+    engine = InferenceEngine.from_file(args.model, "eager")
+    result = analyze(engine, SpikeDataset(args.spikes), args.margins, args.min_ticks, args.batch_size)
+    print(result.report(args.target))
@@ -0,0 +1,208 @@
+import argparse
+import time
+import torch
+
+from inference import InferenceEngine, float_lif, fixed_lif, packed_currents
+from spike_dataset import SpikeDataset
+from spike_encoder import count_spikes
+
+# Bit positions of a packed byte, MSB first (spike_encoder.pack_spikes order)
+_byte_bits = torch.bitwise_and(torch.bitwise_right_shift(torch.arange(256).unsqueeze(1), torch.arange(7, -1, -1)),
+                               1).bool()
+
+# Crossover of the event path against the dense path, measured on one CPU core with
+# torch's embedding_bag kernels. Per-event gathers win below a density of about
+#   packed_saturation - packed_overhead / (fan_in * fan_out) on packed frames (byte tables),
+#   dense_saturation - dense_overhead / fan_out on spike tensors (matmul).
+# Finding the events costs a pass over every frame that a layer with few synapses does
+# not earn back, and a matmul only loses to the gathers of wide layers.
+packed_saturation = 0.08
+packed_overhead = 4000.0
+dense_saturation = 0.1
+dense_overhead = 40.0
+
+
+def crossover_density(fan_in, fan_out, packed=True):
+    """
+    :param fan_in: Presynaptic neurons (inputs) of a layer.
+    :param fan_out: Postsynaptic neurons of a layer.
+    :param packed: The layer reads bit-packed frames (the first layer), else spike tensors.
+    :return: Input spike density below which the layer runs event-driven, 0 if it always runs dense.
+    """
+    if packed:
+        return max(0.0, packed_saturation - packed_overhead / (fan_in * fan_out))
+    return max(0.0, dense_saturation - dense_overhead / fan_out)
+
+
+def packed_events(packed):
+    """
+    Active input lists of bit-packed frames.
+
+    Only nonzero bytes are expanded, so the cost follows the number of spikes.
+
+    :param packed: uint8 [num_steps, batch_size, packed bytes].
+    :return: (rows, inputs): row (step * batch_size + sample) and input index of every spike.
+    """
+    frames = packed.reshape(-1, packed.shape[-1])
+    rows, byte_idx = torch.nonzero(frames, as_tuple=True)
+    bits = _byte_bits[frames[rows, byte_idx].long()]
+    spike_idx, bit = torch.nonzero(bits, as_tuple=True)
+    return rows[spike_idx], byte_idx[spike_idx] * 8 + bit
+
+
+def event_currents(rows, inputs, weight_rows, num_rows):
+    """
+    Accumulates the weight row of every spiking presynaptic neuron into its frame,
+    the core's synaptic phase (Vmemb[post] += w[pre][post] for each spike).
+
+    The events, sorted by row as torch.nonzero returns them, form per frame
+    index lists (CSR offsets), summed without materializing the gathered rows.
+
+    :param rows: Frame of every event, ascending.
+    :param inputs: Presynaptic neuron of every event.
+    :param weight_rows: Weights by presynaptic neuron [inputs, neurons].
+    :return: Currents [num_rows, neurons].
+    """
+    offsets = torch.zeros(num_rows, dtype=torch.int64)
+    torch.cumsum(torch.bincount(rows, minlength=num_rows)[:-1], 0, out=offsets[1:])
+    return torch.nn.functional.embedding_bag(inputs, weight_rows, offsets, mode="sum")
+
+
+class EventDrivenEngine(InferenceEngine):
+    """
+    InferenceEngine executing each layer event by event when its input is sparse.
+
+    Per layer the spike density of the actual input is measured: below
+    dense_above (crossover_density of the layer by default) the layer gathers
+    only the weight rows of active inputs (event lists from packed_events or
+    nonzero hidden spikes), above it the dense path of InferenceEngine is
+    faster. The synaptic operation counts
+    are the core's regardless of the path: every input event costs one
+    weight read and add per postsynaptic neuron.
+
+    Fixed point (QAT) models stay bit-exact. Float models may differ from
+    the training forward in the last bit of a current (summation order).
+    """
+
+    def __init__(self, model_state, dense_above=None, threads=0):
+        """
+        :param model_state: Dict saved by SNN.export_model.
+        :param dense_above: Input spike density above which a layer runs dense, None for crossover_density.
+        :param threads: Intra-op threads (process-wide), 0 keeps the current setting.
+        """
+        super().__init__(model_state, "eager", threads)
+        if dense_above is None:
+            self.dense_above = [crossover_density(self.num_inputs, self.w1.shape[0]),
+                                crossover_density(self.w1.shape[0], self.w2.shape[0], packed=False)]
+        else:
+            self.dense_above = [dense_above, dense_above]
+        self.w1_rows = self.w1.t().contiguous()
+        self.w2_rows = self.w2.t().contiguous()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Clears the accumulated activity statistics.
+        """
+        self.stats = {
+            "samples": 0,
+            "output_spikes": 0,
+            "layers": [{"events": 0, "synaptic_ops": 0, "neuron_updates": 0, "dense_runs": 0, "sparse_runs": 0}
+                       for layer in range(2)],
+        }
+
+    def _lif(self, cur, layer):
+        if self.quantization is None:
+            if layer == 0:
+                return float_lif(cur, self.beta1, self.threshold1)
+            return float_lif(cur, self.beta2, self.threshold2)
+        q = self.quantization
+        return fixed_lif(cur, self.mem_min, self.mem_max, int(q["leak_shift"]), float(q["Vthr"]), float(q["Vrst"]))
+
+    def _account(self, layer, events, fan_out, neurons, dense):
+        stats = self.stats["layers"][layer]
+        stats["events"] += events
+        stats["synaptic_ops"] += events * fan_out
+        stats["neuron_updates"] += neurons
+        stats["dense_runs" if dense else "sparse_runs"] += 1
+
+    def spike_counts(self, x):
+        """
+        :param x: Input spikes of num_steps steps, bit-packed uint8 [num_steps, batch_size, packed bytes].
+        :return: (output spike counts [batch_size, outputs], hidden spike counts [batch_size, hidden]).
+        """
+        packed = torch.as_tensor(x)[:self.num_steps].cpu()
+        if packed.dtype != torch.uint8:
+            raise ValueError("EventDrivenEngine expects bit-packed uint8 frames")
+        num_steps, batch_size = packed.shape[0], packed.shape[1]
+        num_rows = num_steps * batch_size
+        hidden, outputs = self.w1.shape[0], self.w2.shape[0]
+
+        with torch.no_grad():
+            # layer 1: input events
+            events = count_spikes(packed)
+            dense = events >= self.dense_above[0] * num_rows * self.num_inputs
+            if dense:
+                cur1 = packed_currents(packed, self.tables1)
+            else:
+                rows, inputs = packed_events(packed)
+                cur1 = event_currents(rows, inputs, self.w1_rows, num_rows).reshape(num_steps, batch_size, hidden)
+            self._account(0, events, hidden, num_rows * hidden, dense)
+            spk1 = self._lif(cur1, 0)
+
+            # layer 2: hidden spike events
+            events = int(spk1.sum())
+            dense = events >= self.dense_above[1] * num_rows * hidden
+            if dense:
+                cur2 = torch.matmul(spk1, self.w2.t())
+            else:
+                rows, inputs = torch.nonzero(spk1.reshape(num_rows, hidden), as_tuple=True)
+                cur2 = event_currents(rows, inputs, self.w2_rows, num_rows).reshape(num_steps, batch_size, outputs)
+            self._account(1, events, outputs, num_rows * outputs, dense)
+            spk2 = self._lif(cur2, 1)
+
+        self.stats["samples"] += batch_size
+        self.stats["output_spikes"] += int(spk2.sum())
+        return spk2.sum(0), spk1.sum(0)
+
+    def report(self):
+        """
+        :return: Text summary of densities, per inference synaptic operations and the
+                 event path crossover of each layer.
+        """
+        samples = max(1, self.stats["samples"])
+        fan_in = [self.num_inputs, self.w1.shape[0]]
+        lines = []
+        for layer, stats in enumerate(self.stats["layers"]):
+            density = stats["events"] / max(1, samples * self.num_steps * fan_in[layer])
+            if self.dense_above[layer] > 0:
+                crossover = f"event path below density {self.dense_above[layer]:.4f}"
+            else:
+                crossover = "event path off, too few synapses to gain from it (see --dense-above)"
+            lines.append(f"fc{layer + 1}: density {density:.4f}, {stats['events'] / samples:.1f} events, "
+                         f"{stats['synaptic_ops'] / samples:.1f} synaptic ops, "
+                         f"{stats['neuron_updates'] / samples:.0f} neuron updates per inference "
+                         f"(dense runs {stats['dense_runs']}, sparse runs {stats['sparse_runs']}, {crossover})")
+        lines.append(f"output: {self.stats['output_spikes'] / samples:.1f} spikes per inference")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event-driven scoring of an exported SNN on an exported spike dataset.")
+    parser.add_argument("--model", default="./exported_model.pth")
+    parser.add_argument("--spikes", default="./exported_spiking_input.spk")
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--dense-above", type=float, default=None,
+                        help="input spike density above which every layer runs dense, "
+                             "default: the measured crossover of each layer (crossover_density)")
+    args = parser.parse_args()
+
+    engine = EventDrivenEngine(torch.load(args.model, map_location="cpu", weights_only=False), args.dense_above,
+                               args.threads)
+    dataset = SpikeDataset(args.spikes)
+    start_time = time.perf_counter()
+    accuracy = engine.score(dataset, args.batch_size)
+    elapsed = time.perf_counter() - start_time
+    print(f"Accuracy on {len(dataset)} samples: {accuracy:.2f}% ({elapsed:.3f} s)")
+    print(engine.report())
@@ -0,0 +1,206 @@
+import argparse
+import numpy as np
+import torch
+
+from fixed_point import quantize
+from qat import FixedPointFormat
+
+# Port widths of nm_core_top
+addr_bits = 17  # adr_wmem_pack, cfg_lif0_baseAddr_i
+postsyn_count_bits = 7  # cfg_lif0_postsynCount_i
+weight_bits = 16  # weight field dat_wmem_pack[23:8]
+tag_bits = 8  # tag field dat_wmem_pack[7:0], holds the postsynaptic index of a synapse
+
+# Export layouts: "structured" runs on nm_core_top as it is, "adjacency" needs an RTL change (see config_words)
+layouts = ("structured", "adjacency")
+
+
+def structured_layout(weight_int):
+    """
+    Dense rows of the presynaptic neurons that kept a synapse.
+
+    The kept neurons are renumbered 0..k-1 in their original order. The layer
+    then is a dense [postsyn, k] layer: one cfg_lif0_baseAddr_i and
+    cfg_lif0_postsynCount_i = postsyn, the core addresses
+    baseAddr + new presyn * postsynCount + postsyn as usual. The host sends
+    the spike of input p with index input_map[p] and drops it if that is -1.
+
+    :param weight_int: Integer weights [postsyn, presyn], zeros are pruned synapses.
+    :return: (weights of the kept neurons [postsyn, kept], input_map [presyn] new index or -1).
+    """
+    weight_int = np.asarray(weight_int)
+    kept = np.flatnonzero((weight_int != 0).any(axis=0))
+    input_map = np.full(weight_int.shape[1], -1, dtype=np.int64)
+    input_map[kept] = np.arange(len(kept))
+    return weight_int[:, kept], input_map
+
+
+def adjacency_layout(weight_int, base_addr=0):
+    """
+    Compacted presynaptic adjacency lists of a layer.
+
+    Presynaptic neuron p owns counts[p] consecutive weight memory words from
+    offsets[p], one per nonzero synapse in postsynaptic order, holding the
+    weight and the postsynaptic index. Needs an RTL change, see config_words.
+
+    :param weight_int: Integer weights [postsyn, presyn], zeros are pruned synapses.
+    :param base_addr: Address of the first word.
+    :return: Dict of offsets [presyn], counts [presyn], postsyn [nnz], weights [nnz].
+    """
+    presyn_major = np.asarray(weight_int).T
+    presyn_idx, postsyn_idx = np.nonzero(presyn_major)
+    counts = np.bincount(presyn_idx, minlength=presyn_major.shape[0])
+    offsets = base_addr + np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return {"offsets": offsets, "counts": counts, "postsyn": postsyn_idx,
+            "weights": presyn_major[presyn_idx, postsyn_idx]}
+
+
+def config_words(layout):
+    """
+    Per presynaptic neuron (cfg_lif0_baseAddr_i, cfg_lif0_postsynCount_i) values.
+
+    The core addresses baseAddr + presyn * postsynCount + i for i < postsynCount,
+    so with postsynCount = counts[p] and baseAddr = offsets[p] - p * counts[p]
+    (modulo the address width) a spike of p, sent with its own index, reads
+    exactly its adjacency list. Presynaptic neurons with a count of 0 have
+    no synapses left, their spikes need not be sent at all.
+
+    Needs an RTL change: nm_core_top has a single baseAddr / postsynCount
+    pair per layer, reads only the weight field dat_wmem_pack[23:8] and
+    updates Vmemb[i] by its loop counter i, not by the tag. Use
+    structured_layout for the core as it is.
+
+    :return: (baseAddr [presyn], postsynCount [presyn]).
+    """
+    presyn = np.arange(len(layout["counts"]))
+    base_addr = (layout["offsets"] - presyn * layout["counts"]) % (1 << addr_bits)
+    return base_addr, layout["counts"].copy()
+
+
+def pack_words(layout):
+    """
+    :return: 24-bit dat_wmem_pack words: weight (two's complement) in [23:8], postsynaptic index in [7:0].
+    """
+    weights = layout["weights"].astype(np.int64) & ((1 << weight_bits) - 1)
+    return (weights << tag_bits) | layout["postsyn"].astype(np.int64)
+
+
+def check_layout(layout, num_postsyn):
+    """
+    :raise ValueError: If the layout does not fit the core's ports.
+    """
+    if num_postsyn > 1 << tag_bits:
+        raise ValueError(f"{num_postsyn} postsynaptic neurons do not fit the {tag_bits} bit tag field")
+    if layout["counts"].max(initial=0) >= 1 << postsyn_count_bits:
+        raise ValueError(f"{layout['counts'].max()} synapses of one presynaptic neuron do not fit "
+                         f"{postsyn_count_bits} bit postsynCount")
+    end = layout["offsets"][-1] + layout["counts"][-1] if len(layout["counts"]) else 0
+    if end > 1 << addr_bits:
+        raise ValueError(f"{end} weight memory words do not fit {addr_bits} address bits")
+
+
+def load_layer(layer_name, pth_file, integer_bits, fractional_bits):
+    """
+    :return: Integer weights [postsyn, presyn] of a layer of an exported model.
+    """
+    if integer_bits + fractional_bits > weight_bits:
+        raise ValueError(f"{integer_bits}.{fractional_bits} weights do not fit the {weight_bits} bit weight field")
+    state_dict = torch.load(pth_file, map_location="cpu", weights_only=False)["model_state_dict"]
+    if layer_name not in state_dict:
+        raise ValueError(f"Layer '{layer_name}' not found in the model's state_dict.")
+    weight = state_dict[layer_name].detach().cpu().numpy()
+    weight_int, _ = quantize(weight, FixedPointFormat(integer_bits, fractional_bits), overflow="error", name=layer_name)
+    return weight_int
+
+
+def export_structured(layer_name, pth_file="exported_model.pth", output_prefix="structured_fc1", integer_bits=2,
+                      fractional_bits=14, base_addr=0):
+    """
+    Exports a (structured pruned) layer as dense rows of its kept presynaptic
+    neurons (structured_layout), which nm_core_top runs unchanged:
+
+        <output_prefix>_wmem.mem       weight memory words (6 hex digits), presynaptic-major, new numbering
+        <output_prefix>_baseaddr.mem   cfg_lif0_baseAddr_i of the layer (5 hex digits)
+        <output_prefix>_postsyn.mem    cfg_lif0_postsynCount_i of the layer (2 hex digits)
+        <output_prefix>_input_map.txt  host side: new index of every original input, -1 if not sent
+
+    :param layer_name: Weight name in the state dict, e.g. 'fc1.weight'.
+    :param base_addr: First weight memory address of the layer.
+    :return: (weights of the kept neurons [postsyn, kept], input_map [presyn]).
+    """
+    weight_int = load_layer(layer_name, pth_file, integer_bits, fractional_bits)
+    kept_int, input_map = structured_layout(weight_int)
+    postsyn, kept = kept_int.shape
+    if postsyn >= 1 << postsyn_count_bits:
+        raise ValueError(f"{postsyn} postsynaptic neurons do not fit {postsyn_count_bits} bit postsynCount")
+    if base_addr + kept * postsyn > 1 << addr_bits:
+        raise ValueError(f"{base_addr + kept * postsyn} weight memory words do not fit {addr_bits} address bits")
+    # same words as adjacency lists that keep every synapse of the kept neurons
+    rows = {"weights": kept_int.T.reshape(-1), "postsyn": np.tile(np.arange(postsyn), kept)}
+
+    np.savetxt(f"{output_prefix}_wmem.mem", pack_words(rows), fmt="%06X")
+    np.savetxt(f"{output_prefix}_baseaddr.mem", [base_addr], fmt="%05X")
+    np.savetxt(f"{output_prefix}_postsyn.mem", [postsyn], fmt="%02X")
+    np.savetxt(f"{output_prefix}_input_map.txt", input_map, fmt="%d")
+
+    presyn = weight_int.shape[1]
+    print(f"Layer '{layer_name}' {weight_int.shape}: {kept}/{presyn} presynaptic neurons kept, "
+          f"{kept * postsyn} weight memory words instead of {presyn * postsyn} dense "
+          f"({100 * kept / max(1, presyn):.1f}%)")
+    print(f"Dense rows exported to {output_prefix}_wmem.mem, {output_prefix}_baseaddr.mem, "
+          f"{output_prefix}_postsyn.mem, input renumbering to {output_prefix}_input_map.txt")
+    return kept_int, input_map
+
+
+def export_adjacency(layer_name, pth_file="exported_model.pth", output_prefix="adjacency_fc1", integer_bits=2,
+                     fractional_bits=14, base_addr=0):
+    """
+    Exports a (pruned) layer as compacted adjacency lists, $readmemh files:
+
+        <output_prefix>_wmem.mem       packed weight memory words (6 hex digits), presynaptic-major
+        <output_prefix>_baseaddr.mem   cfg_lif0_baseAddr_i per presynaptic neuron (5 hex digits)
+        <output_prefix>_postsyn.mem    cfg_lif0_postsynCount_i per presynaptic neuron (2 hex digits)
+
+    The layout needs an RTL change (see config_words), export_structured
+    gives one the core runs as it is.
+
+    :param layer_name: Weight name in the state dict, e.g. 'fc1.weight'.
+    :param base_addr: First weight memory address of the layer.
+    :return: Layout dict (adjacency_layout).
+    """
+    weight_int = load_layer(layer_name, pth_file, integer_bits, fractional_bits)
+
+    layout = adjacency_layout(weight_int, base_addr)
+    check_layout(layout, weight_int.shape[0])
+    cfg_base_addr, cfg_postsyn_count = config_words(layout)
+
+    np.savetxt(f"{output_prefix}_wmem.mem", pack_words(layout), fmt="%06X")
+    np.savetxt(f"{output_prefix}_baseaddr.mem", cfg_base_addr, fmt="%05X")
+    np.savetxt(f"{output_prefix}_postsyn.mem", cfg_postsyn_count, fmt="%02X")
+
+    dense_words = weight_int.size
+    sparse_words = len(layout["weights"])
+    print(f"Layer '{layer_name}' {weight_int.shape}: {sparse_words} weight memory words instead of {dense_words} dense "
+          f"({100 * sparse_words / max(1, dense_words):.1f}%), synaptic phase {layout['counts'].mean():.2f} "
+          f"words per input spike instead of {weight_int.shape[0]}")
+    print(f"Adjacency lists exported to {output_prefix}_wmem.mem, {output_prefix}_baseaddr.mem, "
+          f"{output_prefix}_postsyn.mem")
+    return layout
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a pruned layer for the neuromorphic core.")
+    parser.add_argument("--model", default="./exported_model.pth")
+    parser.add_argument("--layer", default="fc1.weight")
+    parser.add_argument("--layout", choices=layouts, default="structured",
+                        help="structured: dense rows of the kept presynaptic neurons, runs on the current core; "
+                             "adjacency: per neuron adjacency lists, needs an RTL change")
+    parser.add_argument("--output-prefix", default=None, help="default <layout>_<layer>")
+    parser.add_argument("--integer-bits", type=int, default=2)
+    parser.add_argument("--fractional-bits", type=int, default=14)
+    parser.add_argument("--base-addr", type=int, default=0)
+    args = parser.parse_args()
+
+    output_prefix = args.output_prefix or f"{args.layout}_{args.layer.split('.')[0]}"
+    export = export_structured if args.layout == "structured" else export_adjacency
+    export(args.layer, args.model, output_prefix, args.integer_bits, args.fractional_bits, args.base_addr)
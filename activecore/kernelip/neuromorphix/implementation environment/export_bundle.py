@@ -0,0 +1,122 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+import torch
+
+from activity_profiler import CoreConfig
+from deploy_bundle import DeploymentBundle, config_registers, register_bits, write_bundle
+from export_weights_to_dat import weight_layers
+from fixed_point import overflow_modes, rounding_modes
+from qat import FixedPointFormat, QatConfig
+from weight_image import build_image
+
+
+def lif_configs(model_state, layers, weight_format, mem_bits):
+    """
+    Core neuron configuration of every layer: the trained one of a QAT
+    model, else the closest to its float LIF neurons (QatConfig.from_float),
+    layer fc<i> taking the beta and threshold of lif<i>.
+
+    Vthr and Vrst count weight LSBs, so those of a QAT model exported in
+    another format are rescaled to weight_format.
+
+    :param weight_format: FixedPointFormat of the exported weights.
+    :return: List of QatConfig, one per layer.
+    :raise ValueError: If the rescaled Vthr is out of reach of the membrane (see QatConfig).
+    """
+    if "quantization" in model_state:
+        q = model_state["quantization"]
+        trained = FixedPointFormat.parse(q["weight_format"])
+        config = QatConfig(weight_format, q["mem_bits"], q["leak_shift"], q["Vthr"] / trained.scale,
+                           q["Vrst"] / trained.scale)
+        return [config] * len(layers)
+    configs = []
+    for index, layer_name in enumerate(layers):
+        lif = model_state["LIF_neurons"][f"lif{index + 1}"]
+        configs.append(QatConfig.from_float(weight_format, mem_bits, float(lif["beta"]), float(lif["threshold"])))
+    return configs
+
+
+def config_words(lif_configs, manifest):
+    """
+    :return: Register values [layers, len(config_registers)] (u32), signed values in two's complement.
+    :raise ValueError: If a value does not fit its register.
+    """
+    rows = []
+    for config, entry in zip(lif_configs, manifest["layers"]):
+        values = {"Vthr": config.vthr, "Vrst": config.vrst, "leakage": config.leak_shift,
+                  "postsynCount": entry["shape"][0], "baseAddr": entry["base_addr"]}
+        row = []
+        for name in config_registers:
+            bits = register_bits[name]
+            signed = name in ("Vthr", "Vrst")
+            low, high = (-2 ** (bits - 1), 2 ** (bits - 1) - 1) if signed else (0, 2 ** bits - 1)
+            if not low <= values[name] <= high:
+                raise ValueError(f"{name} {values[name]} of layer '{entry['name']}' does not fit its {bits} bit "
+                                 f"register" + (", see core_mapping.py" if name == "postsynCount" else ""))
+            row.append(values[name] & (2 ** bits - 1))
+        rows.append(row)
+    return np.array(rows, dtype=np.uint32).reshape(-1, len(config_registers))
+
+
+def export_bundle(pth_file="exported_model.pth", output_file="deployment.nmb", integer_bits=None,
+                  fractional_bits=None, mem_bits=16, rounding="nearest_even", overflow="error", seed=None, core=None):
+    """
+    Writes the deployment bundle of a model in one pass: packed quantized
+    weights, per layer core registers, topology and checksums
+    (deploy_bundle.DeploymentBundle reads it back without torch).
+
+    :param integer_bits: Weight format, by default the QAT format of the model or 2.14.
+    :param mem_bits: Membrane width of models trained without QAT.
+    :return: Bundle header.
+    """
+    with open(pth_file, 'rb') as model_file:
+        model_sha256 = hashlib.sha256(model_file.read()).hexdigest()
+    model_state = torch.load(pth_file, map_location="cpu", weights_only=False)
+    state_dict = model_state["model_state_dict"]
+    if integer_bits is None or fractional_bits is None:
+        default = FixedPointFormat.parse(model_state.get("quantization", {}).get("weight_format", "2.14"))
+        integer_bits = default.int_bits if integer_bits is None else integer_bits
+        fractional_bits = default.frac_bits if fractional_bits is None else fractional_bits
+    fmt = FixedPointFormat(integer_bits, fractional_bits)
+
+    layers = weight_layers(state_dict)
+    weights = {name: state_dict[name].detach().cpu().numpy() for name in layers}
+    image, manifest = build_image(weights, fmt, core, rounding, overflow, seed)
+    configs = lif_configs(model_state, layers, fmt, mem_bits)
+    for entry, config in zip(manifest["layers"], configs):
+        entry["lif"] = config.describe()
+
+    topology = {key: value.item() if torch.is_tensor(value) else value
+                for key, value in model_state["model_topology"].items()}
+    header = {"model_sha256": model_sha256, "source": os.path.basename(pth_file), "topology": topology,
+              "config_registers": list(config_registers),
+              "wmem": {key: manifest[key] for key in ("format", "rounding", "word_bits", "addr_bits", "depth",
+                                                      "weights_per_word", "fields", "utilization")},
+              "layers": manifest["layers"]}
+    header = write_bundle(output_file, header, {"wmem": image.astype(np.uint32),
+                                                "config": config_words(configs, manifest)})
+    print(f"Bundle written to {output_file}: {len(layers)} layers, {manifest['depth']} weight memory words, "
+          f"{os.path.getsize(output_file)} bytes")
+    return header
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a trained SNN as a deployment bundle for the core.")
+    parser.add_argument("--model", default="./exported_model.pth")
+    parser.add_argument("--output", default="./deployment.nmb")
+    parser.add_argument("--integer-bits", type=int, default=None, help="Default: the model's QAT format or 2")
+    parser.add_argument("--fractional-bits", type=int, default=None, help="Default: the model's QAT format or 14")
+    parser.add_argument("--mem-bits", type=int, default=16, help="Membrane width for models trained without QAT")
+    parser.add_argument("--rounding", choices=rounding_modes, default="nearest_even")
+    parser.add_argument("--overflow", choices=overflow_modes, default="error")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the stochastic rounding")
+    parser.add_argument("--word-bits", type=int, default=24, help="dat_wmem_pack width")
+    parser.add_argument("--addr-bits", type=int, default=17, help="adr_wmem_pack width")
+    args = parser.parse_args()
+
+    export_bundle(args.model, args.output, args.integer_bits, args.fractional_bits, args.mem_bits, args.rounding,
+                  args.overflow, args.seed, CoreConfig(weight_word_bits=args.word_bits, addr_bits=args.addr_bits))
+    with DeploymentBundle(args.output) as bundle:
+        print(bundle.describe())
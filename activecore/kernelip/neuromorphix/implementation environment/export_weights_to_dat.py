@@ -1,85 +1,90 @@
+import argparse
 import torch
 
+from fixed_point import hex_words, quantize_tensors, rounding_modes, overflow_modes
+from qat import FixedPointFormat
 
-# Function to convert a floating-point number to fixed-point and hexadecimal format
-def float_to_fixed_point_hex(value, int_bits, frac_bits):
-    # Calculate the scaling factor for the fractional part
-    scaling_factor = 2 ** frac_bits
 
-    # Convert the number to an integer value
-    fixed_point_value = int(round(value * scaling_factor))
+def weight_layers(state_dict):
+    """
+    :return: Names of the weight matrices of a state dict, e.g. ['fc1.weight', 'fc2.weight'].
+    """
+    return [name for name, value in state_dict.items() if name.endswith(".weight") and value.dim() == 2]
 
-    # Calculate the total number of bits to store the number
-    total_bits = int_bits + frac_bits
 
-    # Check if the number fits in the specified number of bits
-    max_value = 2 ** (total_bits - 1) - 1
-    min_value = -2 ** (total_bits - 1)
-    if fixed_point_value > max_value or fixed_point_value < min_value:
-        raise ValueError(
-            f"The number {value} does not fit in the format with {int_bits} integer bits and {frac_bits} fractional bits.")
-
-    # Convert to two's complement format
-    if fixed_point_value < 0:
-        fixed_point_value = (1 << total_bits) + fixed_point_value
-
-    # Convert to hexadecimal representation
-    hex_value = format(fixed_point_value, '04X')
-
-    return hex_value
-
-
-# Function to export layer weights to weights.dat file
-def export_weights_to_dat(layer_name, pth_file="exported_model.pth", output_file="weights_fc2.dat", integer_bits=2,
-                          fractional_bits=14):
-    # Load the .pth file
-    data = torch.load(pth_file)
-
-    # Extract the state_dict
-    state_dict = data['model_state_dict']
-
-    # Check if the layer exists
-    if layer_name not in state_dict:
-        raise ValueError(f"Layer '{layer_name}' not found in the model's state_dict.")
-
-    # Extract weights for the specified layer
-    layer_weight = state_dict[layer_name]  # Example: 'fc1.weight' or 'fc2.weight'
-
-    # Debug information: shape of the weights
-    print(f"Exporting weights from layer '{layer_name}' with shape: {layer_weight.shape}")
-
-    # Write weights to file in hexadecimal format, suitable for $readmemh
-    with open(output_file, 'w') as f:
-        for postsyn_idx in range(layer_weight.shape[0]):
-            for presyn_idx in range(layer_weight.shape[1]):
-                value = layer_weight[postsyn_idx][presyn_idx].item()
-                hex_value = float_to_fixed_point_hex(value, integer_bits, fractional_bits)
-                f.write(hex_value + '\n')
-
-    # Debug information: examples of transformed weights
+def print_examples(layer_name, weight, words):
+    # Debug information: examples of weight values and their conversion to fixed point
+    flat = weight.reshape(-1)
     print(f"\nExamples of weight values and their conversion to fixed-point from layer '{layer_name}':")
-
-    # Output the first 5 weight values
-    for i in range(min(5, layer_weight.numel())):
-        original_value = round(layer_weight.view(-1)[i].item(), 4)  # Round the original value to 4 decimal places
-        hex_value = float_to_fixed_point_hex(original_value, integer_bits, fractional_bits)
-        # Output in scientific notation format, as in PyTorch
-        scientific_value = "{:.4e}".format(layer_weight.view(-1)[i].item())
-        print(f"First values - Original: {original_value:.4f}, Hex: {hex_value}, Scientific: {scientific_value}")
-
+    for i in range(min(5, flat.size)):
+        print(f"First values - Original: {flat[i]:.4f}, Hex: {words[i]}, Scientific: {flat[i]:.4e}")
     print("\n...\n")
+    for i in range(max(-5, -flat.size), 0):
+        print(f"Last values - Original: {flat[i]:.4f}, Hex: {words[i]}, Scientific: {flat[i]:.4e}")
+
+
+def export_weights(pth_file="exported_model.pth", layers=None, output_pattern="weights_{}.dat", integer_bits=2,
+                   fractional_bits=14, rounding="nearest_even", overflow="error", seed=None, verbose=False):
+    """
+    Exports weight layers to $readmemh files, one fixed point word per line in
+    [postsyn][presyn] order. All layers are quantized before anything is
+    written, so with overflow="error" the ValueError lists the overflows of
+    every layer.
+
+    :param layers: Weight names in the state dict, all weight matrices if None.
+    :param output_pattern: Output file per layer, {} is the layer name without '.weight'.
+    :param rounding: One of fixed_point.rounding_modes.
+    :param overflow: One of fixed_point.overflow_modes.
+    :param seed: Seed of the stochastic rounding.
+    :return: List of fixed_point.QuantizationStats, one per layer.
+    """
+    state_dict = torch.load(pth_file, map_location="cpu", weights_only=False)['model_state_dict']
+    layers = weight_layers(state_dict) if layers is None else layers
+    for layer_name in layers:
+        if layer_name not in state_dict:
+            raise ValueError(f"Layer '{layer_name}' not found in the model's state_dict.")
+    weights = {name: state_dict[name].detach().cpu().numpy() for name in layers}
+    fmt = FixedPointFormat(integer_bits, fractional_bits)
+    ints, stats = quantize_tensors(weights, fmt, rounding, overflow, seed)
+
+    for layer_name in layers:
+        output_file = output_pattern.format(layer_name.removesuffix(".weight"))
+        words = hex_words(ints[layer_name], fmt.total_bits)
+        with open(output_file, 'w') as f:
+            f.write("\n".join(words) + "\n")
+        print(f"Exported weights of layer '{layer_name}' with shape {tuple(weights[layer_name].shape)} "
+              f"to {output_file}")
+        if verbose:
+            print_examples(layer_name, weights[layer_name], words)
+    print(f"Quantization to {fmt} ({rounding}, {overflow}):")
+    for item in stats:
+        print(f"  {item}")
+    return stats
 
-    # Output the last 5 weight values
-    for i in range(-5, 0):
-        original_value = round(layer_weight.view(-1)[i].item(), 4)  # Round the original value to 4 decimal places
-        hex_value = float_to_fixed_point_hex(original_value, integer_bits, fractional_bits)
-        # Output in scientific notation format, as in PyTorch
-        scientific_value = "{:.4e}".format(layer_weight.view(-1)[i].item())
-        print(f"Last values - Original: {original_value:.4f}, Hex: {hex_value}, Scientific: {scientific_value}")
 
-    print(f"\nWeights successfully exported to {output_file}")
-
-
-# Example usage
-# Choose the layer and the number of bits for the integer and fractional part
-export_weights_to_dat('fc2.weight', integer_bits=2, fractional_bits=14)
\ No newline at end of file
+# Function to export layer weights to weights.dat file
+def export_weights_to_dat(layer_name, pth_file="exported_model.pth", output_file="weights_fc2.dat", integer_bits=2,
+                          fractional_bits=14, rounding="nearest_even", overflow="error", seed=None):
+    """
+    Exports one layer, see export_weights.
+    """
+    return export_weights(pth_file, [layer_name], output_file.replace("{", "{{").replace("}", "}}"), integer_bits,
+                          fractional_bits, rounding, overflow, seed, verbose=True)[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export SNN weights as fixed point $readmemh files.")
+    parser.add_argument("--model", default="exported_model.pth")
+    parser.add_argument("--layers", nargs="+", default=None, help="Weight names, default all weight matrices")
+    parser.add_argument("--output-pattern", default="weights_{}.dat",
+                        help="Output file per layer, {} is the layer name without '.weight'")
+    parser.add_argument("--integer-bits", type=int, default=2)
+    parser.add_argument("--fractional-bits", type=int, default=14)
+    parser.add_argument("--rounding", choices=rounding_modes, default="nearest_even")
+    parser.add_argument("--overflow", choices=overflow_modes, default="error")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the stochastic rounding")
+    parser.add_argument("--verbose", action="store_true", help="Print example conversions per layer")
+    args = parser.parse_args()
+
+    export_weights(args.model, args.layers, args.output_pattern, args.integer_bits, args.fractional_bits,
+                   args.rounding, args.overflow, args.seed, args.verbose)
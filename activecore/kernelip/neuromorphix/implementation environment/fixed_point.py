@@ -0,0 +1,155 @@
+import dataclasses
+import math
+import numpy as np
+
+from qat import FixedPointFormat
+
+# Rounding of value * 2^frac_bits to an integer:
+#   nearest_even  nearest integer, ties to even (as Python round and torch.round)
+#   stochastic    floor(v + u), u uniform in [0, 1), unbiased on average
+#   truncate      floor, dropping the low bits of a two's complement number
+rounding_modes = ("nearest_even", "stochastic", "truncate")
+
+# Out of range values: clamped to the format's range, or reported as a ValueError
+overflow_modes = ("saturate", "error")
+
+
+@dataclasses.dataclass
+class QuantizationStats:
+    """
+    Quantization diagnostic of one tensor, errors in float units.
+    """
+    name: str
+    count: int
+    overflows: int  # values out of the format's range, saturated
+    max_abs_value: float
+    max_error: float
+    rms_error: float
+    signal_power: float  # mean square of the values
+
+    @property
+    def sqnr_db(self):
+        """
+        Signal to quantization noise ratio, inf for an exact conversion.
+        """
+        if self.rms_error == 0:
+            return math.inf
+        if self.signal_power == 0:
+            return -math.inf
+        return 10 * math.log10(self.signal_power / self.rms_error ** 2)
+
+    def __str__(self):
+        return (f"{self.name}: {self.count} values, {self.overflows} overflows, max |value| {self.max_abs_value:.4g}, "
+                f"max error {self.max_error:.3g}, rms error {self.rms_error:.3g}, SQNR {self.sqnr_db:.1f} dB")
+
+
+def check_modes(rounding, overflow):
+    if rounding not in rounding_modes:
+        raise ValueError(f"Unknown rounding mode: {rounding}, expected one of {', '.join(rounding_modes)}")
+    if overflow not in overflow_modes:
+        raise ValueError(f"Unknown overflow mode: {overflow}, expected one of {', '.join(overflow_modes)}")
+
+
+def _quantize(values, fmt, rounding, rng, name):
+    """
+    :return: (saturated int64 array, QuantizationStats, out of range mask).
+    """
+    scaled = values * fmt.scale
+    if rounding == "nearest_even":
+        scaled = np.rint(scaled)
+    elif rounding == "stochastic":
+        scaled = np.floor(scaled + rng.random(scaled.shape))
+    else:
+        scaled = np.floor(scaled)
+    out_of_range = (scaled < fmt.min_int) | (scaled > fmt.max_int)
+    ints = np.clip(scaled, fmt.min_int, fmt.max_int).astype(np.int64)
+
+    error = ints / fmt.scale - values
+    empty = values.size == 0
+    stats = QuantizationStats(name, values.size, int(np.count_nonzero(out_of_range)),
+                              float(np.abs(values).max(initial=0)), float(np.abs(error).max(initial=0)),
+                              0.0 if empty else float(np.sqrt(np.mean(error ** 2))),
+                              0.0 if empty else float(np.mean(values ** 2)))
+    return ints, stats, out_of_range
+
+
+def overflow_message(failures, fmt):
+    """
+    :param failures: List of (QuantizationStats, values, out of range mask) of the tensors with overflows.
+    :return: Text listing the overflows of every tensor with its first offending value.
+    """
+    parts = []
+    for stats, values, out_of_range in failures:
+        index = tuple(int(i) for i in np.argwhere(out_of_range)[0])
+        parts.append(f"{stats.name or 'values'}: {stats.overflows} of {stats.count}, e.g. {values[index]} at {index}")
+    return (f"Values do not fit the {fmt} format, range [{fmt.min_int / fmt.scale}, {fmt.max_int / fmt.scale}]: "
+            + "; ".join(parts))
+
+
+def quantize(values, fmt, rounding="nearest_even", overflow="saturate", rng=None, name=""):
+    """
+    Converts a whole array to fixed point integers.
+
+    :param values: Float array (NumPy or anything np.asarray accepts, e.g. a CPU tensor).
+    :param fmt: FixedPointFormat.
+    :param rounding: One of rounding_modes.
+    :param overflow: One of overflow_modes.
+    :param rng: np.random.Generator of the stochastic rounding, a fresh unseeded one if None.
+    :param name: Name of the values in the stats and the error message.
+    :return: (int64 array of the same shape, QuantizationStats).
+    :raise ValueError: With overflow="error", if any value is out of range, after counting all of them.
+    """
+    check_modes(rounding, overflow)
+    values = np.asarray(values, dtype=np.float64)
+    ints, stats, out_of_range = _quantize(values, fmt, rounding, rng or np.random.default_rng(), name)
+    if overflow == "error" and stats.overflows:
+        raise ValueError(overflow_message([(stats, values, out_of_range)], fmt))
+    return ints, stats
+
+
+def quantize_tensors(tensors, fmt, rounding="nearest_even", overflow="saturate", seed=None):
+    """
+    Quantizes several named tensors, e.g. all weight layers of a model.
+
+    With overflow="error" every tensor is still converted and checked, the
+    ValueError lists the overflows of all of them.
+
+    :param tensors: Dict of name -> float array.
+    :param seed: Seed of the stochastic rounding.
+    :return: (dict of name -> int64 array, list of QuantizationStats).
+    """
+    check_modes(rounding, overflow)
+    rng = np.random.default_rng(seed)
+    results = {}
+    all_stats = []
+    failures = []
+    for name, values in tensors.items():
+        values = np.asarray(values, dtype=np.float64)
+        results[name], stats, out_of_range = _quantize(values, fmt, rounding, rng, name)
+        all_stats.append(stats)
+        if stats.overflows:
+            failures.append((stats, values, out_of_range))
+    if overflow == "error" and failures:
+        raise ValueError(overflow_message(failures, fmt))
+    return results, all_stats
+
+
+def hex_words(ints, total_bits):
+    """
+    :param ints: Integer array.
+    :param total_bits: Word width, negative values become two's complement words of this width.
+    :return: List of upper case hex strings of ceil(total_bits / 4) digits, in C order.
+    """
+    word = f"{{:0{(total_bits + 3) // 4}X}}".format
+    return [word(value) for value in (np.asarray(ints, dtype=np.int64) & ((1 << total_bits) - 1)).ravel().tolist()]
+
+
+def float_to_fixed_point_hex(value, int_bits, frac_bits, rounding="nearest_even"):
+    """
+    One value as a two's complement hex word, e.g. -0.0014 in 3.13 -> 'FFF5'.
+
+    :raise ValueError: If the value does not fit the format.
+    """
+    fmt = FixedPointFormat(int_bits, frac_bits)
+    ints, _ = quantize([value], fmt, rounding, "error")
+    return hex_words(ints, fmt.total_bits)[0]
@@ -0,0 +1,122 @@
+import math
+import torch
+
+from inference import byte_tables, packed_currents
+from spike_encoder import unpack_spikes
+
+# Slope of the ATan surrogate, snntorch's default spike_grad (surrogate.atan(alpha=2))
+atan_alpha = 2.0
+
+
+class LeakySequence(torch.autograd.Function):
+    """
+    All time steps of a layer of leaky integrate-and-fire neurons in one autograd node.
+
+    Forward is step for step the same arithmetic as snntorch
+    Leaky(beta, graded_spikes_factor=1) with the defaults reset_mechanism="subtract"
+    and reset_delay=True, started from zero membrane:
+
+        reset[t] = mem[t-1] > threshold  (no gradient)
+        mem[t] = beta * mem[t-1] + cur[t] - reset[t] * threshold
+        spk[t] = mem[t] > threshold
+
+    Backward uses the ATan surrogate for d spk / d mem and runs the
+    recurrence d mem[t] / d mem[t-1] = beta backwards over the saved
+    membrane, instead of autograd replaying num_steps * 5 small ops.
+    """
+
+    @staticmethod
+    def forward(ctx, cur, beta, threshold, alpha):
+        """
+        :param cur: Input currents [num_steps, batch_size, neurons].
+        :param beta: Decay rate, already clamped to [0, 1], scalar or per neuron tensor.
+        :param threshold: Firing threshold tensor.
+        :param alpha: ATan surrogate slope.
+        :return: (spikes, membrane), both [num_steps, batch_size, neurons].
+        """
+        mem = torch.empty_like(cur)
+        spk = torch.empty_like(cur)
+        prev = torch.zeros_like(cur[0])
+        reset = torch.zeros_like(cur[0])
+        for step in range(cur.shape[0]):
+            torch.gt(prev, threshold, out=reset)
+            torch.mul(prev, beta, out=mem[step])
+            mem[step].add_(cur[step]).sub_(reset * threshold)
+            torch.gt(mem[step], threshold, out=spk[step])
+            prev = mem[step]
+        ctx.save_for_backward(mem, beta, threshold)
+        ctx.alpha = alpha
+        return spk, mem
+
+    @staticmethod
+    def backward(ctx, grad_spk, grad_mem):
+        mem, beta, threshold = ctx.saved_tensors
+        alpha = ctx.alpha
+        # surrogate d spk / d mem for all steps at once
+        surrogate = alpha / 2 / (1 + (math.pi / 2 * alpha * (mem - threshold)).pow_(2))
+        grad = surrogate.mul_(grad_spk)
+        if grad_mem is not None:
+            grad.add_(grad_mem)
+        for step in range(grad.shape[0] - 2, -1, -1):
+            grad[step].add_(grad[step + 1] * beta)
+        return grad, None, None, None
+
+
+def leaky_sequence(cur, lif, alpha=atan_alpha):
+    """
+    Runs a snntorch Leaky neuron over a whole input sequence with LeakySequence.
+
+    :param cur: Input currents [num_steps, batch_size, neurons].
+    :param lif: snntorch Leaky supplying beta and threshold.
+    :param alpha: ATan surrogate slope.
+    :return: (spikes, membrane), both [num_steps, batch_size, neurons].
+    """
+    beta = lif.beta.clamp(0, 1).to(cur.dtype)
+    threshold = lif.threshold.to(cur.dtype)
+    return LeakySequence.apply(cur, beta, threshold, alpha)
+
+
+class PackedLinear(torch.autograd.Function):
+    """
+    Bias-free linear layer fed with bit-packed spike frames, without unpacking
+    the whole input sequence.
+
+    Forward sums one inference.byte_tables row per input byte, as the
+    inference engine does. Backward needs the dense input only for the weight
+    gradient and unpacks it one time step at a time, so the dense
+    [num_steps, batch_size, num_inputs] tensor is never held in memory.
+    The packed input gets no gradient.
+    """
+
+    @staticmethod
+    def forward(ctx, packed, weight):
+        """
+        :param packed: Bit-packed spikes, uint8 [num_steps, batch_size, ceil(num_inputs / 8)].
+        :param weight: Weights [neurons, num_inputs].
+        :return: Currents [num_steps, batch_size, neurons].
+        """
+        ctx.save_for_backward(packed, weight)
+        return packed_currents(packed, byte_tables(weight))
+
+    @staticmethod
+    def backward(ctx, grad_cur):
+        packed, weight = ctx.saved_tensors
+        grad_weight = torch.zeros_like(weight)
+        for step in range(packed.shape[0]):
+            frame = unpack_spikes(packed[step], weight.shape[1], grad_cur.dtype)
+            grad_weight.addmm_(grad_cur[step].t(), frame)
+        return None, grad_weight
+
+
+def linear_inputs(x, weight):
+    """
+    First layer currents of dense or bit-packed input spikes.
+
+    :param x: Inputs [num_steps, batch_size, num_inputs] or bit-packed uint8
+              [num_steps, batch_size, ceil(num_inputs / 8)].
+    :param weight: Weights [neurons, num_inputs].
+    :return: Currents [num_steps, batch_size, neurons].
+    """
+    if x.dtype == torch.uint8:
+        return PackedLinear.apply(x, weight)
+    return torch.nn.functional.linear(x, weight)
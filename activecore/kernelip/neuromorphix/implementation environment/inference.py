@@ -0,0 +1,298 @@
+import argparse
+import time
+import warnings
+import torch
+from torch import Tensor
+
+from spike_dataset import SpikeDataset
+
+
+def byte_tables(weight: Tensor) -> Tensor:
+    """
+    Per input byte lookup tables of a layer fed with bit-packed spikes.
+
+    Entry [j, v] is the current contributed by byte j of a packed frame with
+    value v (MSB first, as spike_encoder.pack_spikes), i.e. the sum of the
+    weight columns of its set bits. A frame's current is then the sum of one
+    table row per byte, no dense unpacked input is materialized.
+
+    :param weight: Weights [neurons, num_inputs].
+    :return: Tables [ceil(num_inputs / 8) * 256, neurons].
+    """
+    neurons = weight.shape[0]
+    num_bytes = (weight.shape[1] + 7) // 8
+    padded = torch.zeros(neurons, num_bytes * 8, dtype=weight.dtype, device=weight.device)
+    padded[:, :weight.shape[1]] = weight
+    values = torch.arange(256, device=weight.device).unsqueeze(1)
+    shifts = torch.arange(7, -1, -1, device=weight.device)
+    bits = torch.bitwise_and(torch.bitwise_right_shift(values, shifts), 1).to(weight.dtype)
+    tables = torch.einsum("vb,njb->jvn", bits, padded.reshape(neurons, num_bytes, 8))
+    return tables.reshape(num_bytes * 256, neurons).contiguous()
+
+
+def packed_currents(packed: Tensor, tables: Tensor) -> Tensor:
+    """
+    Input currents of bit-packed frames [num_steps, batch_size, packed bytes] through byte_tables.
+
+    :return: Currents [num_steps, batch_size, neurons].
+    """
+    num_bytes = packed.shape[2]
+    offsets = torch.arange(num_bytes, dtype=torch.int32, device=packed.device) * 256
+    indices = packed.to(torch.int32).add_(offsets).reshape(-1, num_bytes)
+    currents = torch.nn.functional.embedding_bag(indices, tables, mode="sum")
+    return currents.reshape(packed.shape[0], packed.shape[1], -1)
+
+
+def float_lif(cur: Tensor, beta: Tensor, threshold: Tensor) -> Tensor:
+    """
+    snntorch Leaky(beta, graded_spikes_factor=1) over all time steps, same arithmetic
+    as fused_lif.LeakySequence, without gradient bookkeeping.
+    """
+    spk = torch.empty_like(cur)
+    mem = torch.zeros_like(cur[0])
+    reset = torch.zeros_like(cur[0])
+    for step in range(cur.shape[0]):
+        torch.gt(mem, threshold, out=reset)
+        mem = torch.mul(mem, beta).add_(cur[step]).sub_(reset * threshold)
+        torch.gt(mem, threshold, out=spk[step])
+    return spk
+
+
+def fixed_lif(cur: Tensor, mem_min: float, mem_max: float, leak_shift: int, vthr: float, vrst: float) -> Tensor:
+    """
+    Fixed point neuron of the core over all time steps, same arithmetic as
+    qat.quant_leaky_sequence: currents and membrane are integers in weight LSB units.
+    """
+    spk = torch.empty_like(cur)
+    mem = torch.zeros_like(cur[0])
+    for step in range(cur.shape[0]):
+        mem = torch.clamp(mem + cur[step], mem_min, mem_max)
+        mem = torch.floor(mem / (2 ** leak_shift))
+        fired = mem >= vthr
+        spk[step] = fired.to(cur.dtype)
+        mem = torch.where(fired, torch.full_like(mem, vrst), mem)
+    return spk
+
+
+def input_currents(x: Tensor, w1: Tensor, tables1: Tensor) -> Tensor:
+    if x.dtype == torch.uint8:
+        return packed_currents(x, tables1)
+    return torch.matmul(x, w1.t())
+
+
+def float_network(x: Tensor, w1: Tensor, tables1: Tensor, w2: Tensor, beta1: Tensor, threshold1: Tensor,
+                  beta2: Tensor, threshold2: Tensor):
+    """
+    Whole float network over all time steps.
+
+    :param x: Input spikes, bit-packed uint8 [num_steps, batch_size, packed bytes] or 0/1 floats
+              [num_steps, batch_size, num_inputs].
+    :param tables1: byte_tables of w1, used for packed inputs.
+    :return: (output spikes [num_steps, batch_size, outputs], hidden spikes [num_steps, batch_size, hidden]).
+    """
+    spk1 = float_lif(input_currents(x, w1, tables1), beta1, threshold1)
+    spk2 = float_lif(torch.matmul(spk1, w2.t()), beta2, threshold2)
+    return spk2, spk1
+
+
+def fixed_network(x: Tensor, w1: Tensor, tables1: Tensor, w2: Tensor, mem_min: float, mem_max: float,
+                  leak_shift: int, vthr: float, vrst: float):
+    """
+    Whole fixed point network over all time steps, weights are integers in LSB units.
+
+    :return: (output spikes [num_steps, batch_size, outputs], hidden spikes [num_steps, batch_size, hidden]).
+    """
+    spk1 = fixed_lif(input_currents(x, w1, tables1), mem_min, mem_max, leak_shift, vthr, vrst)
+    spk2 = fixed_lif(torch.matmul(spk1, w2.t()), mem_min, mem_max, leak_shift, vthr, vrst)
+    return spk2, spk1
+
+
+def float_spike_counts(x: Tensor, w1: Tensor, tables1: Tensor, w2: Tensor, beta1: Tensor, threshold1: Tensor,
+                       beta2: Tensor, threshold2: Tensor):
+    """
+    :return: (output spike counts [batch_size, outputs], hidden spike counts [batch_size, hidden]) of float_network.
+    """
+    spk2, spk1 = float_network(x, w1, tables1, w2, beta1, threshold1, beta2, threshold2)
+    return spk2.sum(0), spk1.sum(0)
+
+
+def fixed_spike_counts(x: Tensor, w1: Tensor, tables1: Tensor, w2: Tensor, mem_min: float, mem_max: float,
+                       leak_shift: int, vthr: float, vrst: float):
+    """
+    :return: (output spike counts [batch_size, outputs], hidden spike counts [batch_size, hidden]) of fixed_network.
+    """
+    spk2, spk1 = fixed_network(x, w1, tables1, w2, mem_min, mem_max, leak_shift, vthr, vrst)
+    return spk2.sum(0), spk1.sum(0)
+
+
+# Compiled network functions per backend, shared by all engines: weights are arguments,
+# so a sweep of models reuses one graph
+_compiled = {}
+
+
+def _network_functions(backend):
+    if backend not in _compiled:
+        if backend == "script":
+            with warnings.catch_warnings():
+                # TorchScript is deprecated in favour of torch.compile, which needs a C++
+                # toolchain and tens of seconds per graph
+                warnings.simplefilter("ignore", FutureWarning)
+                functions = (torch.jit.script(float_spike_counts), torch.jit.script(fixed_spike_counts))
+        elif backend == "compile":
+            functions = (torch.compile(float_spike_counts, dynamic=True),
+                         torch.compile(fixed_spike_counts, dynamic=True))
+        elif backend == "eager":
+            functions = (float_spike_counts, fixed_spike_counts)
+        else:
+            raise ValueError(f"Unknown inference backend: {backend}")
+        _compiled[backend] = functions
+    return _compiled[backend]
+
+
+class InferenceEngine:
+    """
+    Inference-only evaluator of the 2-layer SNN exported by SNN.export_model.
+
+    The whole time loop runs in one scripted (or compiled) graph over binary
+    or bit-packed inputs, without autograd, and returns spike counts. Packed
+    inputs are never unpacked: the first layer sums per byte lookup tables
+    (byte_tables). Models exported after quantization-aware training run on
+    the core's fixed point datapath, bit-exact with the QAT forward. Float
+    models use the training arithmetic except for the summation order of the
+    first layer currents.
+    """
+
+    def __init__(self, model_state, backend="script", threads=0):
+        """
+        :param model_state: Dict saved by SNN.export_model (torch.load of exported_model.pth).
+        :param backend: "script" (TorchScript), "compile" (torch.compile) or "eager".
+        :param threads: Intra-op threads (process-wide), 0 keeps the current setting.
+        """
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.float_fn, self.fixed_fn = _network_functions(backend)
+        state_dict = model_state["model_state_dict"]
+        topology = model_state["model_topology"]
+        self.num_inputs = topology["input_size"]
+        self.num_steps = topology["num_steps"]
+        self.quantization = model_state.get("quantization")
+
+        def to_tensor(value):
+            return torch.as_tensor(value, dtype=torch.float32).detach().clone()
+
+        w1 = to_tensor(state_dict["fc1.weight"])
+        w2 = to_tensor(state_dict["fc2.weight"])
+        if self.quantization is None:
+            self.w1 = w1
+            self.w2 = w2
+            lif = model_state["LIF_neurons"]
+            self.beta1 = to_tensor(lif["lif1"]["beta"]).clamp(0, 1)
+            self.threshold1 = to_tensor(lif["lif1"]["threshold"])
+            self.beta2 = to_tensor(lif["lif2"]["beta"]).clamp(0, 1)
+            self.threshold2 = to_tensor(lif["lif2"]["threshold"])
+        else:
+            frac_bits = int(self.quantization["weight_format"].split(".")[1])
+            self.w1 = torch.round(w1 * 2 ** frac_bits)
+            self.w2 = torch.round(w2 * 2 ** frac_bits)
+            mem_bits = self.quantization["mem_bits"]
+            self.mem_min = float(-2 ** (mem_bits - 1))
+            self.mem_max = float(2 ** (mem_bits - 1) - 1)
+        self.tables1 = byte_tables(self.w1)
+
+    @classmethod
+    def from_file(cls, file_path, backend="script", threads=0):
+        return cls(torch.load(file_path, map_location="cpu", weights_only=False), backend, threads)
+
+    @classmethod
+    def from_module(cls, net, backend="script", threads=0):
+        """
+        Engine over the current weights of a training SNN (main.SNN).
+        """
+        model_state = {
+            "model_state_dict": {"fc1.weight": net.fc1.weight.detach().cpu(),
+                                 "fc2.weight": net.fc2.weight.detach().cpu()},
+            "model_topology": {"input_size": net.num_inputs, "num_steps": net.num_steps},
+            "LIF_neurons": {"lif1": {"beta": net.lif1.beta.cpu(), "threshold": net.lif1.threshold.cpu()},
+                            "lif2": {"beta": net.lif2.beta.cpu(), "threshold": net.lif2.threshold.cpu()}},
+        }
+        if net.qat is not None:
+            w1, w2 = net.quantized_weights()
+            model_state["model_state_dict"] = {"fc1.weight": w1.detach().cpu(), "fc2.weight": w2.detach().cpu()}
+            model_state["quantization"] = net.qat.describe()
+        return cls(model_state, backend, threads)
+
+    def spike_counts(self, x):
+        """
+        :param x: Input spikes of num_steps steps, bit-packed uint8 [num_steps, batch_size, packed bytes]
+                  or 0/1 [num_steps, batch_size, num_inputs].
+        :return: (output spike counts [batch_size, outputs], hidden spike counts [batch_size, hidden]).
+        """
+        x = torch.as_tensor(x)[:self.num_steps].cpu()
+        if x.dtype != torch.uint8:
+            x = x.reshape(x.shape[0], x.shape[1], -1).to(torch.float32)
+        with torch.no_grad():
+            if self.quantization is None:
+                return self.float_fn(x, self.w1, self.tables1, self.w2, self.beta1, self.threshold1, self.beta2,
+                                     self.threshold2)
+            q = self.quantization
+            return self.fixed_fn(x, self.w1, self.tables1, self.w2, self.mem_min, self.mem_max,
+                                 int(q["leak_shift"]), float(q["Vthr"]), float(q["Vrst"]))
+
+    def spike_trains(self, x):
+        """
+        Spikes of every tick, run eagerly (the compiled graphs only return counts).
+
+        :param x: Input spikes as for spike_counts.
+        :return: (output spikes [num_steps, batch_size, outputs], hidden spikes [num_steps, batch_size, hidden]).
+        """
+        x = torch.as_tensor(x)[:self.num_steps].cpu()
+        if x.dtype != torch.uint8:
+            x = x.reshape(x.shape[0], x.shape[1], -1).to(torch.float32)
+        with torch.no_grad():
+            if self.quantization is None:
+                return float_network(x, self.w1, self.tables1, self.w2, self.beta1, self.threshold1, self.beta2,
+                                     self.threshold2)
+            q = self.quantization
+            return fixed_network(x, self.w1, self.tables1, self.w2, self.mem_min, self.mem_max,
+                                 int(q["leak_shift"]), float(q["Vthr"]), float(q["Vrst"]))
+
+    def predict(self, x):
+        """
+        :return: Predicted classes [batch_size].
+        """
+        counts, _ = self.spike_counts(x)
+        return torch.max(counts, 1)[1]
+
+    def score(self, dataset, batch_size=4096):
+        """
+        Accuracy over a spike dataset.
+
+        :param dataset: SpikeDataset (e.g. exported_spiking_input.spk).
+        :param batch_size: Samples per graph run.
+        :return: Accuracy in percent.
+        """
+        correct = 0
+        for start in range(0, len(dataset), batch_size):
+            records = dataset.records[start:start + batch_size]
+            packed = torch.from_numpy(records["spikes"].transpose(1, 0, 2).copy())
+            labels = torch.from_numpy(records["label"].astype("int64"))
+            correct += (self.predict(packed) == labels).sum().item()
+        return 100 * correct / len(dataset)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score an exported SNN on an exported spike dataset.")
+    parser.add_argument("--model", default="./exported_model.pth")
+    parser.add_argument("--spikes", default="./exported_spiking_input.spk")
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--backend", default="script", choices=["script", "compile", "eager"])
+    args = parser.parse_args()
+
+    engine = InferenceEngine.from_file(args.model, args.backend, args.threads)
+    dataset = SpikeDataset(args.spikes)
+    start_time = time.perf_counter()
+    accuracy = engine.score(dataset, args.batch_size)
+    elapsed = time.perf_counter() - start_time
+    print(f"Accuracy on {len(dataset)} samples: {accuracy:.2f}% "
+          f"({elapsed:.3f} s, {len(dataset) / elapsed:.0f} samples/s, {torch.get_num_threads()} threads)")
@@ -1,31 +1,18 @@
-import json
 import numpy as np
 import matplotlib.pyplot as plt
+from spike_dataset import SpikeDataset
 
-def load_spiking_input(file_path):
+def load_spiking_input(file_path, start=0, count=None):
     """
-    Load the spiking input data and labels from a JSON file.
-    :param file_path: Path to the JSON file containing the spiking input data and labels.
-    :return: Numpy array of the spiking input data and labels.
+    Load the spiking input data and labels from a spike dataset file.
+    :param file_path: Path to the spike dataset written by main.py.
+    :param start: Index of the first sample to load.
+    :param count: Number of samples to load, all remaining samples if None.
+    :return: Numpy array of the spiking input data [num_steps, count, 1, height, width] and labels.
     """
-    with open(file_path, 'r') as json_file:
-        data = json.load(json_file)
-
-    # Check the structure of the spiking_input field
-    spiking_input = data["spiking_input"]
-    labels = np.array(data["labels"])
-
-    # Ensure that spiking_input has a consistent shape
-    try:
-        spiking_input = np.array(spiking_input)
-    except ValueError as e:
-        print("Error converting spiking_input to NumPy array:", e)
-        print("Inspecting the structure of spiking_input...")
-        for i, item in enumerate(spiking_input):
-            print(f"Item {i} shape: {np.shape(item)}")
-        return None, None
-
-    return spiking_input, labels
+    dataset = SpikeDataset(file_path)
+    stop = len(dataset) if count is None else min(len(dataset), start + count)
+    return dataset.batch(start, stop), np.array(dataset.labels[start:stop])
 
 
 def visualize_spiking_input(spiking_input, labels, num_images=5):
@@ -94,7 +81,7 @@ def visualize_single_input(spiking_input, labels, index):
 
 
 # Example usage
-file_path = 'worked_exported_spiking_input.json'
-spiking_input, labels = load_spiking_input(file_path)
+file_path = 'exported_spiking_input.spk'
+spiking_input, labels = load_spiking_input(file_path, count=5)
 visualize_spiking_input(spiking_input, labels)
 visualize_single_input(spiking_input, labels, index=0)  # Visualize the spiking input at index 0
\ No newline at end of file
@@ -1,19 +1,27 @@
+import argparse
+import dataclasses
+import functools
+import json
+import signal
 import snntorch as snn
 import torch.nn as nn
 import torchvision
-import torchvision.transforms as transforms
 import torch.optim as optim
-from torch.utils.data import DataLoader, TensorDataset
-from scipy.ndimage import zoom
+from torch.utils.data import TensorDataset
 import numpy as np
 import torch
-import json
 import os
-import matplotlib.pyplot as plt
-
+from mnist_store import open_preprocessed_mnist, preprocess_batch, synthetic_mnist
+from spike_encoder import RateEncoder, count_spikes, make_encoder, unpack_spikes
+from spike_dataset import SpikeDatasetWriter
+from fused_lif import leaky_sequence, linear_inputs
+from qat import QatConfig, fake_quantize, quant_leaky_sequence
+from inference import InferenceEngine
+from activity_regularizer import ActivityRegularizer
+from pruning import apply_masks, prune_masks, sparsity_report
+import data_parallel
+from trainer import Trainer, EpochBatchSampler, make_loader, last_checkpoint_name
 
-# Device configuration
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 # Define image size
 x_size = 28
@@ -28,56 +36,33 @@ num_steps = 5  # Simulation time steps
 batch_size = 28 * 28  # 256
 learning_rate = 1e-3
 num_epochs = 10
-
-# Function to resize the image to the desired size
-def resize_image(image, target_size=(x_size, y_size)):
-    return zoom(image, (target_size[0] / image.shape[0], target_size[1] / image.shape[1]))
-
-# Function to apply soft thresholding
-def soft_thresholding(image, threshold):
-    return np.where(image > threshold, 1, 0)
-
-# Apply preprocessing to all images
-def preprocess_images(images, preprocess_fns, limit=None):
-    preprocessed_images = []
-    original_images = []
-    for i, image in enumerate(images):
-        original_image = image  # Keep the original for visualization
-        for fn in preprocess_fns:
-            image = fn(image)
-        preprocessed_images.append(image)
-        original_images.append(original_image)
-        if limit is not None and i + 1 >= limit:  # Limit to specified number of images
-            break
-    return np.array(preprocessed_images), np.array(original_images)
+threshold = 20
+spike_seed = 0  # test spikes use this seed, training epoch e uses spike_seed + 1 + e
+dataset_source = "mnist"  # "synthetic" on machines without the dataset
 
 # Load and preprocess MNIST dataset
-def load_and_preprocess_mnist(threshold=20, target_size=(x_size, y_size), visualize_count=5):
-    mnist_train = torchvision.datasets.MNIST(root='./data', train=True, download=True)
-    mnist_test = torchvision.datasets.MNIST(root='./data', train=False, download=True)
-
-    train_images = mnist_train.data.numpy()
-    train_labels = mnist_train.targets.numpy()
-    test_images = mnist_test.data.numpy()
-    test_labels = mnist_test.targets.numpy()
-
-    # Preprocess images for visualization (limited number)
-    train_images_processed_viz, original_images = preprocess_images(
-        train_images, [lambda x: resize_image(x, target_size), lambda x: soft_thresholding(x, threshold)],
-        limit=visualize_count)
-
-    # Display first 5 original and processed images
-    display_images(original_images, train_images_processed_viz)
-
-    # Process all images
-    train_images_processed = preprocess_images(train_images, [lambda x: resize_image(x, target_size),
-                                                              lambda x: soft_thresholding(x, threshold)])[0]
-    test_images_processed = \
-    preprocess_images(test_images, [lambda x: resize_image(x, target_size), lambda x: soft_thresholding(x, threshold)])[0]
-
-    # Convert processed images back to torch tensors
-    train_images_tensor = torch.tensor(train_images_processed, dtype=torch.int8).unsqueeze(1)
-    test_images_tensor = torch.tensor(test_images_processed, dtype=torch.int8).unsqueeze(1)
+def load_and_preprocess_mnist(threshold=threshold, target_size=(x_size, y_size), visualize_count=0,
+                              source=dataset_source):
+    """
+    :return: ((train images, train labels), (test images, test labels)), images are bit-packed
+             binarized uint8 tensors [N, ceil(height * width / 8)] (see mnist_store.pack_images).
+    """
+    # Binarized images come bit-packed from the preprocessing cache
+    (train_packed, train_labels), (test_packed, test_labels) = open_preprocessed_mnist(
+        target_size=target_size, threshold=threshold, source=source)
+
+    if visualize_count > 0:
+        # Display first original and processed images
+        if source == "synthetic":
+            original_images = synthetic_mnist(visualize_count)[0]
+        else:
+            original_images = torchvision.datasets.MNIST(root='./data', train=True, download=True).data.numpy()
+            original_images = original_images[:visualize_count]
+        display_images(original_images, preprocess_batch(original_images, target_size, threshold))
+
+    # Convert to torch tensors, images stay packed until a batch is encoded
+    train_images_tensor = torch.from_numpy(np.array(train_packed))
+    test_images_tensor = torch.from_numpy(np.array(test_packed))
     train_labels_tensor = torch.tensor(train_labels, dtype=torch.long)
     test_labels_tensor = torch.tensor(test_labels, dtype=torch.long)
 
@@ -85,8 +70,10 @@ def load_and_preprocess_mnist(threshold=20, target_size=(x_size, y_size), visual
 
 # Function to display first 5 original and processed images
 def display_images(originals, processed):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 4))
-    for i in range(5):
+    count = min(5, len(originals))
+    for i in range(count):
         # Original Image
         plt.subplot(2, 5, i + 1)
         plt.title(f"Original {i + 1}")
@@ -101,66 +88,36 @@ def display_images(originals, processed):
 
     plt.show()
 
-# Load the preprocessed data
-(train_images_processed, train_labels), (test_images_processed, test_labels) = load_and_preprocess_mnist()
-
-# Create DataLoader
-train_dataset = TensorDataset(train_images_processed, train_labels)
-test_dataset = TensorDataset(test_images_processed, test_labels)
-
-# Data Preprocessing and Loading
-transform = transforms.Compose([
-    transforms.ToTensor(),
-    transforms.Normalize((0.5,), (0.5,))
-])
-
-train_loader = torch.utils.data.DataLoader(dataset=train_dataset, batch_size=batch_size, shuffle=True)
-test_loader = torch.utils.data.DataLoader(dataset=test_dataset, batch_size=batch_size, shuffle=False)
-
-def rate_encoding(x, num_steps):
-    # Ensure x is of shape [batch_size, 1, 28, 28]
-    if x.dim() == 3:
-        x = x.unsqueeze(1)
-
-    # Adjust the input values to be within [0, 1]
-    x = (x + 1) / 2
-
-    # Repeat and sample spikes
-    return torch.bernoulli(x.repeat(num_steps, 1, 1, 1, 1))
-
-def export_spiking_input(spiking_input, labels, file_path):
+def rate_encoding(x, num_steps, sample_ids, seed=spike_seed):
     """
-    Exports the spiking_input tensor and labels to a JSON file.
+    Seeded rate encoding of a batch.
 
-    :param spiking_input: Spiking tensor fed into the model, dimensions [num_steps, batch_size, num_inputs].
-    :param labels: Tensor of labels for each example in the batch.
-    :param file_path: Path where the JSON file will be saved.
+    :param x: Binarized images [batch_size, 1, 28, 28] or [batch_size, num_inputs].
+    :param num_steps: Number of time steps.
+    :param sample_ids: Dataset indices of the images, select their spike trains.
+    :param seed: Encoder seed.
+    :return: Bit-packed spikes, uint8 tensor [num_steps, batch_size, ceil(num_inputs / 8)].
     """
-    # Convert spiking tensor to a list for JSON serialization
-    spiking_input_list = spiking_input.cpu().numpy().tolist()
-
-    # Convert labels to a list
-    labels_list = labels.cpu().numpy().tolist()
-
-    # Create data for export
-    export_data = {
-        "spiking_input": spiking_input_list,
-        "labels": labels_list
-    }
-
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-    # Save data to JSON file
-    with open(file_path, 'w') as json_file:
-        json.dump(export_data, json_file)
-
-    print(f"Spiking input and labels successfully exported to {file_path}")
+    return RateEncoder(num_steps, seed).encode(x, sample_ids)
 
 # Define the Network
 class SNN(nn.Module):
-    def __init__(self):
+    def __init__(self, num_inputs=num_inputs, num_hidden=num_hidden, num_outputs=num_outputs, beta=beta,
+                 num_steps=num_steps, fused=True, qat=None):
+        """
+        :param fused: Run each layer over all time steps at once (one matmul and one
+                      LeakySequence per layer) instead of the per step snntorch loop.
+        :param qat: QatConfig to train and evaluate with the core's fixed point datapath,
+                    None for the float model.
+        """
         super(SNN, self).__init__()
+        self.num_inputs = num_inputs
+        self.num_hidden = num_hidden
+        self.num_outputs = num_outputs
+        self.beta = beta
+        self.num_steps = num_steps
+        self.fused = fused
+        self.qat = qat
 
         # Define fully connected layers
         self.fc1 = nn.Linear(num_inputs, num_hidden, bias=False)
@@ -169,6 +126,16 @@ class SNN(nn.Module):
         self.lif2 = snn.Leaky(beta=beta, graded_spikes_factor=1)
 
     def forward(self, x):
+        """
+        :param x: Per time step inputs: tensor [num_steps, batch_size, ...] or iterable of
+                  frames, dense or bit-packed (uint8 [batch_size, ceil(num_inputs / 8)]).
+        :return: (output spikes, hidden spikes), [num_steps, batch_size, neurons].
+        """
+        if self.qat is not None:
+            return self.forward_qat(x)
+        if self.fused:
+            return self.forward_fused(x)
+
         # Initialize hidden states
         mem1 = self.lif1.init_leaky()
         mem2 = self.lif2.init_leaky()
@@ -177,8 +144,10 @@ class SNN(nn.Module):
         spk2_rec = []
 
         # Time loop
-        for step in range(num_steps):
-            cur1 = self.fc1(x[step].flatten(1))
+        for step, frame in zip(range(self.num_steps), x):
+            if frame.dtype == torch.uint8:
+                frame = unpack_spikes(frame, self.num_inputs)
+            cur1 = self.fc1(frame.flatten(1))
             spk1, mem1 = self.lif1(cur1, mem1)
             cur2 = self.fc2(spk1)
             spk2, mem2 = self.lif2(cur2, mem2)
@@ -188,16 +157,59 @@ class SNN(nn.Module):
 
         return torch.stack(spk2_rec), torch.stack(spk1_rec)
 
+    def stack_inputs(self, x):
+        """
+        :return: Inputs of all time steps, [num_steps, batch_size, num_inputs] or bit-packed
+                 [num_steps, batch_size, ceil(num_inputs / 8)]. Packed frames stay packed,
+                 the first layer reads them through fused_lif.PackedLinear.
+        """
+        frames = [frame.flatten(1) for step, frame in zip(range(self.num_steps), x)]
+        return torch.stack(frames)
+
+    def forward_fused(self, x):
+        """
+        Same result as the step loop: the input does not depend on the network state,
+        so each layer is computed for all time steps before the next one (currents of
+        packed frames may differ in the last float bits, they are summed per byte).
+        """
+        x = self.stack_inputs(x)
+        spk1, _ = leaky_sequence(linear_inputs(x, self.fc1.weight), self.lif1)
+        spk2, _ = leaky_sequence(self.fc2(spk1), self.lif2)
+        return spk2, spk1
+
+    def quantized_weights(self):
+        """
+        :return: (fc1, fc2) weights as the core stores them (fake-quantized, real units).
+        """
+        fmt = self.qat.weight_format
+        return fake_quantize(self.fc1.weight, fmt), fake_quantize(self.fc2.weight, fmt)
+
+    def forward_qat(self, x):
+        """
+        Fixed point forward (see qat.QatConfig): quantized weights, integer membrane,
+        leak as a right shift, fire on Vmemb >= Vthr, reset to Vrst.
+        """
+        x = self.stack_inputs(x)
+        w1, w2 = self.quantized_weights()
+        spk1, _ = quant_leaky_sequence(linear_inputs(x, w1), self.qat)
+        spk2, _ = quant_leaky_sequence(nn.functional.linear(spk1, w2), self.qat)
+        return spk2, spk1
+
     def export_model(self, file_path):
-        # Export model weights
+        # Export model weights, the values the core uses after quantization-aware training
+        state_dict = self.state_dict()
+        if self.qat is not None:
+            w1, w2 = self.quantized_weights()
+            state_dict["fc1.weight"] = w1.detach().clone()
+            state_dict["fc2.weight"] = w2.detach().clone()
         model_state = {
-            "model_state_dict": self.state_dict(),
+            "model_state_dict": state_dict,
             "model_topology": {
-                "input_size": num_inputs,
-                "hidden_size": num_hidden,
-                "output_size": num_outputs,
-                "num_steps": num_steps,
-                "beta": beta
+                "input_size": self.num_inputs,
+                "hidden_size": self.num_hidden,
+                "output_size": self.num_outputs,
+                "num_steps": self.num_steps,
+                "beta": self.beta
             },
             "LIF_neurons": {
                 "lif1": {
@@ -210,27 +222,27 @@ class SNN(nn.Module):
                 }
             }
         }
+        if self.qat is not None:
+            model_state["quantization"] = self.qat.describe()
 
         # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
 
         # Save model state
         torch.save(model_state, file_path)
 
         print(f"Model successfully exported to {file_path}")
 
-# Initialize the network
-net = SNN().to(device)
-
-# Loss and optimizer
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(net.parameters(), lr=learning_rate)
-
 def print_input_structure(spiking_input):
     """
     Function prints the structure and data of the input tensor for the SNN.
-    :param spiking_input: Spiking tensor fed into the model, dimensions [num_steps, batch_size, num_inputs].
+    :param spiking_input: Spiking tensor fed into the model, dimensions [num_steps, batch_size, 1, x_size, y_size]
+                          or bit-packed [num_steps, batch_size, packed bytes].
     """
+    if spiking_input.dtype == torch.uint8:
+        spiking_input = unpack_spikes(spiking_input, num_inputs).reshape(
+            spiking_input.shape[0], spiking_input.shape[1], 1, x_size, y_size)
+
     # Print the shape of the input tensor
     print(f"Input Tensor Shape: {spiking_input.shape}")
 
@@ -242,6 +254,7 @@ def print_input_structure(spiking_input):
     print(spiking_input[:, 0, :, :, :])  # Print all time steps for the first image in the batch
 
     # Visualize the first image of the first time step
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 4))
 
     plt.subplot(1, 2, 1)
@@ -254,52 +267,306 @@ def print_input_structure(spiking_input):
     print("Averaged Image Spikes:")
     print(averaged_input[0, :, :, :])  # Print averaged image for the first image in the batch
 
-# Training Loop
-for epoch in range(num_epochs):
-    for i, (images, labels) in enumerate(train_loader):
-        images = images.to(device)
-        labels = labels.to(device)
-
-        # Rate Encoding
-        spiking_input = rate_encoding(images, num_steps).to(device)
+@dataclasses.dataclass
+class TrainConfig:
+    """
+    Everything that defines a training run, defaults are the module hyperparameters.
+    """
+    num_hidden: int = num_hidden
+    beta: float = beta
+    num_steps: int = num_steps
+    fused_lif: bool = True  # fused time loop (fused_lif.py) instead of per step snntorch Leaky calls
+    qat: bool = False  # quantization-aware training with the core's fixed point datapath (qat.py)
+    weight_format: str = "2.14"  # QAT weight word, <int bits>.<frac bits>
+    mem_bits: int = 16  # QAT membrane (Vmemb) width
+    batch_size: int = batch_size
+    learning_rate: float = learning_rate
+    num_epochs: int = num_epochs
+    threshold: int = threshold
+    spike_seed: int = spike_seed
+    encoding: str = "rate"  # input spike encoder: rate, latency, burst, delta or delta_rate (spike_encoder.py)
+    burst_length: int = 2  # spikes per active input of the burst encoder
+    hidden_count_penalty: float = 0.0  # loss weight of lif1 spikes per inference, ~1e-4 (activity_regularizer.py)
+    output_count_penalty: float = 0.0  # loss weight of lif2 spikes per inference
+    hidden_rate_penalty: float = 0.0  # loss weight of the lif1 firing rate deviation from hidden_target_rate
+    hidden_target_rate: float = 0.05  # lif1 target spikes per tick
+    output_rate_penalty: float = 0.0  # loss weight of the lif2 firing rate deviation from output_target_rate
+    output_target_rate: float = 0.2  # lif2 target spikes per tick
+    init_model: str = ""  # exported model to start from, e.g. to fine-tune it after pruning
+    prune: str = "none"  # pruning of the initial weights: none, magnitude or structured (pruning.py)
+    sparsity: float = 0.0  # fraction of weights (magnitude) or presynaptic neurons (structured) removed per layer
+    prune_layers: str = "fc1,fc2"  # comma separated layers to prune
+    dataset_source: str = dataset_source
+    seed: int = 0  # weight initialization and shuffle order
+    device: str = "auto"
+    threads: int = 0  # intra-op threads per training process, 0: torch default, or cores / world_size
+    inference_backend: str = "script"  # evaluation engine: script, compile or eager (inference.py)
+    world_size: int = 1  # data-parallel training processes on this machine
+    num_workers: int = 0  # DataLoader workers per training process
+    pin_memory: bool = False
+    checkpoint_dir: str = "./checkpoints"
+    checkpoint_every: int = 100  # steps, checkpoints are also written at the end of every epoch
+    val_fraction: float = 0.1  # training samples held out (split by seed) to select the best checkpoint
+    eval_every: int = 1  # epochs between validation set evaluations that select the best checkpoint
+    resume: bool = True  # continue from <checkpoint_dir>/last.pt if it exists
+    spikes_path: str = "./exported_spiking_input.spk"
+    model_path: str = "./exported_model.pth"
+
+    # Fields a checkpoint must agree on to be resumed
+    resume_keys = ("num_hidden", "beta", "num_steps", "qat", "weight_format", "mem_bits", "batch_size",
+                   "learning_rate", "threshold", "spike_seed", "encoding", "burst_length", "hidden_count_penalty",
+                   "output_count_penalty", "hidden_rate_penalty", "hidden_target_rate", "output_rate_penalty",
+                   "output_target_rate", "init_model", "prune", "sparsity", "prune_layers", "val_fraction",
+                   "dataset_source", "seed")
+
+    def regularizer(self):
+        """
+        :return: ActivityRegularizer of the penalty fields, None if all are 0.
+        """
+        regularizer = ActivityRegularizer(self.hidden_count_penalty, self.output_count_penalty,
+                                          self.hidden_rate_penalty, self.hidden_target_rate,
+                                          self.output_rate_penalty, self.output_target_rate)
+        return regularizer if regularizer.enabled else None
+
+
+def parse_config(argv=None):
+    """
+    Builds a TrainConfig from defaults, an optional JSON file (--config) and command line options,
+    later sources take precedence.
 
-        # Forward pass
-        outputs, _ = net(spiking_input)
+    :param argv: Command line arguments, sys.argv[1:] if None.
+    :return: TrainConfig.
+    """
+    parser = argparse.ArgumentParser(description="Train the MNIST SNN and export it for the neuromorphic core.")
+    parser.add_argument("--config", help="JSON file with TrainConfig fields")
+    for field in dataclasses.fields(TrainConfig):
+        option = "--" + field.name.replace("_", "-")
+        if field.type in (bool, "bool"):
+            parser.add_argument(option, dest=field.name, action=argparse.BooleanOptionalAction, default=None)
+        else:
+            field_type = {"int": int, "float": float, "str": str}.get(field.type, field.type)
+            parser.add_argument(option, dest=field.name, type=field_type, default=None,
+                                help=f"default: {field.default}")
+    args = vars(parser.parse_args(argv))
+
+    values = {}
+    config_path = args.pop("config")
+    if config_path is not None:
+        with open(config_path, 'r') as config_file:
+            values.update(json.load(config_file))
+    values.update({name: value for name, value in args.items() if value is not None})
+    return TrainConfig(**values)
+
+
+def make_datasets(config):
+    """
+    The validation set is a random config.val_fraction of the training set
+    (the same for the same config.seed), used to select the best checkpoint,
+    so the test set is only scored once, on the exported model.
 
-        # Use the mean output over time for classification
-        outputs = outputs.mean(dim=0)
+    :return: (train dataset, validation dataset or None, test dataset) of (packed images, labels, sample ids),
+             sample ids select spike trains.
+    """
+    if not 0 <= config.val_fraction < 1:
+        raise ValueError(f"val_fraction must be in [0, 1), got {config.val_fraction}")
+    (train_images, train_labels), (test_images, test_labels) = load_and_preprocess_mnist(
+        threshold=config.threshold, source=config.dataset_source)
+    order = torch.randperm(len(train_labels), generator=torch.Generator().manual_seed(config.seed))
+    num_val = int(round(config.val_fraction * len(train_labels)))
+    val_ids, train_ids = torch.sort(order[:num_val])[0], torch.sort(order[num_val:])[0]
+    train_dataset = TensorDataset(train_images[train_ids], train_labels[train_ids], train_ids)
+    val_dataset = TensorDataset(train_images[val_ids], train_labels[val_ids], val_ids) if num_val else None
+    test_dataset = TensorDataset(test_images, test_labels, torch.arange(len(test_labels)))
+    return train_dataset, val_dataset, test_dataset
+
+
+def spike_loss(criterion, spike_seed=spike_seed, encoder=RateEncoder, regularizer=None):
+    """
+    Training objective: cross entropy of the mean output spikes over time,
+    plus the activity penalty of regularizer.
 
-        # Compute loss
-        loss = criterion(outputs, labels)
+    Training epoch e encodes its inputs with seed spike_seed + 1 + e, so every
+    epoch sees new spike trains and the test seed is never trained on.
 
-        # Backpropagation and optimization
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
+    :param criterion: Loss of (outputs, labels).
+    :param spike_seed: Test spike seed.
+    :param encoder: Function (num_steps, seed) -> spike_encoder.SpikeEncoder.
+    :param regularizer: ActivityRegularizer, optional.
+    :return: Function loss(model, batch, epoch) for Trainer.
+    """
+    def loss(model, batch, epoch):
+        images, labels, sample_ids = batch
+        images = unpack_spikes(images, model.num_inputs)
+        spike_encoder = encoder(model.num_steps, spike_seed + 1 + epoch)
 
-        if (i + 1) % 100 == 0:
-            print(f'Epoch [{epoch + 1}/{num_epochs}], Step [{i + 1}/{len(train_loader)}], Loss: {loss.item():.4f}')
+        # Spike encoding, frames are generated step by step during the forward pass
+        spiking_input = spike_encoder.frames(images, sample_ids)
 
-# Testing Loop
-net.eval()
-export_file_path = "exported_spiking_input.json"
-with torch.no_grad():
-    correct = 0
-    total = 0
-    for images, labels in test_loader:
-        images = images.to(device)
-        labels = labels.to(device)
+        # Forward pass, the mean output over time is used for classification
+        outputs, hidden = model(spiking_input)
+        loss_value = criterion(outputs.mean(dim=0), labels)
+        if regularizer is not None:
+            loss_value = loss_value + regularizer(hidden, outputs)
+        return loss_value
 
-        spiking_input = rate_encoding(images, num_steps).to(device)
-        export_spiking_input(spiking_input, labels, "./exported_spiking_input.json")
+    return loss
 
-        outputs, _ = net(spiking_input)
-        outputs = outputs.mean(dim=0)
 
-        _, predicted = torch.max(outputs.data, 1)
+def evaluate(net, loader, spike_seed=spike_seed, spike_writer=None, backend="script", encoder=RateEncoder,
+             activity=False):
+    """
+    Accuracy on the samples of a loader, computed by the inference engine on the current weights.
+
+    :param net: SNN.
+    :param loader: Loader of (packed images, labels, sample ids) batches.
+    :param spike_seed: Encoder seed of the evaluation spikes.
+    :param spike_writer: SpikeDatasetWriter receiving the encoded spikes, optional.
+    :param backend: Inference backend (see inference.InferenceEngine).
+    :param encoder: Function (num_steps, seed) -> spike_encoder.SpikeEncoder.
+    :param activity: Also return the spike events per inference.
+    :return: Accuracy in percent, or if activity a dict of "score" (accuracy) and the input,
+             hidden and output spikes and all "events" per inference.
+    """
+    engine = InferenceEngine.from_module(net, backend)
+    spike_encoder = encoder(net.num_steps, spike_seed)
+    correct = 0
+    total = 0
+    input_spikes = 0
+    hidden_spikes = 0
+    output_spikes = 0
+    for images, labels, sample_ids in loader:
+        images = unpack_spikes(images, net.num_inputs)
+
+        spiking_input = spike_encoder.encode(images, sample_ids)
+        if spike_writer is not None:
+            spike_writer.write_batch(spiking_input, labels, sample_ids)
+
+        output_counts, hidden_counts = engine.spike_counts(spiking_input)
+        predicted = torch.max(output_counts, 1)[1]
         total += labels.size(0)
-        correct += (predicted == labels).sum().item()
+        correct += (predicted == labels.to(predicted.device)).sum().item()
+        if activity:
+            input_spikes += count_spikes(spiking_input)
+            hidden_spikes += hidden_counts.sum().item()
+            output_spikes += output_counts.sum().item()
+    accuracy = 100 * correct / total
+    if not activity:
+        return accuracy
+    return {"score": accuracy, "events": (input_spikes + hidden_spikes + output_spikes) / total,
+            "input_spikes": input_spikes / total, "hidden_spikes": hidden_spikes / total,
+            "output_spikes": output_spikes / total}
+
+
+def train(rank, world_size, config):
+    """
+    Trains, evaluates and exports the model described by config.
 
-    print(f'Accuracy of the network on the 10000 test images: {100 * correct / total:.2f}%')
+    Runs in every data-parallel worker when world_size > 1, rank 0 then
+    evaluates and exports.
 
-net.export_model("./exported_model.pth")
\ No newline at end of file
+    :param rank: Index of this process among the data-parallel workers.
+    :param world_size: Number of data-parallel workers.
+    :param config: TrainConfig.
+    """
+    if config.device == "auto":
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    else:
+        device = torch.device(config.device)
+    if config.threads > 0:
+        torch.set_num_threads(config.threads)
+    # same seed on every rank gives the same initial weights
+    torch.manual_seed(config.seed)
+
+    # Load the preprocessed data
+    train_dataset, val_dataset, test_dataset = make_datasets(config)
+    test_loader = make_loader(test_dataset, EpochBatchSampler(len(test_dataset), config.batch_size, shuffle=False),
+                              config.num_workers, config.pin_memory)
+
+    # Initialize the network, loss and optimizer
+    qat = QatConfig.from_float(config.weight_format, config.mem_bits, config.beta) if config.qat else None
+    net = SNN(num_hidden=config.num_hidden, beta=config.beta, num_steps=config.num_steps,
+              fused=config.fused_lif, qat=qat).to(device)
+    if config.init_model:
+        net.load_state_dict(torch.load(config.init_model, map_location=device, weights_only=False)["model_state_dict"])
+    masks = prune_masks(net, config.prune, config.sparsity, config.prune_layers.split(","))
+    apply_masks(net, masks)
+    if masks and (rank == 0):
+        print(f"Pruned ({config.prune}): {sparsity_report(net)}")
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(net.parameters(), lr=config.learning_rate)
+    encoder = functools.partial(make_encoder, config.encoding, burst_length=config.burst_length)
+
+    # the validation set selects the best checkpoint, the test set is scored once after training
+    validate = None
+    if val_dataset is not None:
+        val_loader = make_loader(val_dataset, EpochBatchSampler(len(val_dataset), config.batch_size, shuffle=False),
+                                 config.num_workers, config.pin_memory)
+
+        def validate(model):
+            return evaluate(model, val_loader, config.spike_seed, backend=config.inference_backend, encoder=encoder,
+                            activity=True)
+
+    trainer = Trainer(net, optimizer, spike_loss(criterion, config.spike_seed, encoder, config.regularizer()),
+                      train_dataset,
+                      config.checkpoint_dir, config.num_epochs, config.batch_size, seed=config.seed,
+                      evaluate=validate,
+                      eval_every=config.eval_every, checkpoint_every=config.checkpoint_every,
+                      num_workers=config.num_workers, pin_memory=config.pin_memory, device=device,
+                      config=dataclasses.asdict(config))
+
+    if config.resume and os.path.exists(trainer.last_checkpoint):
+        saved = torch.load(trainer.last_checkpoint, map_location="cpu", weights_only=False)["config"]
+        changed = [key for key in TrainConfig.resume_keys if saved.get(key) != getattr(config, key)]
+        if changed:
+            raise ValueError(f"{trainer.last_checkpoint} was trained with different {', '.join(changed)}, "
+                             f"use --no-resume or another --checkpoint-dir")
+        trainer.load_checkpoint(trainer.last_checkpoint)
+
+    # Training Loop
+    if not trainer.fit():
+        if rank == 0:
+            print("Training interrupted, run again with the same options to resume")
+        return trainer.stop_signal
+    if rank != 0:
+        return None
+
+    # Testing Loop on the best checkpoint
+    best_score = trainer.load_best()
+    if best_score is not None:
+        print(f"Best checkpoint: epoch {trainer.best_epoch}, validation accuracy {best_score:.2f}%")
+    spike_metadata = {"x_size": x_size, "y_size": y_size, "seed": config.spike_seed, "threshold": config.threshold,
+                      "source": config.dataset_source, "split": "test",
+                      "encoding": config.encoding, "burst_length": config.burst_length}
+    with SpikeDatasetWriter(config.spikes_path, net.num_inputs, net.num_steps, spike_metadata) as spike_writer:
+        result = evaluate(net, test_loader, config.spike_seed, spike_writer, config.inference_backend, encoder,
+                          activity=True)
+    print(f"Accuracy of the network on the {len(test_dataset)} test images: {result['score']:.2f}% "
+          f"with {result['events']:.1f} spike events per inference (input {result['input_spikes']:.1f}, "
+          f"hidden {result['hidden_spikes']:.1f}, output {result['output_spikes']:.1f})")
+    print(f"Spiking input and labels of {spike_writer.num_samples} samples exported to {config.spikes_path}")
+
+    if masks:
+        print(f"Sparsity after fine-tuning: {sparsity_report(net)}")
+    net.export_model(config.model_path)
+    return None
+
+
+def main(argv=None):
+    config = parse_config(argv)
+    if config.world_size > 1:
+        # build the preprocessing cache once, before the workers open it
+        make_datasets(config)
+        stop_signal = data_parallel.launch(train, config.world_size, (config,), threads=config.threads)
+        last_checkpoint = os.path.join(config.checkpoint_dir, last_checkpoint_name)
+        if (stop_signal is None) and os.path.exists(last_checkpoint):
+            # a worker may have been signalled alone
+            if torch.load(last_checkpoint, map_location="cpu", weights_only=False)["epoch"] < config.num_epochs:
+                stop_signal = signal.SIGTERM
+    else:
+        stop_signal = train(0, 1, config)
+    if stop_signal is not None:
+        raise SystemExit(128 + stop_signal)
+
+
+if __name__ == "__main__":
+    main()
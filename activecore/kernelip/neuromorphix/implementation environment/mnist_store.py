@@ -0,0 +1,173 @@
+import os
+import numpy as np
+from scipy.ndimage import zoom
+
+# Source image size
+mnist_size = (28, 28)
+
+# Digit strokes for synthetic images: segments a..g of a seven-segment display
+# as (row0, col0, row1, col1) in a 28x28 frame
+_segments = {
+    "a": (5, 9, 5, 19),
+    "b": (5, 19, 14, 19),
+    "c": (14, 19, 23, 19),
+    "d": (23, 9, 23, 19),
+    "e": (14, 9, 23, 9),
+    "f": (5, 9, 14, 9),
+    "g": (14, 9, 14, 19),
+}
+_digit_segments = ["abcdef", "bc", "abged", "abgcd", "fgbc", "afgcd", "afgedc", "abc", "abcdefg", "abcdfg"]
+
+
+def _zoom_matrix(in_size, out_size):
+    # scipy zoom is separable: resizing one axis is a linear map, recover it
+    # by zooming unit vectors
+    return np.stack([zoom(e, out_size / in_size) for e in np.eye(in_size)], axis=1)
+
+
+def preprocess_batch(images, target_size=mnist_size, threshold=20, chunk_size=4096):
+    """
+    Resizes and binarizes a whole stack of images.
+
+    Same result as viewer_mnist.resize_image followed by soft_thresholding for every image,
+    but the resize is applied to a chunk of images at once as two matrix
+    products (rows, then columns) instead of one scipy call per image.
+
+    :param images: uint8 array [N, height, width].
+    :param target_size: (height, width) after resizing.
+    :param threshold: Pixels brighter than threshold become 1.
+    :param chunk_size: Images processed at once, bounds temporary memory.
+    :return: uint8 array [N, target height, target width] of 0/1.
+    """
+    images = np.asarray(images)
+    resize = (images.shape[1], images.shape[2]) != tuple(target_size)
+    if resize:
+        zoom_rows = _zoom_matrix(images.shape[1], target_size[0])
+        zoom_cols = _zoom_matrix(images.shape[2], target_size[1])
+    result = np.empty((images.shape[0], target_size[0], target_size[1]), dtype=np.uint8)
+    for start in range(0, images.shape[0], chunk_size):
+        chunk = images[start:start + chunk_size]
+        if resize:
+            chunk = np.einsum("hi,nij,wj->nhw", zoom_rows, chunk.astype(np.float64), zoom_cols, optimize=True)
+            # zoom rounds and clips to the integer type of its input
+            chunk = np.clip(np.rint(chunk), 0, np.iinfo(images.dtype).max)
+        result[start:start + chunk_size] = chunk > threshold
+    return result
+
+
+def pack_images(binary_images):
+    """
+    Bit-packs binary images, one row of bytes per image.
+
+    :param binary_images: 0/1 array [N, height, width].
+    :return: uint8 array [N, ceil(height * width / 8)].
+    """
+    binary_images = np.asarray(binary_images)
+    return np.packbits(binary_images.reshape(binary_images.shape[0], -1).astype(np.uint8), axis=1)
+
+
+def unpack_images(packed_images, target_size=mnist_size):
+    """
+    Inverse of pack_images.
+
+    :param packed_images: uint8 array [N, packed bytes].
+    :param target_size: (height, width) of images.
+    :return: uint8 array [N, height, width] of 0/1.
+    """
+    num_pixels = target_size[0] * target_size[1]
+    pixels = np.unpackbits(np.asarray(packed_images), axis=1, count=num_pixels)
+    return pixels.reshape(-1, target_size[0], target_size[1])
+
+
+def synthetic_mnist(num_samples, seed=0, chunk_size=4096):
+    """
+    Generates MNIST-shaped digit images for machines without the dataset.
+
+    Digits are drawn as seven-segment glyphs with random shift, stroke width,
+    slant, brightness and background noise, so a network can learn them.
+
+    :param num_samples: Number of images.
+    :param seed: Random seed, the same seed gives the same images.
+    :param chunk_size: Images rendered at once, bounds temporary memory.
+    :return: (images uint8 [N, 28, 28], labels int64 [N]).
+    """
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, 10, size=num_samples)
+    shift_r = rng.uniform(-3, 3, size=num_samples).astype(np.float32)
+    shift_c = rng.uniform(-4, 4, size=num_samples).astype(np.float32)
+    slant = rng.uniform(-0.25, 0.25, size=num_samples).astype(np.float32)
+    width = rng.uniform(1.0, 2.2, size=num_samples).astype(np.float32)
+    brightness = rng.uniform(160, 255, size=num_samples).astype(np.float32)
+    segment_on = np.array([[name in segments for name in _segments] for segments in _digit_segments])
+
+    rows = np.arange(mnist_size[0], dtype=np.float32)[None, :, None]
+    cols = np.arange(mnist_size[1], dtype=np.float32)[None, None, :]
+    images = np.empty((num_samples, mnist_size[0], mnist_size[1]), dtype=np.uint8)
+    for start in range(0, num_samples, chunk_size):
+        part = slice(start, start + chunk_size)
+        # sample coordinates in glyph space
+        r = rows - shift_r[part, None, None]
+        c = cols - shift_c[part, None, None] - slant[part, None, None] * (r - 14)
+        glyphs = np.zeros((r.shape[0], mnist_size[0], mnist_size[1]), dtype=np.float32)
+        for k, (r0, c0, r1, c1) in enumerate(_segments.values()):
+            # distance to segment
+            dr, dc = r1 - r0, c1 - c0
+            t = np.clip(((r - r0) * dr + (c - c0) * dc) / float(dr * dr + dc * dc), 0, 1)
+            dist = np.sqrt((r - r0 - t * dr) ** 2 + (c - c0 - t * dc) ** 2)
+            stroke = np.clip(width[part, None, None] + 0.5 - dist, 0, 1)
+            on = segment_on[labels[part], k][:, None, None]
+            glyphs = np.maximum(glyphs, np.where(on, stroke, 0))
+        glyphs = glyphs * brightness[part, None, None] + rng.normal(0, 8, size=glyphs.shape).astype(np.float32)
+        images[part] = np.clip(glyphs, 0, 255)
+    return images, labels.astype(np.int64)
+
+
+def _load_source(source, root):
+    if source == "mnist":
+        import torchvision
+        mnist_train = torchvision.datasets.MNIST(root=root, train=True, download=True)
+        mnist_test = torchvision.datasets.MNIST(root=root, train=False, download=True)
+        return ((mnist_train.data.numpy(), mnist_train.targets.numpy()),
+                (mnist_test.data.numpy(), mnist_test.targets.numpy()))
+    if source == "synthetic":
+        return synthetic_mnist(60000, seed=0), synthetic_mnist(10000, seed=1)
+    raise ValueError(f"Unknown dataset source: {source}")
+
+
+def _save_atomic(file_path, array):
+    tmp_path = file_path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, file_path)
+
+
+def open_preprocessed_mnist(target_size=mnist_size, threshold=20, source="mnist", root="./data", cache_dir=None):
+    """
+    Opens bit-packed, binarized MNIST from the cache, building it on first use.
+
+    Cache files are keyed by source, target size and threshold and opened as
+    read-only memory maps, so repeated runs skip decoding and preprocessing.
+
+    :param target_size: (height, width) after resizing.
+    :param threshold: Binarization threshold.
+    :param source: "mnist" (torchvision download) or "synthetic" (offline generator).
+    :param root: Dataset directory.
+    :param cache_dir: Cache directory, default is <root>/preprocessed.
+    :return: ((train packed, train labels), (test packed, test labels)).
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(root, "preprocessed")
+    key = f"{source}_{target_size[0]}x{target_size[1]}_t{threshold}"
+    splits = ["train", "test"]
+    paths = {split: (os.path.join(cache_dir, f"{key}_{split}_images.npy"),
+                     os.path.join(cache_dir, f"{key}_{split}_labels.npy")) for split in splits}
+
+    if not all(os.path.exists(p) for pair in paths.values() for p in pair):
+        os.makedirs(cache_dir, exist_ok=True)
+        print(f"Building preprocessed dataset cache {key} in {cache_dir}")
+        for split, (images, labels) in zip(splits, _load_source(source, root)):
+            image_path, label_path = paths[split]
+            _save_atomic(label_path, np.asarray(labels, dtype=np.int64))
+            _save_atomic(image_path, pack_images(preprocess_batch(images, target_size, threshold)))
+
+    return tuple((np.load(paths[split][0], mmap_mode="r"), np.load(paths[split][1], mmap_mode="r"))
+                 for split in splits)
@@ -0,0 +1,90 @@
+import torch
+
+# Pruning methods accepted by prune_masks (TrainConfig.prune)
+prune_methods = ("none", "magnitude", "structured")
+
+
+def magnitude_mask(weight, sparsity):
+    """
+    Unstructured magnitude pruning of one layer.
+
+    :param weight: Weights [postsyn, presyn].
+    :param sparsity: Fraction of weights to remove, the smallest by magnitude.
+    :return: Bool mask of the kept weights.
+    """
+    num_pruned = int(round(sparsity * weight.numel()))
+    if num_pruned == 0:
+        return torch.ones_like(weight, dtype=torch.bool)
+    # rank instead of thresholding, so ties do not prune more than asked
+    order = torch.argsort(weight.detach().abs().flatten(), stable=True)
+    mask = torch.ones(weight.numel(), dtype=torch.bool, device=weight.device)
+    mask[order[:num_pruned]] = False
+    return mask.reshape(weight.shape)
+
+
+def structured_mask(weight, sparsity):
+    """
+    Structured pruning of whole presynaptic neurons: the columns with the
+    smallest L2 norm are removed, so their weight memory rows (and the input
+    spikes they would cost) disappear, see export_adjacency.export_structured.
+
+    :param weight: Weights [postsyn, presyn].
+    :param sparsity: Fraction of presynaptic neurons to remove.
+    :return: Bool mask of the kept weights.
+    """
+    num_pruned = int(round(sparsity * weight.shape[1]))
+    keep = torch.ones(weight.shape[1], dtype=torch.bool, device=weight.device)
+    if num_pruned > 0:
+        order = torch.argsort(weight.detach().norm(dim=0), stable=True)
+        keep[order[:num_pruned]] = False
+    return keep.unsqueeze(0).expand_as(weight).clone()
+
+
+def prune_masks(net, method, sparsity, layers=("fc1", "fc2")):
+    """
+    :param net: SNN.
+    :param method: One of prune_methods.
+    :param sparsity: Fraction to remove per layer, in [0, 1).
+    :param layers: Names of the nn.Linear layers to prune.
+    :return: Dict of layer name -> bool mask of the kept weights, empty for "none".
+    """
+    if method not in prune_methods:
+        raise ValueError(f"Unknown pruning method: {method}, expected one of {', '.join(prune_methods)}")
+    if not 0 <= sparsity < 1:
+        raise ValueError(f"sparsity must be in [0, 1), got {sparsity}")
+    if method == "none":
+        return {}
+    mask_fn = magnitude_mask if method == "magnitude" else structured_mask
+    return {name: mask_fn(getattr(net, name).weight, sparsity) for name in layers}
+
+
+def apply_masks(net, masks):
+    """
+    Zeroes the pruned weights and keeps them at zero during fine-tuning:
+    their gradients are masked, so an optimizer created afterwards (Adam,
+    SGD without weight decay) never moves them.
+
+    :param net: SNN.
+    :param masks: prune_masks result.
+    :return: Hook handles, remove() them to stop masking.
+    """
+    handles = []
+    for name, mask in masks.items():
+        weight = getattr(net, name).weight
+        with torch.no_grad():
+            weight.mul_(mask)
+        handles.append(weight.register_hook(lambda grad, mask=mask: grad * mask))
+    return handles
+
+
+def sparsity_report(net, layers=("fc1", "fc2")):
+    """
+    :return: Text line of the zero weight fraction and the presynaptic neurons left per layer.
+    """
+    parts = []
+    for name in layers:
+        weight = getattr(net, name).weight.detach()
+        zeros = (weight == 0).double().mean().item()
+        live_presyn = int((weight != 0).any(0).sum())
+        parts.append(f"{name}: {100 * zeros:.1f}% zero weights, {live_presyn}/{weight.shape[1]} presynaptic neurons")
+    return ", ".join(parts)
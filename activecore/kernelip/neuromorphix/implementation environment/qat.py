@@ -0,0 +1,167 @@
+import dataclasses
+import math
+import torch
+
+from fused_lif import atan_alpha
+
+
+@dataclasses.dataclass(frozen=True)
+class FixedPointFormat:
+    """
+    Signed two's complement fixed point number with int_bits integer bits
+    (sign included) and frac_bits fractional bits, "2.14" in short.
+    """
+    int_bits: int
+    frac_bits: int
+
+    @classmethod
+    def parse(cls, text):
+        """
+        :param text: Format as "<int bits>.<frac bits>", e.g. "2.14".
+        """
+        int_bits, frac_bits = (int(part) for part in text.split("."))
+        return cls(int_bits, frac_bits)
+
+    def __str__(self):
+        return f"{self.int_bits}.{self.frac_bits}"
+
+    @property
+    def total_bits(self):
+        return self.int_bits + self.frac_bits
+
+    @property
+    def scale(self):
+        return 2 ** self.frac_bits
+
+    @property
+    def min_int(self):
+        return -2 ** (self.total_bits - 1)
+
+    @property
+    def max_int(self):
+        return 2 ** (self.total_bits - 1) - 1
+
+
+def round_ste(x):
+    # round half to even (as Python round in the weight exporters), gradient passes straight through
+    return x + (torch.round(x) - x).detach()
+
+
+def floor_ste(x):
+    return x + (torch.floor(x) - x).detach()
+
+
+def fake_quantize(x, fmt):
+    """
+    Rounds to the nearest value of a fixed point format, saturating at its range.
+
+    :param x: Float tensor.
+    :param fmt: FixedPointFormat.
+    :return: Float tensor of representable values, straight-through gradient inside the range.
+    """
+    return torch.clamp(round_ste(x * fmt.scale), fmt.min_int, fmt.max_int) / fmt.scale
+
+
+def spike_ge(x, alpha=atan_alpha):
+    """
+    Heaviside step x >= 0 (the core fires when Vmemb >= Vthr) with the ATan surrogate gradient.
+    """
+    surrogate = torch.atan(math.pi / 2 * alpha * x) / math.pi
+    return (x >= 0).to(x.dtype) + (surrogate - surrogate.detach())
+
+
+@dataclasses.dataclass
+class QatConfig:
+    """
+    Fixed point datapath of the neuromorphic core for quantization-aware training.
+
+    Weights are words of weight_format. The membrane potential Vmemb is a
+    mem_bits wide integer in units of the weight LSB, so a weight is added
+    to it as is. Per tick the core adds the weights of all input spikes,
+    shifts Vmemb right by leak_shift (the NeurOpKind.SHR neuron phase with
+    the leakage register, see src/LayoutPlan.kt), fires when Vmemb >= Vthr
+    and then sets Vmemb to Vrst.
+
+    The threshold must stay reachable after the shift, the largest Vmemb is
+    max_int >> leak_shift.
+    """
+    weight_format: FixedPointFormat = FixedPointFormat(2, 14)
+    mem_bits: int = 16
+    leak_shift: int = 1
+    threshold: float = 1.0
+    reset: float = 0.0
+
+    def __post_init__(self):
+        max_vmemb = self.mem_format.max_int >> self.leak_shift
+        if self.vthr > max_vmemb:
+            raise ValueError(f"Vthr {self.vthr} is above the largest Vmemb {max_vmemb} after a shift by "
+                             f"{self.leak_shift} with {self.mem_bits} bit membrane and {self.weight_format} weights, "
+                             f"use fewer fractional bits or a wider membrane")
+
+    @classmethod
+    def from_float(cls, weight_format="2.14", mem_bits=16, beta=0.5, threshold=1.0, reset=0.0):
+        """
+        Datapath closest to a float LIF neuron.
+
+        beta becomes the shift with 2^-shift nearest to it. The core shifts
+        after adding the input, so the threshold is scaled by 2^-shift too:
+        a neuron at rest then fires on the same input current as the float one.
+
+        :param weight_format: FixedPointFormat or its "int.frac" text.
+        """
+        if isinstance(weight_format, str):
+            weight_format = FixedPointFormat.parse(weight_format)
+        if not 0 < beta <= 1:
+            raise ValueError(f"beta {beta} cannot be modelled as a right shift")
+        leak_shift = round(-math.log2(beta))
+        return cls(weight_format, mem_bits, leak_shift, threshold / 2 ** leak_shift, reset)
+
+    @property
+    def mem_format(self):
+        return FixedPointFormat(self.mem_bits - self.weight_format.frac_bits, self.weight_format.frac_bits)
+
+    @property
+    def vthr(self):
+        """
+        Vthr register value (integer, weight LSB units).
+        """
+        return int(round(self.threshold * self.weight_format.scale))
+
+    @property
+    def vrst(self):
+        """
+        Vrst register value (integer, weight LSB units).
+        """
+        return int(round(self.reset * self.weight_format.scale))
+
+    def describe(self):
+        return {"weight_format": str(self.weight_format), "mem_bits": self.mem_bits, "leak_shift": self.leak_shift,
+                "Vthr": self.vthr, "Vrst": self.vrst}
+
+
+def quant_leaky_sequence(cur, qat):
+    """
+    Fixed point LIF layer over all time steps.
+
+    :param cur: Input currents [num_steps, batch_size, neurons], sums of fake-quantized
+                weights, i.e. multiples of the weight LSB.
+    :param qat: QatConfig.
+    :return: (spikes, membrane in real units), both [num_steps, batch_size, neurons].
+    """
+    fmt = qat.mem_format
+    cur = round_ste(cur * fmt.scale)  # exact, removes float noise of the matmul
+    mem = torch.zeros_like(cur[0])
+    spk_rec = []
+    mem_rec = []
+    for step in range(cur.shape[0]):
+        # synaptic phase, saturating adder
+        mem = torch.clamp(mem + cur[step], fmt.min_int, fmt.max_int)
+        # leak as arithmetic right shift
+        mem = floor_ste(mem / 2 ** qat.leak_shift)
+        spk = spike_ge((mem - qat.vthr) / fmt.scale)
+        # reset to Vrst, no gradient through the reset decision
+        fired = spk.detach()
+        mem = mem * (1 - fired) + qat.vrst * fired
+        spk_rec.append(spk)
+        mem_rec.append(mem)
+    return torch.stack(spk_rec), torch.stack(mem_rec) / fmt.scale
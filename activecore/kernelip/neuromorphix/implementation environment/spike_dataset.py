@@ -0,0 +1,172 @@
+import json
+import os
+import struct
+import numpy as np
+
+# File layout (little-endian):
+#   header: magic, header_size, version, num_inputs, num_steps, frame_bytes, record_bytes,
+#           then metadata as UTF-8 JSON, zero-padded to header_size (multiple of 16)
+#   records, one per sample, appended in order:
+#           label int32, sample_id int32, num_steps bit-packed frames of frame_bytes each
+# Records have a fixed stride, so frame (sample, step) is found by arithmetic
+# (see SpikeDataset.frame_offset), and a record cut off by an interrupted
+# write is ignored by the reader.
+SPIKE_DATASET_MAGIC = b"NMXSPIKE"
+SPIKE_DATASET_VERSION = 1
+_header_format = "<8sIIIIII"
+_record_head_bytes = 8
+
+
+def _record_dtype(num_steps, frame_bytes):
+    return np.dtype([("label", "<i4"), ("sample_id", "<i4"), ("spikes", "u1", (num_steps, frame_bytes))])
+
+
+def _to_numpy(x):
+    if hasattr(x, "detach"):
+        x = x.detach().cpu().numpy()
+    return np.asarray(x)
+
+
+class SpikeDatasetWriter:
+    """
+    Append-only writer of bit-packed spike datasets.
+    """
+
+    def __init__(self, file_path, num_inputs, num_steps, metadata=None, append=False):
+        """
+        :param file_path: Dataset file.
+        :param num_inputs: Inputs per frame.
+        :param num_steps: Frames per sample.
+        :param metadata: JSON-serializable dict stored in the header (image shape, seed, ...).
+        :param append: Continue an existing file with the same geometry instead of overwriting it.
+        """
+        self.num_inputs = num_inputs
+        self.num_steps = num_steps
+        self.frame_bytes = (num_inputs + 7) // 8
+        self.record_dtype = _record_dtype(num_steps, self.frame_bytes)
+
+        if append and os.path.exists(file_path):
+            existing = SpikeDataset(file_path)
+            if (existing.num_inputs, existing.num_steps) != (num_inputs, num_steps):
+                raise ValueError(f"{file_path} holds {existing.num_steps} x {existing.num_inputs} spikes per sample, "
+                                 f"not {num_steps} x {num_inputs}")
+            self.num_samples = len(existing)
+            end = existing.header_size + self.num_samples * self.record_dtype.itemsize
+            del existing
+            self.file = open(file_path, "r+b")
+            # drop a partially written record
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            meta = json.dumps(metadata or {}).encode("utf-8")
+            header_size = struct.calcsize(_header_format) + len(meta)
+            header_size = (header_size + 15) // 16 * 16
+            header = struct.pack(_header_format, SPIKE_DATASET_MAGIC, header_size, SPIKE_DATASET_VERSION,
+                                 num_inputs, num_steps, self.frame_bytes, self.record_dtype.itemsize)
+            self.num_samples = 0
+            self.file = open(file_path, "wb")
+            self.file.write((header + meta).ljust(header_size, b"\0"))
+
+    def write_batch(self, spikes, labels, sample_ids):
+        """
+        Appends a batch of samples.
+
+        :param spikes: Bit-packed spikes [num_steps, batch_size, frame bytes] (as produced by spike_encoder.SpikeEncoder).
+        :param labels: Labels [batch_size].
+        :param sample_ids: Dataset indices [batch_size].
+        """
+        spikes = _to_numpy(spikes)
+        records = np.empty(spikes.shape[1], dtype=self.record_dtype)
+        records["label"] = _to_numpy(labels)
+        records["sample_id"] = _to_numpy(sample_ids)
+        records["spikes"] = spikes.transpose(1, 0, 2)
+        self.file.write(records.tobytes())
+        self.num_samples += len(records)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SpikeDataset:
+    """
+    Memory-mapped random-access reader of spike datasets.
+    """
+
+    def __init__(self, file_path):
+        """
+        :param file_path: Dataset file written by SpikeDatasetWriter.
+        """
+        with open(file_path, "rb") as f:
+            fixed = f.read(struct.calcsize(_header_format))
+            magic, self.header_size, version, self.num_inputs, self.num_steps, self.frame_bytes, record_bytes = \
+                struct.unpack(_header_format, fixed)
+            if magic != SPIKE_DATASET_MAGIC:
+                raise ValueError(f"{file_path} is not a spike dataset")
+            if version != SPIKE_DATASET_VERSION:
+                raise ValueError(f"{file_path}: unsupported spike dataset version {version}")
+            meta = f.read(self.header_size - len(fixed)).rstrip(b"\0")
+        self.metadata = json.loads(meta.decode("utf-8")) if meta else {}
+        dtype = _record_dtype(self.num_steps, self.frame_bytes)
+        if dtype.itemsize != record_bytes:
+            raise ValueError(f"{file_path}: record size mismatch")
+
+        num_samples = (os.path.getsize(file_path) - self.header_size) // record_bytes
+        if num_samples > 0:
+            self.records = np.memmap(file_path, dtype=dtype, mode="r", offset=self.header_size, shape=(num_samples,))
+        else:
+            self.records = np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def labels(self):
+        return self.records["label"]
+
+    @property
+    def sample_ids(self):
+        return self.records["sample_id"]
+
+    @property
+    def image_shape(self):
+        """
+        Frame shape from metadata, (1, x_size, y_size) if known, (num_inputs,) otherwise.
+        """
+        if "x_size" in self.metadata and "y_size" in self.metadata:
+            return (1, self.metadata["x_size"], self.metadata["y_size"])
+        return (self.num_inputs,)
+
+    def frame_offset(self, sample_idx, step):
+        """
+        Byte offset of a packed frame in the file.
+        """
+        return (self.header_size + sample_idx * self.records.dtype.itemsize + _record_head_bytes
+                + step * self.frame_bytes)
+
+    def packed(self, sample_idx):
+        """
+        Bit-packed frames of one sample, uint8 [num_steps, frame bytes].
+        """
+        return self.records["spikes"][sample_idx]
+
+    def sample(self, sample_idx):
+        """
+        Spikes of one sample, uint8 [num_steps, *image_shape].
+        """
+        spikes = np.unpackbits(self.packed(sample_idx), axis=-1, count=self.num_inputs)
+        return spikes.reshape((self.num_steps,) + self.image_shape)
+
+    def batch(self, start, stop):
+        """
+        Spikes of a range of samples in the layout of the former JSON export,
+        uint8 [num_steps, stop - start, *image_shape].
+        """
+        spikes = np.unpackbits(self.records["spikes"][start:stop], axis=-1, count=self.num_inputs)
+        return spikes.transpose(1, 0, 2).reshape((self.num_steps, spikes.shape[0]) + self.image_shape)
@@ -0,0 +1,268 @@
+import numpy as np
+import torch
+
+# Bit weights of a packed byte, first input is the most significant bit (np.packbits order)
+_bit_shifts = torch.arange(7, -1, -1, dtype=torch.uint8)
+# Set bits of every byte value
+_byte_popcount = torch.tensor([bin(value).count("1") for value in range(256)], dtype=torch.int64)
+
+
+def _hash32(x):
+    # lowbias32 integer hash (C. Wellons), uint32 in, uint32 out
+    x = x ^ (x >> np.uint32(16))
+    x = x * np.uint32(0x7feb352d)
+    x = x ^ (x >> np.uint32(15))
+    x = x * np.uint32(0x846ca68b)
+    x = x ^ (x >> np.uint32(16))
+    return x
+
+
+def spike_uniforms(seed, sample_ids, step, num_inputs):
+    """
+    Counter-based random numbers behind every spike.
+
+    Value for (seed, sample, step, input) does not depend on batch composition
+    or order, so any spike can be regenerated alone, e.g. on the hardware side.
+
+    :param seed: Encoder seed.
+    :param sample_ids: Dataset indices of samples in the batch.
+    :param step: Time step.
+    :param num_inputs: Number of inputs per sample.
+    :return: uint32 array [batch, num_inputs].
+    """
+    with np.errstate(over="ignore"):
+        sample_ids = np.asarray(sample_ids, dtype=np.uint32)
+        sample_keys = _hash32(sample_ids * np.uint32(0x9e3779b9) + _hash32(np.uint32(seed)))
+        step_key = _hash32(np.uint32(step) + np.uint32(0x632be5ab))
+        input_keys = _hash32(np.arange(num_inputs, dtype=np.uint32) + np.uint32(0x85157af5))
+        return _hash32(sample_keys[:, None] ^ input_keys[None, :] ^ step_key)
+
+
+def pack_spikes(spikes):
+    """
+    Bit-packs binary spikes along the last axis.
+
+    :param spikes: 0/1 tensor [..., num_inputs].
+    :return: uint8 tensor [..., ceil(num_inputs / 8)].
+    """
+    num_inputs = spikes.shape[-1]
+    padded = torch.nn.functional.pad(spikes.to(torch.uint8), (0, (-num_inputs) % 8))
+    bits = padded.reshape(*padded.shape[:-1], -1, 8)
+    return (bits << _bit_shifts.to(bits.device)).sum(dim=-1, dtype=torch.uint8)
+
+
+def unpack_spikes(packed, num_inputs, dtype=torch.float32):
+    """
+    Inverse of pack_spikes.
+
+    :param packed: uint8 tensor [..., packed bytes].
+    :param num_inputs: Number of inputs per sample.
+    :param dtype: Result type.
+    :return: 0/1 tensor [..., num_inputs].
+    """
+    bits = (packed.unsqueeze(-1) >> _bit_shifts.to(packed.device)) & 1
+    return bits.reshape(*packed.shape[:-1], -1)[..., :num_inputs].to(dtype)
+
+
+def count_spikes(packed, dim=None):
+    """
+    :param packed: Bit-packed spikes, uint8 tensor of any shape.
+    :param dim: Dimension(s) to count along, e.g. -1 for the spikes of every frame, None for all.
+    :return: Number of spikes (set bits), an int if dim is None, else an int64 tensor without dim.
+    """
+    if dim is not None:
+        return _byte_popcount.to(packed.device)[packed.long()].sum(dim)
+    histogram = torch.bincount(packed.flatten().cpu(), minlength=256)
+    return int(torch.dot(histogram, _byte_popcount))
+
+
+class SpikeEncoder:
+    """
+    Base of the seeded encoders producing bit-packed spike frames.
+
+    An encoder turns a batch of images into per input state once (prepare)
+    and then computes each time step on its own (step), so frames can be
+    generated lazily and any step regenerated alone.
+    """
+
+    def __init__(self, num_steps, seed=0):
+        """
+        :param num_steps: Number of time steps.
+        :param seed: Seed, the same (seed, sample id) gives the same spike train.
+        """
+        self.num_steps = num_steps
+        self.seed = seed
+
+    @staticmethod
+    def intensities(images):
+        """
+        :param images: Tensor [batch, ...] of binarized (or [0, 1] grey) images.
+        :return: float tensor [batch, num_inputs] in [0, 1].
+        """
+        return images.flatten(1).float().clamp(0, 1)
+
+    def prepare(self, images):
+        return self.intensities(images)
+
+    def step(self, state, sample_ids, step):
+        """
+        Spikes of one time step.
+
+        :param state: Result of prepare.
+        :param sample_ids: Dataset indices of samples in the batch.
+        :param step: Time step.
+        :return: uint8 tensor [batch, packed bytes] on the device of the images.
+        """
+        raise NotImplementedError
+
+    def frames(self, images, sample_ids):
+        """
+        Lazily generates packed spike frames, one per time step.
+
+        :param images: Tensor [batch, ...] of binarized images.
+        :param sample_ids: Dataset indices of samples in the batch.
+        :return: Generator of uint8 tensors [batch, packed bytes].
+        """
+        state = self.prepare(images)
+        for step in range(self.num_steps):
+            yield self.step(state, sample_ids, step)
+
+    def encode(self, images, sample_ids):
+        """
+        All time steps at once.
+
+        :param images: Tensor [batch, ...] of binarized images.
+        :param sample_ids: Dataset indices of samples in the batch.
+        :return: uint8 tensor [num_steps, batch, packed bytes].
+        """
+        return torch.stack(list(self.frames(images, sample_ids)))
+
+
+class RateEncoder(SpikeEncoder):
+    """
+    Seeded Bernoulli rate encoder.
+
+    Spike probability of an image pixel x in {0, 1} is (x + 1) / 2, as in the
+    original rate_encoding, so every input spikes at least every other step
+    on average.
+    """
+
+    @staticmethod
+    def probabilities(images):
+        """
+        Spike probability per input.
+
+        :param images: Tensor [batch, ...] of binarized images.
+        :return: float tensor [batch, num_inputs].
+        """
+        return ((images.flatten(1).float() + 1) / 2).clamp(0, 1)
+
+    def prepare(self, images):
+        return self.probabilities(images)
+
+    def step(self, probs, sample_ids, step):
+        if torch.is_tensor(sample_ids):
+            sample_ids = sample_ids.cpu().numpy()
+        uniforms = spike_uniforms(self.seed, sample_ids, step, probs.shape[1])
+        # spike if uniform < p * 2^32, p = 1 always spikes
+        thresholds = (probs.detach().cpu().double().numpy() * 4294967296.0).astype(np.uint64)
+        spikes = torch.from_numpy(uniforms.astype(np.uint64) < thresholds)
+        return pack_spikes(spikes).to(probs.device)
+
+
+class LatencyEncoder(SpikeEncoder):
+    """
+    Time-to-first-spike encoder: every active input spikes exactly once,
+    intensity x at step round((1 - x) * (num_steps - 1)), so bright inputs
+    spike first and binarized images send all their pixels in the first step.
+    Deterministic, the seed is unused.
+    """
+
+    def prepare(self, images):
+        x = self.intensities(images)
+        first_step = torch.round((1 - x) * (self.num_steps - 1))
+        return torch.where(x > 0, first_step, torch.full_like(first_step, -1))
+
+    def step(self, first_step, sample_ids, step):
+        return pack_spikes(first_step == step)
+
+
+class BurstEncoder(SpikeEncoder):
+    """
+    Deterministic burst encoder: intensity x becomes a burst of
+    round(x * burst_length) spikes in the first steps, a binarized pixel
+    spikes in each of the first burst_length steps and never again.
+    """
+
+    def __init__(self, num_steps, seed=0, burst_length=2):
+        super().__init__(num_steps, seed)
+        if burst_length < 1:
+            raise ValueError(f"burst_length must be at least 1, got {burst_length}")
+        self.burst_length = burst_length
+
+    def prepare(self, images):
+        return torch.round(self.intensities(images) * self.burst_length)
+
+    def step(self, burst, sample_ids, step):
+        return pack_spikes(burst > step)
+
+
+class DeltaEncoder(SpikeEncoder):
+    """
+    Change encoder: an input spikes only in steps where its source frame
+    turns on (rising edge against the previous step, the first step counts
+    as a change from blank).
+
+    The source is the static image by default, which leaves one frame of
+    onset events, or another encoder, e.g. a RateEncoder whose repeated
+    spikes are then dropped.
+    """
+
+    def __init__(self, num_steps, seed=0, source=None):
+        """
+        :param source: SpikeEncoder whose frames are differentiated, None for the static image.
+        """
+        super().__init__(num_steps, seed)
+        self.source = source
+
+    def prepare(self, images):
+        if self.source is None:
+            return pack_spikes(self.intensities(images) > 0)
+        return self.source.prepare(images)
+
+    def _source_step(self, state, sample_ids, step):
+        if self.source is None:
+            return state
+        return self.source.step(state, sample_ids, step)
+
+    def step(self, state, sample_ids, step):
+        frame = self._source_step(state, sample_ids, step)
+        if step == 0:
+            return frame
+        return frame & ~self._source_step(state, sample_ids, step - 1)
+
+
+# Encoder names accepted by make_encoder (TrainConfig.encoding)
+encodings = ("rate", "latency", "burst", "delta", "delta_rate")
+
+
+def make_encoder(encoding, num_steps, seed=0, burst_length=2):
+    """
+    :param encoding: One of encodings: "delta" differentiates the static image,
+                     "delta_rate" the frames of a RateEncoder.
+    :param num_steps: Number of time steps.
+    :param seed: Encoder seed.
+    :param burst_length: Spikes per active input of the burst encoder.
+    :return: SpikeEncoder.
+    """
+    if encoding == "rate":
+        return RateEncoder(num_steps, seed)
+    if encoding == "latency":
+        return LatencyEncoder(num_steps, seed)
+    if encoding == "burst":
+        return BurstEncoder(num_steps, seed, burst_length)
+    if encoding == "delta":
+        return DeltaEncoder(num_steps, seed)
+    if encoding == "delta_rate":
+        return DeltaEncoder(num_steps, seed, RateEncoder(num_steps, seed))
+    raise ValueError(f"Unknown encoding: {encoding}, expected one of {', '.join(encodings)}")
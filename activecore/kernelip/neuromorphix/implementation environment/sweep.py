@@ -0,0 +1,250 @@
+import argparse
+import concurrent.futures
+import contextlib
+import dataclasses
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import torch
+
+import main
+from event_inference import EventDrivenEngine
+from mnist_store import open_preprocessed_mnist
+from qat import FixedPointFormat
+from spike_dataset import SpikeDataset
+
+# TrainConfig fields that do not change a trial's result, left out of its cache key
+runtime_fields = ("device", "threads", "inference_backend", "num_workers", "pin_memory", "checkpoint_dir",
+                  "checkpoint_every", "resume", "spikes_path", "model_path")
+
+results_name = "results.jsonl"
+
+
+def grid_points(space):
+    """
+    :param space: Dict of TrainConfig field -> list of values.
+    :return: List of dicts, every combination of the values.
+    """
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_points(space, trials, seed=0):
+    """
+    :param space: Dict of TrainConfig field -> list of values (uniform choice) or one of
+                  {"uniform": [low, high]}, {"log_uniform": [low, high]}, {"int_uniform": [low, high]}.
+    :param trials: Number of points.
+    :param seed: Sampling seed, the same seed gives the same points.
+    :return: List of dicts.
+    """
+    rng = random.Random(seed)
+
+    def sample(spec):
+        if isinstance(spec, list):
+            return rng.choice(spec)
+        (kind, (low, high)), = spec.items()
+        if kind == "uniform":
+            return rng.uniform(low, high)
+        if kind == "log_uniform":
+            return math.exp(rng.uniform(math.log(low), math.log(high)))
+        if kind == "int_uniform":
+            return rng.randint(low, high)
+        raise ValueError(f"Unknown distribution: {kind}")
+
+    return [{name: sample(spec) for name, spec in space.items()} for _ in range(trials)]
+
+
+def load_search_space(file_path):
+    """
+    Reads a search space file:
+
+        {"base": {TrainConfig fields shared by all trials},
+         "grid": {field: [values]}}
+    or
+        {"base": {...}, "random": {field: spec}, "trials": 20, "seed": 0}
+
+    :return: List of TrainConfig overrides, one per trial.
+    """
+    with open(file_path, 'r') as space_file:
+        spec = json.load(space_file)
+    base = spec.get("base", {})
+    if "grid" in spec:
+        points = grid_points(spec["grid"])
+    elif "random" in spec:
+        points = random_points(spec["random"], spec.get("trials", 10), spec.get("seed", 0))
+    else:
+        raise ValueError(f"{file_path} has neither a grid nor a random search space")
+    field_names = {field.name for field in dataclasses.fields(main.TrainConfig)}
+    unknown = {name for point in points for name in point} | set(base)
+    unknown -= field_names
+    if unknown:
+        raise ValueError(f"Unknown TrainConfig fields in {file_path}: {', '.join(sorted(unknown))}")
+    return [{**base, **point} for point in points]
+
+
+def data_version(config):
+    """
+    Content hash of the preprocessed dataset a config trains and tests on.
+    """
+    digest = hashlib.sha256()
+    for images, labels in open_preprocessed_mnist(threshold=config.threshold, source=config.dataset_source):
+        digest.update(images.tobytes())
+        digest.update(labels.tobytes())
+    return digest.hexdigest()
+
+
+def trial_key(config, version):
+    """
+    :return: Cache key of a trial: hash of its result-relevant config fields and the data version.
+    """
+    fields = {name: value for name, value in dataclasses.asdict(config).items() if name not in runtime_fields}
+    text = json.dumps({"config": fields, "data": version}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def trial_config(overrides, out_dir, key, threads):
+    """
+    TrainConfig of a trial, writing its checkpoints and exports to <out_dir>/<key>.
+    """
+    trial_dir = os.path.join(out_dir, key)
+    return main.TrainConfig(**{**overrides, "threads": threads, "world_size": 1,
+                               "checkpoint_dir": os.path.join(trial_dir, "checkpoints"),
+                               "spikes_path": os.path.join(trial_dir, "exported_spiking_input.spk"),
+                               "model_path": os.path.join(trial_dir, "exported_model.pth")})
+
+
+def trial_metrics(config):
+    """
+    :return: Dict of accuracy, spike counts per inference and export sizes of a finished trial.
+    """
+    engine = EventDrivenEngine(torch.load(config.model_path, map_location="cpu", weights_only=False))
+    accuracy = engine.score(SpikeDataset(config.spikes_path))
+    samples = engine.stats["samples"]
+    inputs, hidden = engine.stats["layers"]
+    num_weights = engine.w1.numel() + engine.w2.numel()
+    weight_bits = FixedPointFormat.parse(config.weight_format).total_bits
+    return {"accuracy": accuracy,
+            "hidden_spikes": hidden["events"] / samples,
+            "output_spikes": engine.stats["output_spikes"] / samples,
+            "synaptic_ops": (inputs["synaptic_ops"] + hidden["synaptic_ops"]) / samples,
+            "weight_bytes": num_weights * weight_bits // 8,
+            "model_bytes": os.path.getsize(config.model_path)}
+
+
+def run_trial(config):
+    """
+    Trains one trial in this process, its output goes to train.log in the trial directory.
+
+    :return: trial_metrics, None if training was interrupted (running the sweep again resumes it).
+    """
+    trial_dir = os.path.dirname(config.model_path)
+    os.makedirs(trial_dir, exist_ok=True)
+    with open(os.path.join(trial_dir, "train.log"), 'a') as log_file, contextlib.redirect_stdout(log_file):
+        if main.train(0, 1, config) is not None:
+            return None
+    return trial_metrics(config)
+
+
+def load_results(out_dir):
+    """
+    :return: Dict of trial key -> result record from <out_dir>/results.jsonl.
+    """
+    results = {}
+    file_path = os.path.join(out_dir, results_name)
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as results_file:
+            for line in results_file:
+                record = json.loads(line)
+                results[record["key"]] = record
+    return results
+
+
+def sweep(points, out_dir, jobs=1, threads=0):
+    """
+    Runs every trial not already in the result cache in a pool of jobs processes.
+
+    :param points: TrainConfig overrides per trial (load_search_space).
+    :param out_dir: Sweep directory: result cache and one directory per trial.
+    :param jobs: Trials running at once.
+    :param threads: Intra-op threads per trial, 0 splits the CPU cores evenly.
+    :return: Result records of all points, in order.
+    """
+    if threads <= 0:
+        threads = max(1, (os.cpu_count() or 1) // jobs)
+    os.makedirs(out_dir, exist_ok=True)
+    results = load_results(out_dir)
+
+    versions = {}
+    keys = []
+    configs = {}
+    for overrides in points:
+        config = main.TrainConfig(**overrides)
+        data_key = (config.dataset_source, config.threshold)
+        if data_key not in versions:
+            # also builds the preprocessing cache before the workers open it
+            versions[data_key] = data_version(config)
+        key = trial_key(config, versions[data_key])
+        keys.append(key)
+        if key not in results:
+            configs[key] = trial_config(overrides, out_dir, key, threads)
+    print(f"{len(points)} trials, {len(points) - len(configs)} cached, running {len(configs)} with {jobs} jobs "
+          f"of {threads} threads")
+
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(jobs, mp_context=context) as pool, \
+            open(os.path.join(out_dir, results_name), 'a') as results_file:
+        futures = {pool.submit(run_trial, config): key for key, config in configs.items()}
+        for future in concurrent.futures.as_completed(futures):
+            key = futures[future]
+            try:
+                metrics = future.result()
+            except Exception as error:
+                print(f"Trial {key} failed: {error!r}")
+                continue
+            if metrics is None:
+                print(f"Trial {key} interrupted")
+                continue
+            record = {"key": key, "config": dataclasses.asdict(configs[key]), **metrics}
+            results[key] = record
+            results_file.write(json.dumps(record) + "\n")
+            results_file.flush()
+            print(f"Trial {key}: accuracy {metrics['accuracy']:.2f}%")
+    return [results.get(key) for key in keys]
+
+
+def format_table(points, records):
+    """
+    :return: Text table of the swept fields and the metrics of every trial.
+    """
+    swept = sorted({name for point in points for name in point
+                    if len({json.dumps(other.get(name)) for other in points}) > 1})
+    columns = ["key"] + swept + ["accuracy", "hidden_spikes", "output_spikes", "synaptic_ops", "weight_bytes",
+                                 "model_bytes"]
+    rows = []
+    for point, record in zip(points, records):
+        if record is None:
+            continue
+        row = [record["key"]] + [point[name] for name in swept] + [record[name] for name in columns[1 + len(swept):]]
+        rows.append([f"{value:.4g}" if isinstance(value, float) else str(value) for value in row])
+    widths = [max(len(column), *(len(row[i]) for row in rows)) if rows else len(column)
+              for i, column in enumerate(columns)]
+    lines = ["  ".join(column.rjust(width) for column, width in zip(columns, widths))]
+    lines += ["  ".join(value.rjust(width) for value, width in zip(row, widths)) for row in rows]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep of the MNIST SNN with a result cache.")
+    parser.add_argument("space", help="Search space JSON file (see load_search_space)")
+    parser.add_argument("--out", default="./sweep", help="Result cache and trial directory")
+    parser.add_argument("--jobs", type=int, default=1, help="Trials running at once")
+    parser.add_argument("--threads", type=int, default=0, help="Threads per trial, 0 splits the cores evenly")
+    args = parser.parse_args()
+
+    points = load_search_space(args.space)
+    records = sweep(points, args.out, args.jobs, args.threads)
+    print(format_table(points, records))
@@ -0,0 +1,366 @@
+import os
+import random
+import signal
+import threading
+import numpy as np
+import torch
+import torch.distributed as dist
+from torch.utils.data import DataLoader, Sampler
+
+# Checkpoint files in the checkpoint directory
+last_checkpoint_name = "last.pt"
+best_checkpoint_name = "best.pt"
+
+
+def _save_atomic(obj, file_path):
+    # a pre-empted save never leaves a truncated checkpoint behind
+    tmp_path = file_path + ".tmp"
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, file_path)
+
+
+def get_rng_state():
+    """
+    Captures the state of every random number generator training may use.
+
+    :return: Dict of torch, CUDA, NumPy and Python RNG states.
+    """
+    state = {
+        "torch": torch.get_rng_state(),
+        "numpy": np.random.get_state(),
+        "python": random.getstate(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    """
+    Restores RNG states captured by get_rng_state.
+
+    :param state: Dict returned by get_rng_state.
+    """
+    torch.set_rng_state(state["torch"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["python"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+class EpochBatchSampler(Sampler):
+    """
+    Yields batches of dataset indices in a shuffled order fixed by (seed, epoch).
+
+    The order of an epoch can be recreated at any time, so an epoch interrupted
+    after some batches continues with exactly the batches that were left.
+
+    With world_size > 1 every global batch is split into world_size contiguous
+    shards and rank gets its shard, so the ranks together see the same batches
+    as a single process.
+    """
+
+    def __init__(self, num_samples, batch_size, seed=0, shuffle=True, rank=0, world_size=1):
+        """
+        :param num_samples: Dataset size.
+        :param batch_size: Samples per global batch, the last batch may be smaller.
+        :param seed: Shuffle seed.
+        :param shuffle: Keep dataset order if False.
+        :param rank: Index of this process among the data-parallel workers.
+        :param world_size: Number of data-parallel workers.
+        """
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.seed = seed
+        self.shuffle = shuffle
+        self.rank = rank
+        self.world_size = world_size
+        self.epoch = 0
+        self.start_batch = 0
+
+    def set_epoch(self, epoch, start_batch=0):
+        """
+        Selects the epoch to iterate next.
+
+        :param epoch: Epoch index.
+        :param start_batch: Number of batches of the epoch already done.
+        """
+        self.epoch = epoch
+        self.start_batch = start_batch
+
+    def num_batches(self):
+        return (self.num_samples + self.batch_size - 1) // self.batch_size
+
+    def batch_length(self, batch):
+        """
+        :return: Number of samples of a global batch.
+        """
+        return min(self.batch_size, self.num_samples - batch * self.batch_size)
+
+    def __len__(self):
+        return self.num_batches() - self.start_batch
+
+    def __iter__(self):
+        if self.shuffle:
+            generator = torch.Generator().manual_seed(self.seed * 1000003 + self.epoch)
+            order = torch.randperm(self.num_samples, generator=generator)
+        else:
+            order = torch.arange(self.num_samples)
+        for batch in range(self.start_batch, self.num_batches()):
+            indices = order[batch * self.batch_size:(batch + 1) * self.batch_size]
+            if self.world_size > 1:
+                indices = torch.tensor_split(indices, self.world_size)[self.rank]
+            yield indices
+
+
+def make_loader(dataset, sampler, num_workers=0, pin_memory=False):
+    """
+    DataLoader fetching whole batches at once from an indexable dataset.
+
+    The dataset is indexed with a tensor of indices per batch (as TensorDataset
+    supports), so workers do one gather per batch instead of one per sample.
+
+    :param dataset: Dataset accepting index tensors.
+    :param sampler: Batch sampler, e.g. EpochBatchSampler.
+    :param num_workers: Loader processes, 0 loads in the training process.
+    :param pin_memory: Return batches in page-locked memory for faster host to GPU copies.
+    :return: DataLoader.
+    """
+    return DataLoader(dataset, sampler=sampler, batch_size=None, num_workers=num_workers,
+                      pin_memory=pin_memory, persistent_workers=num_workers > 0)
+
+
+class Trainer:
+    """
+    Resumable training loop.
+
+    Model, optimizer, RNG states and the position in the epoch are written to
+    <checkpoint_dir>/last.pt every checkpoint_every steps, at the end of every
+    epoch and when the process receives SIGTERM or SIGINT. After an
+    evaluation that improves on the best score so far the model is also saved
+    to <checkpoint_dir>/best.pt. A new Trainer over the same directory
+    continues where the previous run stopped.
+
+    Inside an initialized torch.distributed process group the trainer is data
+    parallel: each rank trains on its shard of every batch, gradients are
+    summed over ranks with one all-reduce per step, weighted so that the
+    update equals the one of a single process on the whole batch. Rank 0
+    evaluates and writes checkpoints. A signal received by any rank stops all
+    ranks after the same step.
+    """
+
+    def __init__(self, model, optimizer, loss_fn, train_dataset, checkpoint_dir, num_epochs, batch_size,
+                 seed=0, evaluate=None, eval_every=1, checkpoint_every=100, log_every=100,
+                 num_workers=0, pin_memory=False, device="cpu", config=None):
+        """
+        :param model: Model to train.
+        :param optimizer: Optimizer over the model parameters.
+        :param loss_fn: Called as loss_fn(model, batch, epoch) with batch moved to device, returns the loss.
+        :param train_dataset: Training dataset accepting index tensors (e.g. TensorDataset).
+        :param checkpoint_dir: Directory of last.pt and best.pt.
+        :param num_epochs: Total number of epochs, a resumed run stops at the same epoch.
+        :param batch_size: Samples per step.
+        :param seed: Seed of the shuffle order.
+        :param evaluate: Called as evaluate(model) after an epoch, returns a score where higher is better,
+                         or a dict of metrics holding it under "score" (the others are logged and kept
+                         in history). Only used on rank 0.
+        :param eval_every: Evaluate every eval_every epochs (0: never), and after the last one.
+        :param checkpoint_every: Steps between checkpoints within an epoch, 0 checkpoints at epoch ends only.
+        :param log_every: Steps between loss reports.
+        :param num_workers: DataLoader worker processes.
+        :param pin_memory: Pin batches in page-locked memory.
+        :param device: Training device.
+        :param config: Dict describing the run, stored in checkpoints.
+        """
+        self.model = model
+        self.optimizer = optimizer
+        self.loss_fn = loss_fn
+        self.checkpoint_dir = checkpoint_dir
+        self.num_epochs = num_epochs
+        self.evaluate = evaluate
+        self.eval_every = eval_every
+        self.checkpoint_every = checkpoint_every
+        self.log_every = log_every
+        self.device = device
+        self.config = config or {}
+        if dist.is_available() and dist.is_initialized():
+            self.rank = dist.get_rank()
+            self.world_size = dist.get_world_size()
+        else:
+            self.rank = 0
+            self.world_size = 1
+        self.sampler = EpochBatchSampler(len(train_dataset), batch_size, seed, rank=self.rank,
+                                         world_size=self.world_size)
+        self.loader = make_loader(train_dataset, self.sampler, num_workers, pin_memory)
+
+        # Progress
+        self.epoch = 0
+        self.batch = 0
+        self.global_step = 0
+        self.best_score = None
+        self.best_epoch = None
+        self.history = []
+        self.stop_signal = None
+
+    @property
+    def last_checkpoint(self):
+        return os.path.join(self.checkpoint_dir, last_checkpoint_name)
+
+    @property
+    def best_checkpoint(self):
+        return os.path.join(self.checkpoint_dir, best_checkpoint_name)
+
+    def state_dict(self):
+        return {
+            "model_state_dict": self.model.state_dict(),
+            "optimizer_state_dict": self.optimizer.state_dict(),
+            "rng_state": get_rng_state(),
+            "epoch": self.epoch,
+            "batch": self.batch,
+            "global_step": self.global_step,
+            "best_score": self.best_score,
+            "best_epoch": self.best_epoch,
+            "history": self.history,
+            "config": self.config,
+        }
+
+    def save_checkpoint(self):
+        if self.rank != 0:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        _save_atomic(self.state_dict(), self.last_checkpoint)
+
+    def load_checkpoint(self, file_path):
+        """
+        Restores the training state saved by save_checkpoint.
+
+        :param file_path: Checkpoint file.
+        """
+        state = torch.load(file_path, map_location=self.device, weights_only=False)
+        self.model.load_state_dict(state["model_state_dict"])
+        self.optimizer.load_state_dict(state["optimizer_state_dict"])
+        set_rng_state(state["rng_state"])
+        self.epoch = state["epoch"]
+        self.batch = state["batch"]
+        self.global_step = state["global_step"]
+        self.best_score = state["best_score"]
+        self.best_epoch = state["best_epoch"]
+        self.history = state["history"]
+        print(f"Resumed from {file_path} at epoch {self.epoch + 1}, step {self.batch}")
+        return state
+
+    def load_best(self):
+        """
+        Loads the weights of the best evaluated checkpoint into the model.
+        A best.pt left by an earlier run is ignored when this run (or the run
+        it resumed) never evaluated.
+
+        :return: Best score, None if no evaluation was saved (the model keeps its current weights).
+        """
+        if (self.best_epoch is None) or not os.path.exists(self.best_checkpoint):
+            return None
+        state = torch.load(self.best_checkpoint, map_location=self.device, weights_only=False)
+        self.model.load_state_dict(state["model_state_dict"])
+        return state["score"]
+
+    def _on_signal(self, signum, frame):
+        print(f"Received signal {signum}, saving checkpoint after the current step")
+        self.stop_signal = signum
+
+    def _step_data_parallel(self, batch):
+        # loss of the shard, weighted by its share of the global batch
+        count = len(batch[0])
+        self.optimizer.zero_grad()
+        if count > 0:
+            loss = self.loss_fn(self.model, batch, self.epoch) * (count / self.sampler.batch_length(self.batch))
+            loss.backward()
+            loss = loss.detach()
+        else:
+            loss = torch.zeros((), device=self.device)
+
+        # gradients, loss and stop request are summed in a single all-reduce
+        params = [p for p in self.model.parameters() if p.requires_grad]
+        grads = [torch.zeros_like(p) if p.grad is None else p.grad for p in params]
+        stop = torch.ones(1) if self.stop_signal is not None else torch.zeros(1)
+        flat = torch.cat([g.flatten() for g in grads] + [loss.reshape(1), stop.to(loss)])
+        dist.all_reduce(flat)
+        offset = 0
+        for p in params:
+            p.grad = flat[offset:offset + p.numel()].view_as(p).clone()
+            offset += p.numel()
+        if (flat[-1] > 0) and (self.stop_signal is None):
+            self.stop_signal = signal.SIGTERM
+        self.optimizer.step()
+        return flat[-2]
+
+    def _evaluate_epoch(self):
+        metrics = self.evaluate(self.model)
+        if not isinstance(metrics, dict):
+            metrics = {"score": metrics}
+        score = metrics["score"]
+        self.model.train()
+        self.history.append({"epoch": self.epoch, **metrics})
+        extra = "".join(f", {name}: {value:.4f}" for name, value in metrics.items() if name != "score")
+        print(f"Epoch [{self.epoch}/{self.num_epochs}], Score: {score:.4f}{extra}")
+        if (self.best_score is None) or (score > self.best_score):
+            self.best_score = score
+            self.best_epoch = self.epoch
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            _save_atomic({"model_state_dict": self.model.state_dict(), "score": score, "epoch": self.epoch,
+                          "config": self.config}, self.best_checkpoint)
+
+    def fit(self):
+        """
+        Trains up to num_epochs.
+
+        :return: True when training completed, False when stopped by a signal (state is checkpointed).
+        """
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                handlers[signum] = signal.signal(signum, self._on_signal)
+        try:
+            return self._fit()
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def _fit(self):
+        self.model.train()
+        num_batches = self.sampler.num_batches()
+        while self.epoch < self.num_epochs:
+            self.sampler.set_epoch(self.epoch, self.batch)
+            for batch in self.loader:
+                batch = [t.to(self.device, non_blocking=True) for t in batch]
+                if self.world_size > 1:
+                    loss = self._step_data_parallel(batch)
+                else:
+                    loss = self.loss_fn(self.model, batch, self.epoch)
+
+                    self.optimizer.zero_grad()
+                    loss.backward()
+                    self.optimizer.step()
+
+                self.batch += 1
+                self.global_step += 1
+                if self.log_every and (self.batch % self.log_every == 0) and (self.rank == 0):
+                    print(f'Epoch [{self.epoch + 1}/{self.num_epochs}], Step [{self.batch}/{num_batches}], '
+                          f'Loss: {loss.item():.4f}')
+                if self.stop_signal is not None:
+                    self.save_checkpoint()
+                    if self.rank == 0:
+                        print(f"Checkpoint saved to {self.last_checkpoint}")
+                    return False
+                if self.checkpoint_every and (self.global_step % self.checkpoint_every == 0):
+                    self.save_checkpoint()
+
+            self.epoch += 1
+            self.batch = 0
+            evaluate = (self.eval_every and (self.epoch % self.eval_every == 0)) or (self.epoch == self.num_epochs)
+            if evaluate and (self.evaluate is not None) and (self.rank == 0):
+                self._evaluate_epoch()
+            self.save_checkpoint()
+            # data-parallel ranks agree on stopping at the next step
+            if (self.stop_signal is not None) and (self.world_size == 1):
+                return False
+        return True
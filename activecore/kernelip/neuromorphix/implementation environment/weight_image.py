@@ -0,0 +1,132 @@
+import argparse
+import dataclasses
+import hashlib
+import json
+import math
+import numpy as np
+import torch
+
+from activity_profiler import CoreConfig
+from export_weights_to_dat import weight_layers
+from fixed_point import quantize_tensors, rounding_modes, overflow_modes
+from qat import FixedPointFormat
+from wmem_pack import image_bytes, lane_names, pack_layer, syn_pack
+
+manifest_version = 1
+
+
+def weight_fields(core):
+    """
+    Fields of a weight memory word: as many weights of core.weight_bits as
+    fit, "w" if one, "w0", "w1", ... if several, and the spare low bits as
+    "tag", which holds the postsynaptic index of the first weight. For 16 bit
+    weights in 24 bit words this is tag[7:0], w[23:8], as nm_core_top reads it.
+
+    :return: syn_pack of the fields.
+    """
+    lanes = core.weights_per_word
+    if core.weight_bits * lanes > core.weight_word_bits:
+        raise ValueError(f"{core.weight_bits} bit weights do not fit {core.weight_word_bits} bit words")
+    widths = {name: core.weight_bits for name in lane_names(lanes)}
+    spare = core.weight_word_bits - lanes * core.weight_bits
+    if spare:
+        widths["tag"] = spare
+    return syn_pack(widths)
+
+
+def build_image(layers, fmt, core=None, rounding="nearest_even", overflow="error", seed=None):
+    """
+    Places all layers in one weight memory image, one after another.
+
+    :param layers: Dict of name -> float weights [postsyn, presyn], in placement order.
+    :param fmt: FixedPointFormat of the weights.
+    :param core: CoreConfig, its weight_bits is replaced by fmt.total_bits.
+    :return: (words [depth] int64, manifest dict).
+    """
+    core = dataclasses.replace(core if core is not None else CoreConfig(), weight_bits=fmt.total_bits)
+    if len(layers) > core.layer_bases:
+        raise ValueError(f"{len(layers)} layers do not fit {core.layer_bases} layer bases, see core_mapping.py")
+    fields = weight_fields(core)
+    lanes = core.weights_per_word
+    weights_int, stats = quantize_tensors(layers, fmt, rounding, overflow, seed)
+
+    chunks = []
+    entries = []
+    base_addr = 0
+    for (name, weight_int), item in zip(weights_int.items(), stats):
+        words = pack_layer(weight_int, fields, lanes)
+        entries.append({"name": name, "shape": list(weight_int.shape), "base_addr": base_addr,
+                        "row_stride": math.ceil(weight_int.shape[0] / lanes), "words": len(words),
+                        "overflows": item.overflows, "max_error": item.max_error, "rms_error": item.rms_error})
+        chunks.append(words)
+        base_addr += len(words)
+    if base_addr > core.memory_words:
+        raise ValueError(f"{base_addr} words do not fit the {core.memory_words} word weight memory, "
+                         f"see core_mapping.py to split the network")
+    image = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+    dense_words = sum(int(np.prod(entry["shape"])) for entry in entries)
+    manifest = {"version": manifest_version, "format": str(fmt), "rounding": rounding,
+                "word_bits": core.weight_word_bits, "addr_bits": core.addr_bits, "depth": len(image),
+                "weights_per_word": lanes, "fields": {name: list(bits) for name, bits in fields.items()},
+                "utilization": dense_words * fmt.total_bits / max(1, len(image) * core.weight_word_bits),
+                "layers": entries}
+    return image, manifest
+
+
+def export_image(pth_file="exported_model.pth", output_prefix="wmem_pack", layers=None, integer_bits=2,
+                 fractional_bits=14, rounding="nearest_even", overflow="error", seed=None, core=None):
+    """
+    Exports all weight layers as one packed weight memory image:
+
+        <output_prefix>.mem    $readmemh text, one word per line
+        <output_prefix>.bin    raw little-endian words for burst upload
+        <output_prefix>.json   manifest: packing fields, layer base addresses and shapes, quantization errors
+
+    :param layers: Weight names in the state dict, all weight matrices if None.
+    :return: Manifest dict.
+    """
+    state_dict = torch.load(pth_file, map_location="cpu", weights_only=False)["model_state_dict"]
+    layers = weight_layers(state_dict) if layers is None else layers
+    for layer_name in layers:
+        if layer_name not in state_dict:
+            raise ValueError(f"Layer '{layer_name}' not found in the model's state_dict.")
+    weights = {name: state_dict[name].detach().cpu().numpy() for name in layers}
+    image, manifest = build_image(weights, FixedPointFormat(integer_bits, fractional_bits), core, rounding,
+                                  overflow, seed)
+
+    digits = (manifest["word_bits"] + 3) // 4
+    with open(f"{output_prefix}.mem", 'w') as mem_file:
+        mem_file.write("".join(f"{word:0{digits}X}\n" for word in image.tolist()))
+    data = image_bytes(image, manifest["word_bits"])
+    with open(f"{output_prefix}.bin", 'wb') as bin_file:
+        bin_file.write(data)
+    manifest["sha256"] = hashlib.sha256(data).hexdigest()
+    with open(f"{output_prefix}.json", 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    fields = ", ".join(f"{name}[{msb}:{lsb}]" for name, (lsb, msb) in manifest["fields"].items())
+    print(f"Packed {len(layers)} layers into {manifest['depth']} words of {manifest['word_bits']} bits "
+          f"({fields}), utilization {100 * manifest['utilization']:.1f}%")
+    for entry in manifest["layers"]:
+        print(f"  {entry['name']} {tuple(entry['shape'])}: base {entry['base_addr']}, {entry['words']} words, "
+              f"row stride {entry['row_stride']}, {entry['overflows']} overflows, rms error {entry['rms_error']:.3g}")
+    print(f"Image written to {output_prefix}.mem, {output_prefix}.bin, {output_prefix}.json")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export all SNN weights as one packed weight memory image.")
+    parser.add_argument("--model", default="./exported_model.pth")
+    parser.add_argument("--output-prefix", default="wmem_pack")
+    parser.add_argument("--layers", nargs="+", default=None, help="Weight names, default all weight matrices")
+    parser.add_argument("--integer-bits", type=int, default=2)
+    parser.add_argument("--fractional-bits", type=int, default=14)
+    parser.add_argument("--rounding", choices=rounding_modes, default="nearest_even")
+    parser.add_argument("--overflow", choices=overflow_modes, default="error")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the stochastic rounding")
+    parser.add_argument("--word-bits", type=int, default=24, help="dat_wmem_pack width")
+    parser.add_argument("--addr-bits", type=int, default=17, help="adr_wmem_pack width")
+    args = parser.parse_args()
+
+    export_image(args.model, args.output_prefix, args.layers, args.integer_bits, args.fractional_bits, args.rounding,
+                 args.overflow, args.seed, CoreConfig(weight_word_bits=args.word_bits, addr_bits=args.addr_bits))
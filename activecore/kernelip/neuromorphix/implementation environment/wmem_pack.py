@@ -0,0 +1,86 @@
+import math
+import numpy as np
+
+# Packing of dat_wmem_pack words, NumPy only so deploy tools can use it without torch
+
+
+def syn_pack(field_widths):
+    """
+    Packed word layout as buildSynPack (src/LayoutPlan.kt): fields sorted
+    by name, placed from bit 0 upwards.
+
+    :param field_widths: Dict of field name -> width.
+    :return: Dict of field name -> (lsb, msb), in packing order.
+    """
+    fields = {}
+    offset = 0
+    for name in sorted(field_widths):
+        fields[name] = (offset, offset + field_widths[name] - 1)
+        offset += field_widths[name]
+    return fields
+
+
+def lane_names(lanes):
+    return ["w"] if lanes == 1 else [f"w{lane}" for lane in range(lanes)]
+
+
+def pack_layer(weight_int, fields, lanes):
+    """
+    Packs a layer presynaptic-major: row p holds the weights of presynaptic
+    neuron p in ceil(postsyn / lanes) words, postsynaptic neuron j in lane
+    j % lanes of word j // lanes of the row.
+
+    :param weight_int: Integer weights [postsyn, presyn].
+    :return: Words [presyn * row stride] (int64).
+    """
+    postsyn, presyn = weight_int.shape
+    stride = math.ceil(postsyn / lanes)
+    padded = np.zeros((presyn, stride * lanes), dtype=np.int64)
+    padded[:, :postsyn] = weight_int.T
+    padded = padded.reshape(presyn, stride, lanes)
+    words = np.zeros((presyn, stride), dtype=np.int64)
+    for lane, name in enumerate(lane_names(lanes)):
+        lsb, msb = fields[name]
+        words |= (padded[..., lane] & ((1 << (msb - lsb + 1)) - 1)) << lsb
+    if "tag" in fields:
+        lsb, msb = fields["tag"]
+        words |= ((np.arange(stride) * lanes) & ((1 << (msb - lsb + 1)) - 1)) << lsb
+    return words.reshape(-1)
+
+
+def unpack_layer(words, fields, lanes, shape):
+    """
+    Inverse of pack_layer.
+
+    :param words: Words of the layer (base_addr onwards).
+    :param shape: (postsyn, presyn).
+    :return: Integer weights [postsyn, presyn].
+    """
+    postsyn, presyn = shape
+    stride = math.ceil(postsyn / lanes)
+    rows = np.asarray(words, dtype=np.int64)[:presyn * stride].reshape(presyn, stride)
+    padded = np.empty((presyn, stride, lanes), dtype=np.int64)
+    for lane, name in enumerate(lane_names(lanes)):
+        lsb, msb = fields[name]
+        width = msb - lsb + 1
+        value = (rows >> lsb) & ((1 << width) - 1)
+        padded[..., lane] = value - ((value >> (width - 1)) << width)
+    return padded.reshape(presyn, stride * lanes)[:, :postsyn].T.copy()
+
+
+def image_bytes(words, word_bits):
+    """
+    :return: Raw little-endian image, ceil(word_bits / 8) bytes per word.
+    """
+    word_bytes = (word_bits + 7) // 8
+    return np.asarray(words, dtype="<u8").view(np.uint8).reshape(-1, 8)[:, :word_bytes].tobytes()
+
+
+def words_from_bytes(data, word_bits):
+    """
+    Inverse of image_bytes.
+    """
+    word_bytes = (word_bits + 7) // 8
+    raw = np.zeros((len(data) // word_bytes, 8), dtype=np.uint8)
+    raw[:, :word_bytes] = np.frombuffer(data, dtype=np.uint8).reshape(-1, word_bytes)
+    return raw.view("<u8").reshape(-1).astype(np.int64)